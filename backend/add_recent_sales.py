@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import random
 import string
 from app.db.database import SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 
 def generate_serial():
@@ -168,7 +169,10 @@ def add_recent_sales():
         print(f"\n📊 TODAY'S SALES: {len(today_sales)} transactions")
         print(f"💰 TODAY'S REVENUE: ₹{sum(s.total_amount for s in today_sales):,.2f}")
         print("\n👉 REFRESH YOUR BROWSER NOW!")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
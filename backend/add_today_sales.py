@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 import random
 import string
 from app.db.database import SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 
 def generate_serial():
@@ -165,7 +166,10 @@ def add_today_sales():
         print("\n" + "=" * 50)
         print("🎉 DONE! Refresh your browser now!")
         print("=" * 50)
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback
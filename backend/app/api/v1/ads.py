@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -6,6 +7,13 @@ import json
 from app.db.database import get_db
 from app.db import models
 from app.api.dependencies import get_current_user
+from app.core.config import settings
+from app.services.ad_analytics_service import campaign_series, campaign_summary, store_overview
+from app.services.ad_sandbox_service import seed_sandbox_campaigns
+from app.services.attribution_service import TOUCH_TYPES, as_utc, attribution_report
+from app.services.audience_service import refresh_audience_members, stream_audience_csv, sync_audience
+from app.services.audience_uploader import AudienceUploadError
+from app.services.segment_service import SegmentError
 from pydantic import BaseModel
 import requests
 from facebook_business.adobjects.adaccount import AdAccount
@@ -65,6 +73,16 @@ class CampaignApproval(BaseModel):
     approved: bool
     rejection_reason: Optional[str] = None
 
+class TouchpointCreate(BaseModel):
+    campaign_id: int
+    customer_id: int
+    conversion_type: str = "click"  # click, lead, store_visit, call
+    click_id: Optional[str] = None  # fbclid / gclid
+    utm_source: Optional[str] = None
+    utm_medium: Optional[str] = None
+    utm_campaign: Optional[str] = None
+    occurred_at: Optional[datetime] = None
+
 class AudienceCreate(BaseModel):
     name: str
     audience_type: str
@@ -211,8 +229,10 @@ async def connect_meta_account(
 # ============ SANDBOX / DEMO MODE ============
 
 @router.post("/sandbox/connect")
-async def connect_sandbox_account(
+def connect_sandbox_account(
     platform: str,
+    campaigns: Optional[int] = Query(None, ge=1, le=1000, description="Mock campaigns (default SANDBOX_AD_CAMPAIGNS)"),
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Days of analytics (default SANDBOX_AD_HISTORY_DAYS)"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -258,10 +278,13 @@ async def connect_sandbox_account(
     # 2. Update System Setting to indicate Sandbox Mode is active for this user/store
     # (Optional, but good for UI state)
     
-    # 3. Generate Mock Campaigns
+    # 3. Generate Mock Campaigns and analytics (bulk inserts, one transaction)
+    generated = {"campaigns": 0, "analytics_rows": 0}
     try:
-        create_mock_campaigns(db, current_user, connection)
+        generated = seed_sandbox_campaigns(db, current_user, connection, campaigns=campaigns, days=days)
+        db.commit()
     except Exception as e:
+        db.rollback()
         print(f"Error generating mock campaigns: {e}")
         # Don't fail the connection if mock data fails, but useful to know.
         pass
@@ -269,92 +292,10 @@ async def connect_sandbox_account(
     return {
         "message": f"{platform.title()} Sandbox account connected successfully! Mock data generated.",
         "connection_id": connection.id,
-        "mode": "sandbox"
+        "mode": "sandbox",
+        **generated
     }
 
-def create_mock_campaigns(db: Session, user: models.User, connection: models.AdAccountConnection):
-    """Generates realistic mock campaigns and analytics"""
-    import random
-    
-    # Use valid Enum values for templates
-    templates = [
-        {"name": "Summer Sale Extravaganza", "obj": "OUTCOME_SALES", "status": "ACTIVE", "roas": 4.5, "template": "offer_festival"},
-        {"name": "New Collection Launch", "obj": "OUTCOME_AWARENESS", "status": "ACTIVE", "roas": 2.1, "template": "product_catalog"},
-        {"name": "Retargeting - Cart Abandoners", "obj": "OUTCOME_SALES", "status": "PAUSED", "roas": 6.8, "template": "store_visit"},
-        {"name": "Brand Awareness Video", "obj": "OUTCOME_TRAFFIC", "status": "ACTIVE", "roas": 1.5, "template": "lead_form"},
-    ]
-    
-    # Adjust for Google
-    if connection.platform == "google":
-        templates = [
-            {"name": "Local Store Search", "obj": "LEADS", "status": "ACTIVE", "roas": 5.2, "template": "local_search_ads"},
-            {"name": "YouTube Brand Reach", "obj": "AWARENESS", "status": "ACTIVE", "roas": 1.8, "template": "youtube_local_awareness"},
-            {"name": "Performance Max Retail", "obj": "SALES", "status": "PAUSED", "roas": 7.5, "template": "performance_max"},
-        ]
-    
-    for t in templates:
-        # Create Campaign
-        daily_budget = random.randint(500, 5000)
-        
-        campaign = models.AdCampaignCreation(
-            store_id=user.store_id,
-            ad_account_id=connection.id,
-            campaign_name=t["name"],
-            campaign_template=t["template"], # Using valid enum value string
-            platform=connection.platform,
-            objective=t["obj"],
-            budget_daily=float(daily_budget),
-            status=models.AdCampaignStatus.ACTIVE if t["status"] == "ACTIVE" else models.AdCampaignStatus.PAUSED,
-            created_by=user.id,
-            start_date=datetime.utcnow() - timedelta(days=random.randint(10, 30))
-        )
-        db.add(campaign)
-        db.commit()
-        db.refresh(campaign)
-        
-        # Generate 30 days of Analytics
-        generate_mock_analytics(db, campaign, t["roas"])
-
-def generate_mock_analytics(db: Session, campaign: models.AdCampaignCreation, target_roas: float):
-    """Generates 30 days of realistic analytics data"""
-    import random
-    
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=30)
-    
-    current = start_date
-    while current <= end_date:
-        # Randomize daily performance slightly
-        daily_volatility = random.uniform(0.8, 1.2)
-        
-        impressions = int(random.randint(1000, 5000) * daily_volatility)
-        clicks = int(impressions * random.uniform(0.01, 0.03)) # 1-3% CTR
-        spend = clicks * random.uniform(5, 15) # CPC between 5-15
-        
-        # Sales logic based on ROAS
-        revenue = spend * (target_roas * random.uniform(0.9, 1.1))
-        sales_count = int(revenue / random.randint(500, 2000)) if revenue > 0 else 0
-        leads = int(clicks * random.uniform(0.05, 0.15))
-        
-        analytics = models.AdCampaignAnalytics(
-            campaign_id=campaign.id,
-            date=current,
-            impressions=impressions,
-            clicks=clicks,
-            spend=round(spend, 2),
-            reach=int(impressions * 0.8),
-            leads=leads,
-            sales_attributed=sales_count,
-            revenue_attributed=round(revenue, 2),
-            ctr=round((clicks/impressions)*100, 2) if impressions > 0 else 0,
-            cpc=round(spend/clicks, 2) if clicks > 0 else 0,
-            roas=round(revenue/spend, 2) if spend > 0 else 0
-        )
-        db.add(analytics)
-        current += timedelta(days=1)
-    
-    db.commit()
-
 # ============ GOOGLE ADS INTEGRATION ENDPOINTS ============
 
 @router.get("/google/auth-url")
@@ -789,7 +730,7 @@ async def launch_campaign_to_platform(
 # ============ AUDIENCE MANAGEMENT ============
 
 @router.post("/audiences/create")
-async def create_audience(
+def create_audience(
     audience: AudienceCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -805,28 +746,7 @@ async def create_audience(
     if not ad_account:
         raise HTTPException(status_code=400, detail=f"No active {audience.platform} account connected")
     
-    # Get customers based on criteria
-    customer_query = db.query(models.Customer).filter(
-        models.Customer.store_id == current_user.store_id
-    )
-    
-    # Apply filters from source_criteria
-    if audience.source_criteria.get("segment") == "past_buyers":
-        days = audience.source_criteria.get("days", 30)
-        since_date = datetime.utcnow() - timedelta(days=days)
-        customer_query = customer_query.join(models.Sale).filter(
-            models.Sale.sale_date >= since_date
-        )
-    elif audience.source_criteria.get("segment") == "high_value":
-        min_value = audience.source_criteria.get("min_purchase", 50000)
-        customer_query = customer_query.filter(
-            models.Customer.total_purchases >= min_value
-        )
-    
-    customers = customer_query.all()
-    customer_ids = [c.id for c in customers]
-    
-    # Create audience
+    # Create audience, then its members straight from the segment query
     db_audience = models.Audience(
         store_id=current_user.store_id,
         ad_account_id=ad_account.id,
@@ -834,19 +754,21 @@ async def create_audience(
         audience_type=audience.audience_type,
         platform=audience.platform,
         source_criteria=audience.source_criteria,
-        customer_ids=customer_ids,
-        size=len(customer_ids),
         created_by=current_user.id
     )
-    
     db.add(db_audience)
+    db.flush()
+    try:
+        size = refresh_audience_members(db, db_audience)["size"]
+    except SegmentError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
-    db.refresh(db_audience)
     
     return {
         "message": "Audience created successfully",
         "audience_id": db_audience.id,
-        "size": len(customer_ids)
+        "size": size
     }
 
 @router.get("/audiences")
@@ -863,7 +785,7 @@ async def get_audiences(
     return audiences
 
 @router.post("/audiences/{audience_id}/sync")
-async def sync_audience_to_platform(
+def sync_audience_to_platform(
     audience_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -877,36 +799,113 @@ async def sync_audience_to_platform(
     if not audience:
         raise HTTPException(status_code=404, detail="Audience not found")
     
-    # Get customers
-    customers = db.query(models.Customer).filter(
-        models.Customer.id.in_(audience.customer_ids)
-    ).all()
+    # Re-evaluate the audience and upload only what changed since the last sync
+    try:
+        result = sync_audience(db, audience)
+    except SegmentError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except AudienceUploadError as e:
+        db.rollback()
+        raise HTTPException(status_code=502, detail=f"Audience upload failed: {e}")
     
-    # Prepare customer data for upload
-    customer_data = []
-    for customer in customers:
-        customer_data.append({
-            "email": customer.email if customer.email else "",
-            "phone": customer.phone,
-            "fn": customer.name.split()[0] if customer.name else "",
-            "ln": customer.name.split()[-1] if len(customer.name.split()) > 1 else ""
-        })
+    return {
+        "message": "Audience synced successfully",
+        "size": result["size"],
+        "added": result["pushed_added"],
+        "removed": result["pushed_removed"]
+    }
+
+@router.get("/audiences/{audience_id}/export")
+def export_audience(
+    audience_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Download the audience as a hashed customer-list CSV for the platform's manual upload"""
+    audience = db.query(models.Audience).filter(
+        models.Audience.id == audience_id,
+        models.Audience.store_id == current_user.store_id
+    ).first()
+    
+    if not audience:
+        raise HTTPException(status_code=404, detail="Audience not found")
     
-    audience.last_synced_at = datetime.utcnow()
+    platform = getattr(audience.platform, "value", audience.platform)
+    return StreamingResponse(
+        stream_audience_csv(audience.id, platform),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="audience_{audience.id}_{platform}.csv"'}
+    )
+
+# ============ OFFLINE CONVERSIONS ============
+
+@router.post("/conversions/touchpoints")
+def record_touchpoint(
+    touchpoint: TouchpointCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Record an ad interaction of a known customer (e.g. a click id captured at
+    the counter) for sale attribution. occurred_at may be backdated, but only
+    sales from the last ATTRIBUTION_SETTLE_HOURS are still open to new credit.
+    """
+    if touchpoint.conversion_type not in TOUCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"conversion_type must be one of: {', '.join(TOUCH_TYPES)}")
+    campaign = db.query(models.AdCampaignCreation).filter(
+        models.AdCampaignCreation.id == touchpoint.campaign_id,
+        models.AdCampaignCreation.store_id == current_user.store_id
+    ).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    customer = db.query(models.Customer.id).filter(
+        models.Customer.id == touchpoint.customer_id,
+        models.Customer.store_id == current_user.store_id
+    ).first()
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    db_touchpoint = models.ConversionTracking(
+        store_id=current_user.store_id,
+        campaign_id=campaign.id,
+        conversion_type=touchpoint.conversion_type,
+        customer_id=touchpoint.customer_id,
+        platform=campaign.platform,
+        click_id=touchpoint.click_id,
+        utm_source=touchpoint.utm_source,
+        utm_medium=touchpoint.utm_medium,
+        utm_campaign=touchpoint.utm_campaign,
+        conversion_date=as_utc(touchpoint.occurred_at) if touchpoint.occurred_at else datetime.utcnow()
+    )
+    db.add(db_touchpoint)
     db.commit()
     
+    return {"message": "Touchpoint recorded", "touchpoint_id": db_touchpoint.id}
+
+@router.get("/attribution")
+def get_attribution(
+    model: str = Query(settings.ATTRIBUTION_MODEL, pattern="^(last_click|linear)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """POS sales and revenue attributed to each campaign (run by the sale_attribution job)"""
     return {
-        "message": "Audience synced successfully",
-        "size": len(customer_data)
+        "model": model,
+        "lookback_days": settings.ATTRIBUTION_LOOKBACK_DAYS,
+        "campaigns": attribution_report(db, current_user.store_id, model, start_date, end_date)
     }
 
 # ============ CAMPAIGN ANALYTICS ============
 
 @router.get("/campaigns/{campaign_id}/analytics")
-async def get_campaign_analytics(
+def get_campaign_analytics(
     campaign_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    bucket: str = Query("day", pattern="^(day|week|month)$", description="Group daily_data by day, week or month"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
@@ -922,30 +921,6 @@ async def get_campaign_analytics(
     if current_user.role == models.UserRole.STORE_MANAGER and campaign.store_id != current_user.store_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get analytics data
-    query = db.query(models.AdCampaignAnalytics).filter(
-        models.AdCampaignAnalytics.campaign_id == campaign_id
-    )
-    
-    if start_date:
-        query = query.filter(models.AdCampaignAnalytics.date >= start_date)
-    if end_date:
-        query = query.filter(models.AdCampaignAnalytics.date <= end_date)
-    
-    analytics = query.order_by(models.AdCampaignAnalytics.date.desc()).all()
-    
-    # Calculate totals
-    total_spend = sum(a.spend for a in analytics)
-    total_impressions = sum(a.impressions for a in analytics)
-    total_clicks = sum(a.clicks for a in analytics)
-    total_leads = sum(a.leads for a in analytics)
-    total_sales = sum(a.sales_attributed for a in analytics)
-    total_revenue = sum(a.revenue_attributed for a in analytics)
-    
-    avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-    avg_cpc = total_spend / total_clicks if total_clicks > 0 else 0
-    roas = total_revenue / total_spend if total_spend > 0 else 0
-    
     return {
         "campaign": {
             "id": campaign.id,
@@ -953,66 +928,18 @@ async def get_campaign_analytics(
             "status": campaign.status,
             "platform": campaign.platform
         },
-        "summary": {
-            "total_spend": round(total_spend, 2),
-            "total_impressions": total_impressions,
-            "total_clicks": total_clicks,
-            "total_leads": total_leads,
-            "total_sales": total_sales,
-            "total_revenue": round(total_revenue, 2),
-            "avg_ctr": round(avg_ctr, 2),
-            "avg_cpc": round(avg_cpc, 2),
-            "roas": round(roas, 2)
-        },
-        "daily_data": analytics
+        "summary": campaign_summary(db, campaign_id, start_date, end_date),
+        "bucket": bucket,
+        # Newest first; "date" is the first day of each bucket
+        "daily_data": campaign_series(db, campaign_id, bucket, start_date, end_date)
     }
 
 @router.get("/analytics/overview")
-async def get_ads_overview(
+def get_ads_overview(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get overall ads analytics for the store"""
-    # Get all campaigns for the store
-    campaigns = db.query(models.AdCampaignCreation).filter(
-        models.AdCampaignCreation.store_id == current_user.store_id
-    ).all()
-    
-    campaign_ids = [c.id for c in campaigns]
-    
-    # Get analytics
-    query = db.query(models.AdCampaignAnalytics).filter(
-        models.AdCampaignAnalytics.campaign_id.in_(campaign_ids)
-    )
-    
-    if start_date:
-        query = query.filter(models.AdCampaignAnalytics.date >= start_date)
-    if end_date:
-        query = query.filter(models.AdCampaignAnalytics.date <= end_date)
-    
-    analytics = query.all()
-    
-    # Calculate totals
-    total_spend = sum(a.spend for a in analytics)
-    total_impressions = sum(a.impressions for a in analytics)
-    total_clicks = sum(a.clicks for a in analytics)
-    total_leads = sum(a.leads for a in analytics)
-    total_store_visits = sum(a.store_visits for a in analytics)
-    total_sales = sum(a.sales_attributed for a in analytics)
-    total_revenue = sum(a.revenue_attributed for a in analytics)
-    
-    return {
-        "total_campaigns": len(campaigns),
-        "active_campaigns": len([c for c in campaigns if c.status == models.AdCampaignStatus.ACTIVE]),
-        "total_spend": round(total_spend, 2),
-        "total_impressions": total_impressions,
-        "total_clicks": total_clicks,
-        "total_leads": total_leads,
-        "total_store_visits": total_store_visits,
-        "total_sales": total_sales,
-        "total_revenue": round(total_revenue, 2),
-        "roas": round(total_revenue / total_spend if total_spend > 0 else 0, 2)
-    }
-
+    return store_overview(db, current_user.store_id, start_date, end_date)
@@ -1,17 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
-from datetime import datetime, timedelta
+from sqlalchemy import func, and_, case
+from datetime import date, datetime, timedelta
 from typing import Optional, List
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.db import models
-from app.api.dependencies import get_current_user
-from pydantic import BaseModel
-import numpy as np
+from app.api.dependencies import get_current_user, get_store_manager_or_admin, get_super_admin
+from app.services.recommendation_service import (
+    build_similarity_index,
+    recommend_for_customers,
+    get_index_status
+)
+from app.services.forecast_service import (
+    DEFAULT_HISTORY_DAYS,
+    DEFAULT_HORIZON_DAYS,
+    MAX_HISTORY_DAYS,
+    MAX_HORIZON_DAYS,
+    MIN_HISTORY_DAYS,
+    forecast_store_revenue,
+    run_demand_forecast,
+    build_reorder_plan
+)
+from app.services.rollup_service import build_sales_heatmap
+from app.services.anomaly_service import get_active_anomalies, format_alert
+from app.services import olap_service
+from pydantic import BaseModel, Field
 from collections import defaultdict
 
 router = APIRouter()
 
+MAX_BATCH_RECOMMENDATION_CUSTOMERS = 10000
+MAX_RECOMMENDATIONS_PER_CUSTOMER = 50
+
 # ============ SCHEMAS ============
 
 class SalesForecast(BaseModel):
@@ -33,73 +53,149 @@ class ProductRecommendation(BaseModel):
     confidence_score: float
     reason: str
 
+class BatchRecommendationRequest(BaseModel):
+    customer_ids: List[int]
+    limit: int = Field(5, ge=1, le=MAX_RECOMMENDATIONS_PER_CUSTOMER)
+
 # ============ AI-POWERED SALES FORECASTING ============
 
 @router.get("/forecast/sales")
 def forecast_sales(
-    days: int = 30,
+    days: int = Query(30, ge=1, le=MAX_HORIZON_DAYS),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """AI-powered sales forecasting using time series analysis"""
+    """AI-powered sales forecasting using trend + day-of-week seasonality"""
     
-    # Get historical sales data (last 90 days)
-    ninety_days_ago = datetime.now() - timedelta(days=90)
-    
-    query = db.query(
-        func.date(models.Sale.sale_date).label('date'),
-        func.sum(models.Sale.total_amount).label('total_sales')
-    ).filter(
-        models.Sale.sale_date >= ninety_days_ago
-    )
-    
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Sale.store_id == current_user.store_id)
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     
-    historical_data = query.group_by(func.date(models.Sale.sale_date)).all()
+    # Dense daily series over the last 90 days - days without sales count as zero
+    result = forecast_store_revenue(db, store_id, days, history_days=90)
     
-    if len(historical_data) < 7:
+    if result is None:
         raise HTTPException(status_code=400, detail="Insufficient data for forecasting")
     
-    # Simple moving average forecast with trend
-    sales_values = [float(row.total_sales) for row in historical_data]
-    
-    # Calculate trend
-    x = np.arange(len(sales_values))
-    z = np.polyfit(x, sales_values, 1)
-    trend = z[0]
-    
-    # Moving average
-    window = min(7, len(sales_values))
-    moving_avg = np.mean(sales_values[-window:])
-    
-    # Generate forecast
     forecasts = []
-    last_date = historical_data[-1].date
-    
-    for i in range(1, days + 1):
-        forecast_date = last_date + timedelta(days=i)
-        predicted_value = moving_avg + (trend * i)
-        
-        # Add confidence interval (±15%)
-        confidence_range = predicted_value * 0.15
-        
+    for i in range(days):
+        forecast_date = result["start_date"] + timedelta(days=i)
         forecasts.append({
             "date": forecast_date.strftime("%Y-%m-%d"),
-            "predicted_sales": round(predicted_value, 2),
-            "confidence_interval_low": round(predicted_value - confidence_range, 2),
-            "confidence_interval_high": round(predicted_value + confidence_range, 2)
+            "predicted_sales": round(float(result["forecast"][i]), 2),
+            "confidence_interval_low": round(float(result["lower"][i]), 2),
+            "confidence_interval_high": round(float(result["upper"][i]), 2)
         })
     
+    trend = result["slope"]
+    weekday_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    
     return {
         "forecast_period": f"{days} days",
         "trend": "increasing" if trend > 0 else "decreasing",
-        "trend_percentage": round(abs(trend) / moving_avg * 100, 2),
+        "trend_percentage": round(abs(trend) / result["history_mean"] * 100, 2) if result["history_mean"] else 0,
+        "weekly_seasonality": {
+            name: round(float(value), 2) for name, value in zip(weekday_names, result["seasonal"])
+        },
         "forecasts": forecasts
     }
 
+@router.post("/forecast/demand/run")
+def run_sku_demand_forecast(
+    background_tasks: BackgroundTasks,
+    store_id: Optional[int] = None,
+    horizon_days: int = Query(DEFAULT_HORIZON_DAYS, ge=1, le=MAX_HORIZON_DAYS),
+    history_days: int = Query(DEFAULT_HISTORY_DAYS, ge=MIN_HISTORY_DAYS, le=MAX_HISTORY_DAYS),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_store_manager_or_admin)
+):
+    """Forecast daily demand for every SKU of a store and persist it for reorder planning"""
+    if current_user.role != models.UserRole.SUPER_ADMIN or not store_id:
+        store_id = current_user.store_id
+    
+    if store_id is None:
+        raise HTTPException(status_code=400, detail="store_id is required")
+    if not db.query(models.Store.id).filter(models.Store.id == store_id).first():
+        raise HTTPException(status_code=404, detail="Store not found")
+    
+    background_tasks.add_task(_run_sku_demand_forecast, store_id, horizon_days, history_days)
+    return {"success": True, "message": "Demand forecast started", "store_id": store_id}
+
+def _run_sku_demand_forecast(store_id: int, horizon_days: int, history_days: int):
+    db = SessionLocal()
+    try:
+        run_demand_forecast(db, store_id, horizon=horizon_days, history_days=history_days)
+    finally:
+        db.close()
+
+@router.get("/forecast/demand/product/{product_id}")
+def get_product_demand_forecast(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Latest persisted daily demand forecast for one SKU"""
+    query = db.query(models.DemandForecast).filter(models.DemandForecast.product_id == product_id)
+    
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        query = query.filter(models.DemandForecast.store_id == current_user.store_id)
+    
+    forecast = query.first()
+    if not forecast:
+        raise HTTPException(status_code=404, detail="No forecast for this product yet")
+    
+    return {
+        "product_id": product_id,
+        "generated_at": forecast.generated_at.isoformat(),
+        "avg_daily_demand": forecast.avg_daily_demand,
+        "total_forecast": forecast.total_forecast,
+        "total_lower": forecast.total_lower,
+        "total_upper": forecast.total_upper,
+        "forecasts": [
+            {
+                "date": (forecast.start_date + timedelta(days=i)).strftime("%Y-%m-%d"),
+                "predicted_units": units
+            }
+            for i, units in enumerate(forecast.daily_forecast or [])
+        ]
+    }
+
+@router.get("/forecast/reorder-plan")
+def get_forecast_reorder_plan(
+    lead_time_days: int = Query(7, ge=0, le=MAX_HORIZON_DAYS),
+    safety_days: int = Query(3, ge=0, le=MAX_HORIZON_DAYS),
+    store_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Reorder suggestions driven by the persisted per-SKU demand forecasts"""
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        store_id = current_user.store_id
+    
+    plan = build_reorder_plan(db, store_id, lead_time_days, safety_days)
+    
+    return {
+        "lead_time_days": lead_time_days,
+        "safety_days": safety_days,
+        "total_items": len(plan),
+        "total_estimated_cost": round(sum(p["estimated_cost"] for p in plan), 2),
+        "reorder_plan": plan
+    }
+
 # ============ CUSTOMER SEGMENTATION (RFM ANALYSIS) ============
 
+def _rfm_segment(recency: int, frequency: int, monetary: float) -> str:
+    """Segment based on RFM"""
+    if recency <= 30 and frequency >= 5 and monetary >= 50000:
+        return "champions"
+    elif recency <= 60 and frequency >= 3:
+        return "loyal_customers"
+    elif recency <= 90 and frequency >= 2:
+        return "potential_loyalists"
+    elif recency > 90 and recency <= 180 and frequency >= 2:
+        return "at_risk"
+    elif recency > 180 and frequency >= 2:
+        return "hibernating"
+    return "lost"
+
 @router.get("/customers/segmentation")
 def customer_segmentation(
     db: Session = Depends(get_db),
@@ -107,13 +203,7 @@ def customer_segmentation(
 ):
     """Advanced RFM (Recency, Frequency, Monetary) customer segmentation"""
     
-    # Get all customers with their purchase history
-    query = db.query(models.Customer).filter(models.Customer.id.isnot(None))
-    
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Customer.store_id == current_user.store_id)
-    
-    customers = query.all()
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     
     segments = {
         "champions": {"customers": [], "avg_value": 0, "total_revenue": 0},
@@ -124,37 +214,41 @@ def customer_segmentation(
         "lost": {"customers": [], "avg_value": 0, "total_revenue": 0}
     }
     
-    for customer in customers:
-        # Get customer's sales
-        sales = db.query(models.Sale).filter(
-            models.Sale.customer_id == customer.id
-        ).all()
-        
-        if not sales:
-            continue
+    # Columnar mirror when enabled: one grouped scan instead of a query per customer
+    mirrored = olap_service.customer_rfm(store_id)
+    if mirrored is not None:
+        for row in mirrored:
+            recency = (datetime.now() - row["last_purchase"]).days
+            segment = _rfm_segment(recency, row["frequency"], row["monetary"])
+            segments[segment]["customers"].append(row["customer_id"])
+            segments[segment]["total_revenue"] += row["monetary"]
+    else:
+        # Get all customers with their purchase history
+        query = db.query(models.Customer).filter(models.Customer.id.isnot(None))
         
-        # Calculate RFM metrics
-        last_purchase = max(sale.sale_date for sale in sales)
-        recency = (datetime.now() - last_purchase).days
-        frequency = len(sales)
-        monetary = sum(sale.total_amount for sale in sales)
+        if store_id is not None:
+            query = query.filter(models.Customer.store_id == store_id)
         
-        # Segment based on RFM
-        if recency <= 30 and frequency >= 5 and monetary >= 50000:
-            segment = "champions"
-        elif recency <= 60 and frequency >= 3:
-            segment = "loyal_customers"
-        elif recency <= 90 and frequency >= 2:
-            segment = "potential_loyalists"
-        elif recency > 90 and recency <= 180 and frequency >= 2:
-            segment = "at_risk"
-        elif recency > 180 and frequency >= 2:
-            segment = "hibernating"
-        else:
-            segment = "lost"
+        customers = query.all()
         
-        segments[segment]["customers"].append(customer.id)
-        segments[segment]["total_revenue"] += monetary
+        for customer in customers:
+            # Get customer's sales
+            sales = db.query(models.Sale).filter(
+                models.Sale.customer_id == customer.id
+            ).all()
+            
+            if not sales:
+                continue
+            
+            # Calculate RFM metrics
+            last_purchase = max(sale.sale_date for sale in sales)
+            recency = (datetime.now() - last_purchase).days
+            frequency = len(sales)
+            monetary = sum(sale.total_amount for sale in sales)
+            
+            segment = _rfm_segment(recency, frequency, monetary)
+            segments[segment]["customers"].append(customer.id)
+            segments[segment]["total_revenue"] += monetary
     
     # Calculate averages
     result = []
@@ -183,87 +277,96 @@ def customer_segmentation(
 @router.get("/recommendations/customer/{customer_id}")
 def get_customer_recommendations(
     customer_id: int,
-    limit: int = 5,
+    limit: int = Query(5, ge=1, le=MAX_RECOMMENDATIONS_PER_CUSTOMER),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """AI-powered product recommendations based on purchase history"""
     
-    # Get customer's purchase history
-    customer_purchases = db.query(models.SaleItem.product_id).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
-    ).filter(
-        models.Sale.customer_id == customer_id
-    ).all()
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    recommendations = recommend_for_customers(db, [customer_id], limit, store_id)
     
-    purchased_product_ids = [p.product_id for p in customer_purchases]
+    if customer_id not in recommendations:
+        raise HTTPException(status_code=404, detail="Customer not found")
     
-    if not purchased_product_ids:
-        # New customer - recommend popular products
-        popular_products = db.query(
-            models.Product.id,
-            models.Product.name,
-            func.count(models.SaleItem.id).label('sales_count')
-        ).join(
-            models.SaleItem, models.Product.id == models.SaleItem.product_id
-        ).group_by(
-            models.Product.id, models.Product.name
-        ).order_by(
-            func.count(models.SaleItem.id).desc()
-        ).limit(limit).all()
-        
-        return {
-            "recommendations": [
-                {
-                    "product_id": p.id,
-                    "product_name": p.name,
-                    "confidence_score": 0.7,
-                    "reason": "Popular product - trending now"
-                }
-                for p in popular_products
-            ]
-        }
+    return {"recommendations": recommendations[customer_id]}
+
+@router.post("/recommendations/batch")
+def get_batch_recommendations(
+    request: BatchRecommendationRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Recommendations for many customers in one call (campaign personalization)"""
     
-    # Find products frequently bought together (collaborative filtering)
-    # Get customers who bought similar products
-    similar_customers = db.query(models.Sale.customer_id).join(
-        models.SaleItem, models.Sale.id == models.SaleItem.sale_id
-    ).filter(
-        models.SaleItem.product_id.in_(purchased_product_ids),
-        models.Sale.customer_id != customer_id
-    ).distinct().limit(50).all()
-    
-    similar_customer_ids = [c.customer_id for c in similar_customers]
-    
-    # Get products these similar customers bought
-    recommended_products = db.query(
-        models.Product.id,
-        models.Product.name,
-        func.count(models.SaleItem.id).label('frequency')
-    ).join(
-        models.SaleItem, models.Product.id == models.SaleItem.product_id
-    ).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
-    ).filter(
-        models.Sale.customer_id.in_(similar_customer_ids),
-        models.Product.id.notin_(purchased_product_ids)
-    ).group_by(
-        models.Product.id, models.Product.name
-    ).order_by(
-        func.count(models.SaleItem.id).desc()
-    ).limit(limit).all()
-    
-    recommendations = []
-    for product in recommended_products:
-        confidence = min(0.9, product.frequency / len(similar_customer_ids))
-        recommendations.append({
-            "product_id": product.id,
-            "product_name": product.name,
-            "confidence_score": round(confidence, 2),
-            "reason": "Customers like you also bought this"
-        })
+    if len(request.customer_ids) > MAX_BATCH_RECOMMENDATION_CUSTOMERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_RECOMMENDATION_CUSTOMERS} customers per request"
+        )
+    
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    recommendations = recommend_for_customers(db, request.customer_ids, request.limit, store_id)
     
-    return {"recommendations": recommendations}
+    return {
+        "total_customers": len(recommendations),
+        "results": [
+            {"customer_id": customer_id, "recommendations": items}
+            for customer_id, items in recommendations.items()
+        ]
+    }
+
+@router.get("/recommendations/index/status")
+def get_recommendation_index_status(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Status of the item-item similarity index"""
+    return get_index_status(db)
+
+@router.post("/recommendations/index/rebuild")
+def rebuild_recommendation_index(
+    background_tasks: BackgroundTasks,
+    top_k: int = 20,
+    current_user: models.User = Depends(get_store_manager_or_admin)
+):
+    """Rebuild the item-item similarity index in the background"""
+    background_tasks.add_task(_rebuild_recommendation_index, top_k)
+    return {"success": True, "message": "Recommendation index rebuild started"}
+
+def _rebuild_recommendation_index(top_k: int):
+    db = SessionLocal()
+    try:
+        build_similarity_index(db, top_k=top_k)
+    finally:
+        db.close()
+
+# ============ ANALYTICS MIRROR ============
+
+@router.get("/mirror/status")
+def get_analytics_mirror_status(
+    current_user: models.User = Depends(get_current_user)
+):
+    """Sync state of the columnar analytics mirror"""
+    return olap_service.analytics_mirror.status()
+
+@router.post("/mirror/sync")
+def sync_analytics_mirror(
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_super_admin)
+):
+    """Pull new rows into the analytics mirror now instead of waiting for the scheduled sync"""
+    if olap_service.duckdb is None:
+        raise HTTPException(status_code=400, detail="duckdb is not installed on this server")
+    background_tasks.add_task(_sync_analytics_mirror)
+    return {"success": True, "message": "Analytics mirror sync started"}
+
+def _sync_analytics_mirror():
+    db = SessionLocal()
+    try:
+        olap_service.sync_analytics_mirror(db)
+    finally:
+        db.close()
 
 # ============ COHORT ANALYSIS ============
 
@@ -276,6 +379,21 @@ def cohort_analysis(
     """Cohort retention analysis - Track customer retention over time"""
     
     start_date = datetime.now() - timedelta(days=months * 30)
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    
+    # Columnar mirror when enabled: every cohort and window in one query
+    mirrored = olap_service.cohort_retention(store_id, start_date, periods=6)
+    if mirrored is not None:
+        cohorts = {}
+        for row in mirrored:
+            cohort = cohorts.setdefault(row["cohort"], {
+                "cohort": row["cohort"],
+                "size": row["size"],
+                "retention": {f"month_{i}": 0.0 for i in range(6)}
+            })
+            if row["period"] is not None:
+                cohort["retention"][f"month_{row['period']}"] = round(row["active"] / row["size"] * 100, 2)
+        return {"cohort_analysis": list(cohorts.values())}
     
     # Get first purchase date for each customer
     first_purchases = db.query(
@@ -285,8 +403,8 @@ def cohort_analysis(
         models.Sale.sale_date >= start_date
     )
     
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        first_purchases = first_purchases.filter(models.Sale.store_id == current_user.store_id)
+    if store_id is not None:
+        first_purchases = first_purchases.filter(models.Sale.store_id == store_id)
     
     first_purchases = first_purchases.group_by(models.Sale.customer_id).all()
     
@@ -326,6 +444,33 @@ def cohort_analysis(
 
 # ============ CHURN PREDICTION ============
 
+def _churn_score(days_since_purchase: int, purchase_frequency: int, recent_3_avg: float, older_3_avg: float) -> int:
+    """Churn risk scoring"""
+    churn_score = 0
+    
+    # Recency factor (30% weight)
+    if days_since_purchase > 180:
+        churn_score += 30
+    elif days_since_purchase > 90:
+        churn_score += 20
+    elif days_since_purchase > 60:
+        churn_score += 10
+    
+    # Frequency factor (30% weight)
+    if purchase_frequency == 1:
+        churn_score += 30
+    elif purchase_frequency == 2:
+        churn_score += 15
+    
+    # Declining purchase pattern (40% weight)
+    if purchase_frequency >= 3:
+        if recent_3_avg < older_3_avg * 0.7:
+            churn_score += 40
+        elif recent_3_avg < older_3_avg:
+            churn_score += 20
+    
+    return churn_score
+
 @router.get("/predict/churn")
 def predict_customer_churn(
     db: Session = Depends(get_db),
@@ -333,68 +478,54 @@ def predict_customer_churn(
 ):
     """Predict which customers are at risk of churning"""
     
-    query = db.query(models.Customer)
-    
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Customer.store_id == current_user.store_id)
-    
-    customers = query.all()
-    
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     at_risk_customers = []
     
-    for customer in customers:
-        sales = db.query(models.Sale).filter(
-            models.Sale.customer_id == customer.id
-        ).order_by(models.Sale.sale_date.desc()).all()
-        
-        if not sales:
-            continue
-        
-        last_purchase = sales[0].sale_date
-        days_since_purchase = (datetime.now() - last_purchase).days
-        purchase_frequency = len(sales)
-        avg_order_value = sum(s.total_amount for s in sales) / len(sales)
-        
-        # Churn risk scoring
-        churn_score = 0
-        
-        # Recency factor (30% weight)
-        if days_since_purchase > 180:
-            churn_score += 30
-        elif days_since_purchase > 90:
-            churn_score += 20
-        elif days_since_purchase > 60:
-            churn_score += 10
-        
-        # Frequency factor (30% weight)
-        if purchase_frequency == 1:
-            churn_score += 30
-        elif purchase_frequency == 2:
-            churn_score += 15
-        
-        # Declining purchase pattern (40% weight)
-        if len(sales) >= 3:
-            recent_3_avg = sum(s.total_amount for s in sales[:3]) / 3
-            older_3_avg = sum(s.total_amount for s in sales[-3:]) / 3
-            
-            if recent_3_avg < older_3_avg * 0.7:
-                churn_score += 40
-            elif recent_3_avg < older_3_avg:
-                churn_score += 20
-        
+    def _add_if_at_risk(customer_id, name, phone, lifetime_value, days_since_purchase, purchase_frequency, recent_3_avg, older_3_avg):
+        churn_score = _churn_score(days_since_purchase, purchase_frequency, recent_3_avg, older_3_avg)
         if churn_score >= 50:
             risk_level = "high" if churn_score >= 70 else "medium"
             at_risk_customers.append({
-                "customer_id": customer.id,
-                "customer_name": customer.name,
-                "phone": customer.phone,
+                "customer_id": customer_id,
+                "customer_name": name,
+                "phone": phone,
                 "churn_score": churn_score,
                 "risk_level": risk_level,
                 "days_since_purchase": days_since_purchase,
-                "lifetime_value": round(customer.total_purchases, 2),
+                "lifetime_value": round(lifetime_value, 2),
                 "recommended_action": "Send personalized offer" if risk_level == "high" else "Send re-engagement email"
             })
     
+    # Columnar mirror when enabled: one windowed scan instead of a query per customer
+    mirrored = olap_service.churn_inputs(store_id)
+    if mirrored is not None:
+        for row in mirrored:
+            _add_if_at_risk(
+                row["customer_id"], row["name"], row["phone"], row["total_purchases"] or 0,
+                (datetime.now() - row["last_purchase"]).days, row["frequency"],
+                row["recent_3_avg"], row["older_3_avg"]
+            )
+    else:
+        query = db.query(models.Customer)
+        
+        if store_id is not None:
+            query = query.filter(models.Customer.store_id == store_id)
+        
+        for customer in query.all():
+            sales = db.query(models.Sale).filter(
+                models.Sale.customer_id == customer.id
+            ).order_by(models.Sale.sale_date.desc()).all()
+            
+            if not sales:
+                continue
+            
+            _add_if_at_risk(
+                customer.id, customer.name, customer.phone, customer.total_purchases,
+                (datetime.now() - sales[0].sale_date).days, len(sales),
+                sum(s.total_amount for s in sales[:3]) / 3,
+                sum(s.total_amount for s in sales[-3:]) / 3
+            )
+    
     # Sort by churn score
     at_risk_customers.sort(key=lambda x: x["churn_score"], reverse=True)
     
@@ -416,6 +547,22 @@ def product_affinity_analysis(
     """Market basket analysis - Products frequently bought together"""
     
     if product_id:
+        # Columnar mirror when enabled, otherwise the OLTP tables
+        mirrored = olap_service.product_affinity(product_id, limit)
+        if mirrored is not None:
+            return {
+                "product_id": product_id,
+                "frequently_bought_with": [
+                    {
+                        "product_id": p["id"],
+                        "product_name": p["name"],
+                        "co_occurrence_count": p["frequency"],
+                        "affinity_score": round(p["frequency"] / mirrored["total_sales"] * 100, 2)
+                    }
+                    for p in mirrored["rows"]
+                ]
+            }
+        
         # Find products bought together with this product
         sales_with_product = db.query(models.Sale.id).join(
             models.SaleItem, models.Sale.id == models.SaleItem.sale_id
@@ -461,6 +608,13 @@ def product_affinity_analysis(
 
 # ============ AUTOMATED INSIGHTS ============
 
+ANOMALY_RECOMMENDATIONS = {
+    "revenue": "Compare today's staffing, stock-outs and promotions against a normal day",
+    "transactions": "Check footfall drivers - store hours, local events, running campaigns",
+    "discount": "Audit discount overrides by cashier for today",
+    "expenses": "Verify the large expense entries and their vouchers"
+}
+
 @router.get("/insights/automated")
 def automated_insights(
     db: Session = Depends(get_db),
@@ -470,28 +624,27 @@ def automated_insights(
     
     insights = []
     
-    # Insight 1: Sales trend
-    last_30_days = datetime.now() - timedelta(days=30)
-    previous_30_days = datetime.now() - timedelta(days=60)
-    
-    query = db.query(func.sum(models.Sale.total_amount)).filter(
-        models.Sale.sale_date >= last_30_days
-    )
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Sale.store_id == current_user.store_id)
+    # Insight 1: Sales trend - last 30 days vs the 30 before, from the hourly rollup
+    today = date.today()
+    last_30_days = today - timedelta(days=29)
+    previous_30_days = last_30_days - timedelta(days=30)
     
-    recent_sales = query.scalar() or 0
-    
-    query = db.query(func.sum(models.Sale.total_amount)).filter(
-        models.Sale.sale_date >= previous_30_days,
-        models.Sale.sale_date < last_30_days
+    query = db.query(
+        func.sum(case((models.SalesHourlyRollup.date >= last_30_days, models.SalesHourlyRollup.revenue), else_=0)),
+        func.sum(case((models.SalesHourlyRollup.date < last_30_days, models.SalesHourlyRollup.revenue), else_=0))
+    ).filter(
+        models.SalesHourlyRollup.date >= previous_30_days,
+        models.SalesHourlyRollup.date <= today
     )
     
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Sale.store_id == current_user.store_id)
+    if store_id is not None:
+        query = query.filter(models.SalesHourlyRollup.store_id == store_id)
     
-    previous_sales = query.scalar() or 0
+    recent_sales, previous_sales = query.one()
+    recent_sales = recent_sales or 0
+    previous_sales = previous_sales or 0
     
     if previous_sales > 0:
         growth = ((recent_sales - previous_sales) / previous_sales) * 100
@@ -503,6 +656,18 @@ def automated_insights(
             "recommendation": "Continue current strategy" if growth > 0 else "Review marketing campaigns and customer engagement"
         })
     
+    # Anomalies flagged by the last baseline refresh
+    for anomaly in get_active_anomalies(db, store_id):
+        alert = format_alert(anomaly)
+        insights.append({
+            "type": f"{anomaly.metric}_anomaly",
+            "severity": "positive" if anomaly.severity == "success" else anomaly.severity,
+            "title": alert["title"],
+            "description": alert["message"],
+            "recommendation": ANOMALY_RECOMMENDATIONS[anomaly.metric],
+            "z_score": anomaly.z_score
+        })
+    
     # Insight 2: Low stock items
     low_stock = db.query(models.Product).filter(
         models.Product.current_stock <= models.Product.minimum_stock,
@@ -559,20 +724,23 @@ def peak_hours_analysis(
 ):
     """Analyze peak sales hours for optimal staffing"""
     
-    start_date = datetime.now() - timedelta(days=days)
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    end = date.today() + timedelta(days=1)
     
+    # Read the hourly rollup instead of scanning raw sales
     query = db.query(
-        extract('hour', models.Sale.sale_date).label('hour'),
-        func.count(models.Sale.id).label('transaction_count'),
-        func.sum(models.Sale.total_amount).label('total_sales')
+        models.SalesHourlyRollup.hour,
+        func.sum(models.SalesHourlyRollup.transactions).label('transaction_count'),
+        func.sum(models.SalesHourlyRollup.revenue).label('total_sales')
     ).filter(
-        models.Sale.sale_date >= start_date
+        models.SalesHourlyRollup.date >= end - timedelta(days=days),
+        models.SalesHourlyRollup.date < end
     )
     
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Sale.store_id == current_user.store_id)
+    if store_id is not None:
+        query = query.filter(models.SalesHourlyRollup.store_id == store_id)
     
-    results = query.group_by(extract('hour', models.Sale.sale_date)).all()
+    results = query.group_by(models.SalesHourlyRollup.hour).all()
     
     hourly_data = []
     for row in results:
@@ -600,3 +768,25 @@ def peak_hours_analysis(
     
     return {"hourly_breakdown": [], "peak_hours": []}
 
+@router.get("/analytics/sales-heatmap")
+def sales_heatmap(
+    days: int = 90,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    store_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Day-of-week x hour sales heatmap with percentile bands, for staff scheduling"""
+    
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        store_id = current_user.store_id
+    
+    # Half-open window [start, end)
+    end = (end_date or date.today()) + timedelta(days=1)
+    start = start_date or end - timedelta(days=days)
+    
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    
+    return build_sales_heatmap(db, store_id, start, end)
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
+from sqlalchemy import and_, extract
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.db import models
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, get_store_manager_or_admin
+from app.services.anomaly_service import get_active_anomalies, format_alert, get_baselines, refresh_baselines
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -187,30 +188,38 @@ def get_smart_alerts(
             "action": "restock"
         })
         
-    # 2. Daily Sales Velocity
-    today = datetime.now().date()
-    today_sales = db.query(func.sum(models.Sale.total_amount)).filter(
-        func.date(models.Sale.sale_date) == today,
-        **store_filter
-    ).scalar() or 0
-    
-    avg_sales = 50000 # Placeholder - in real app would be calculated from history
-    
-    if today_sales > avg_sales * 1.5:
-        alerts.append({
-            "severity": "success",
-            "title": "High Sales Velocity!",
-            "message": f"Sales are 50% higher than average today (₹{today_sales:,.0f}).",
-            "action": "view_report"
-        })
-    elif today_sales < avg_sales * 0.2 and datetime.now().hour > 18:
-        alerts.append({
-            "severity": "warning",
-            "title": "Low Daily Sales",
-            "message": "Sales are significantly lower than usual. Check store operations.",
-            "action": "view_report"
-        })
+    # 2. Revenue / footfall / discount / expense anomalies against each store's
+    # weekday baselines (precomputed by the scheduled baseline refresh)
+    for anomaly in get_active_anomalies(db, store_filter.get('store_id')):
+        alerts.append(format_alert(anomaly))
 
     return {"alerts": alerts}
 
+@router.get("/alerts/baselines")
+def get_metric_baselines(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Per-weekday baselines the smart alerts are scored against"""
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    return {"baselines": get_baselines(db, store_id)}
+
+@router.post("/alerts/baselines/refresh")
+def refresh_metric_baselines(
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_store_manager_or_admin)
+):
+    """Recompute baselines and anomaly flags now instead of waiting for the hourly run"""
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+
+    def _refresh():
+        db = SessionLocal()
+        try:
+            refresh_baselines(db, store_id=store_id)
+        finally:
+            db.close()
+
+    background_tasks.add_task(_refresh)
+    return {"success": True, "message": "Baseline refresh started"}
+
 
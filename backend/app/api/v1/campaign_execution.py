@@ -2,18 +2,22 @@
 Campaign Execution API
 Endpoints for executing marketing campaigns and sending messages
 """
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from pydantic import BaseModel
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.db import models
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, get_super_admin
 from app.services.marketing_service import (
-    execute_campaign,
-    send_campaign_message,
-    check_and_trigger_automated_campaigns
+    enqueue_campaign_run,
+    get_campaign_run_progress,
+    send_campaign_message
 )
+from app.services.campaign_trigger_service import run_trigger_check
+from app.services.queue_service import queue_stats, requeue
+from app.services.segment_service import SegmentError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,10 +33,10 @@ class ExecuteCampaignResponse(BaseModel):
     success: bool
     campaign_id: int
     campaign_name: str
-    total: int
-    sent: int
-    failed: int
-    errors: List[dict] = []
+    run_id: int
+    status: str
+    total_recipients: int
+    total_jobs: int
 
 
 class TestMessageRequest(BaseModel):
@@ -49,16 +53,16 @@ class TestMessageResponse(BaseModel):
 
 # ==================== ENDPOINTS ====================
 
-@router.post("/campaigns/{campaign_id}/execute", response_model=ExecuteCampaignResponse)
+@router.post("/campaigns/{campaign_id}/execute", response_model=ExecuteCampaignResponse, status_code=202)
 def execute_campaign_endpoint(
     campaign_id: int,
     request: ExecuteCampaignRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    Execute a campaign - send messages to customers
+    Execute a campaign - queue its messages for the delivery workers.
+    Poll /runs/{run_id} for progress.
     """
     try:
         # Verify campaign exists and belongs to user's store
@@ -70,21 +74,80 @@ def execute_campaign_endpoint(
         if not campaign:
             raise HTTPException(status_code=404, detail="Campaign not found")
         
-        # Execute campaign in background
-        result = execute_campaign(campaign_id, db, request.customer_ids)
+        run = enqueue_campaign_run(db, campaign, request.customer_ids, requested_by=current_user.id, skip_empty=True)
         
-        if not result.get("success"):
-            raise HTTPException(status_code=400, detail=result.get("error", "Failed to execute campaign"))
+        if run is None:
+            raise HTTPException(status_code=400, detail="No customers found")
         
-        return ExecuteCampaignResponse(**result)
+        return ExecuteCampaignResponse(
+            success=True,
+            campaign_id=campaign.id,
+            campaign_name=campaign.name,
+            run_id=run.id,
+            status=run.status,
+            total_recipients=run.total_recipients,
+            total_jobs=run.total_jobs
+        )
     
     except HTTPException:
         raise
+    except SegmentError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid targeting criteria: {e}")
     except Exception as e:
         logger.error(f"Error executing campaign: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/runs/{run_id}")
+def get_campaign_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Delivery progress of a queued campaign run
+    """
+    run = db.query(models.CampaignRun).join(models.Campaign).filter(
+        models.CampaignRun.id == run_id,
+        models.Campaign.store_id == current_user.store_id
+    ).first()
+    
+    if not run:
+        raise HTTPException(status_code=404, detail="Campaign run not found")
+    
+    return get_campaign_run_progress(db, run)
+
+
+@router.get("/campaigns/{campaign_id}/runs")
+def get_campaign_runs(
+    campaign_id: int,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Recent runs of a campaign, newest first
+    """
+    campaign = db.query(models.Campaign).filter(
+        models.Campaign.id == campaign_id,
+        models.Campaign.store_id == current_user.store_id
+    ).first()
+    
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    runs = db.query(models.CampaignRun).filter(
+        models.CampaignRun.campaign_id == campaign_id
+    ).order_by(models.CampaignRun.id.desc()).limit(limit).all()
+    
+    return {
+        "campaign_id": campaign_id,
+        "campaign_name": campaign.name,
+        "runs": [get_campaign_run_progress(db, run) for run in runs]
+    }
+
+
 @router.post("/campaigns/{campaign_id}/test", response_model=TestMessageResponse)
 def test_campaign_message(
     campaign_id: int,
@@ -135,13 +198,16 @@ def test_campaign_message(
 @router.get("/campaigns/{campaign_id}/logs")
 def get_campaign_logs(
     campaign_id: int,
-    skip: int = 0,
-    limit: int = 100,
+    before_id: Optional[int] = Query(None, description="next_before_id from the previous page"),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    Get campaign execution logs
+    Get campaign execution logs, newest first.
+
+    Keyset-paginated: pass the previous page's next_before_id to continue.
+    Totals come from the campaign's counters instead of a COUNT(*) per page.
     """
     try:
         # Verify campaign
@@ -153,17 +219,34 @@ def get_campaign_logs(
         if not campaign:
             raise HTTPException(status_code=404, detail="Campaign not found")
         
-        # Get logs
-        logs = db.query(models.CampaignLog).filter(
+        # Get logs - walks ix_campaign_logs_campaign_sent from the cursor
+        query = db.query(models.CampaignLog).options(joinedload(models.CampaignLog.customer)).filter(
             models.CampaignLog.campaign_id == campaign_id
-        ).order_by(models.CampaignLog.sent_at.desc()).offset(skip).limit(limit).all()
+        )
+        if before_id is not None:
+            anchor = db.query(models.CampaignLog.sent_at).filter(
+                models.CampaignLog.id == before_id,
+                models.CampaignLog.campaign_id == campaign_id
+            ).scalar()
+            if anchor is None:
+                raise HTTPException(status_code=400, detail="Unknown cursor")
+            query = query.filter(or_(
+                models.CampaignLog.sent_at < anchor,
+                and_(models.CampaignLog.sent_at == anchor, models.CampaignLog.id < before_id)
+            ))
+        logs = query.order_by(
+            models.CampaignLog.sent_at.desc(), models.CampaignLog.id.desc()
+        ).limit(limit + 1).all()
+        has_more = len(logs) > limit
+        logs = logs[:limit]
         
         return {
             "campaign_id": campaign_id,
             "campaign_name": campaign.name,
-            "total_logs": db.query(models.CampaignLog).filter(
-                models.CampaignLog.campaign_id == campaign_id
-            ).count(),
+            "total_sent": campaign.total_sent or 0,
+            "total_failed": campaign.total_failed or 0,
+            "has_more": has_more,
+            "next_before_id": logs[-1].id if has_more else None,
             "logs": [
                 {
                     "id": log.id,
@@ -189,16 +272,23 @@ def get_campaign_logs(
 @router.post("/automation/trigger")
 def trigger_automated_campaigns(
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Manually trigger automated campaign checks
-    (In production, this would be called by a cron job)
+    (the scheduler also runs them every CAMPAIGN_TRIGGER_INTERVAL_SECONDS)
     """
     try:
-        # Run in background
-        background_tasks.add_task(check_and_trigger_automated_campaigns, db)
+        # Run in background with its own session - the request's is closed by then.
+        # Shares the scheduled job's lease, so the two never run at once
+        def _check():
+            db = SessionLocal()
+            try:
+                run_trigger_check(db)
+            finally:
+                db.close()
+
+        background_tasks.add_task(_check)
         
         return {
             "success": True,
@@ -210,6 +300,60 @@ def trigger_automated_campaigns(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/queue/stats")
+def get_queue_stats(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_super_admin)
+):
+    """
+    Job counts per queue and status (Super Admin only)
+    """
+    return {"queues": queue_stats(db)}
+
+
+@router.get("/queue/dead")
+def get_dead_letter_jobs(
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_super_admin)
+):
+    """
+    Dead-lettered jobs, most recent first (Super Admin only)
+    """
+    jobs = db.query(models.QueueJob).filter(
+        models.QueueJob.status == "dead"
+    ).order_by(models.QueueJob.completed_at.desc()).limit(limit).all()
+    
+    return {
+        "jobs": [
+            {
+                "id": job.id,
+                "queue": job.queue,
+                "kind": job.kind,
+                "group_key": job.group_key,
+                "attempts": job.attempts,
+                "last_error": job.last_error,
+                "failed_at": job.completed_at.isoformat() if job.completed_at else None
+            }
+            for job in jobs
+        ]
+    }
+
+
+@router.post("/queue/jobs/{job_id}/requeue")
+def requeue_dead_letter_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_super_admin)
+):
+    """
+    Send a dead-lettered job back to its queue (Super Admin only)
+    """
+    if not requeue(db, job_id):
+        raise HTTPException(status_code=404, detail="Dead-lettered job not found")
+    return {"success": True, "job_id": job_id}
+
+
 @router.get("/settings/credentials")
 def get_marketing_credentials_status(
     current_user: models.User = Depends(get_current_user)
@@ -4,14 +4,41 @@ from typing import List
 from datetime import datetime
 from app.db.database import get_db
 from app.db import models
-from app.schemas.campaign import CampaignCreate, CampaignUpdate, CampaignResponse, CampaignStats
+from app.schemas.campaign import (
+    AudiencePreview, AudiencePreviewRequest, CampaignCreate, CampaignUpdate, CampaignResponse, CampaignStats
+)
 from app.api.dependencies import get_current_user, require_role
 from app.db.models import UserRole
+from app.services.retrieval_service import index_entities
+from app.services.segment_service import SegmentError, count_audience, validate_criteria
+from app.services.template_service import KNOWN_PLACEHOLDERS, validate_template
 import json
 import traceback
 
 router = APIRouter()
 
+def _check_message_template(template: str):
+    """Reject placeholders the renderer cannot fill, at save time rather than send time"""
+    unknown = validate_template(template)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Unknown placeholders in message template: {', '.join('{' + p + '}' for p in unknown)}. "
+                f"Available: {', '.join('{' + p + '}' for p in sorted(KNOWN_PLACEHOLDERS))}"
+            )
+        )
+
+def _check_target_customers(criteria):
+    """Reject targeting criteria the segment compiler cannot evaluate"""
+    try:
+        return validate_criteria(criteria)
+    except SegmentError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid targeting criteria: {e}"
+        )
+
 @router.post("/", response_model=CampaignResponse)
 def create_campaign(
     campaign: CampaignCreate,
@@ -35,6 +62,9 @@ def create_campaign(
                 detail=f"Store with ID {campaign.store_id} not found"
             )
         
+        _check_message_template(campaign.message_template)
+        _check_target_customers(campaign.target_customers)
+        
         # Create campaign with explicit field mapping
         db_campaign = models.Campaign(
             name=campaign.name,
@@ -54,6 +84,7 @@ def create_campaign(
             discount_percentage=campaign.discount_percentage,
             status=models.CampaignStatus.DRAFT,
             total_sent=0,
+            total_failed=0,
             total_opened=0,
             total_clicked=0,
             total_converted=0,
@@ -63,6 +94,7 @@ def create_campaign(
         db.add(db_campaign)
         db.commit()
         db.refresh(db_campaign)
+        index_entities(db, "campaign", [db_campaign.id])
         
         print(f"Campaign created with ID: {db_campaign.id}")
         
@@ -122,6 +154,26 @@ def get_campaigns(
     campaigns = query.order_by(models.Campaign.created_at.desc()).offset(skip).limit(limit).all()
     return campaigns
 
+@router.post("/audience/preview", response_model=AudiencePreview)
+def preview_audience(
+    preview: AudiencePreviewRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Dry run: how many customers the targeting criteria match (COUNT only, nothing is sent)"""
+    store_id = preview.store_id or current_user.store_id
+    if current_user.role != UserRole.SUPER_ADMIN and store_id != current_user.store_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    criteria = _check_target_customers(preview.target_customers)
+    return {
+        "store_id": store_id,
+        "target_customers": criteria,
+        "audience_size": count_audience(db, store_id, criteria)
+    }
+
 @router.get("/{campaign_id}", response_model=CampaignResponse)
 def get_campaign(
     campaign_id: int,
@@ -172,11 +224,16 @@ def update_campaign(
             )
     
     update_data = campaign_update.model_dump(exclude_unset=True)
+    if update_data.get("message_template") is not None:
+        _check_message_template(update_data["message_template"])
+    if "target_customers" in update_data:
+        _check_target_customers(update_data["target_customers"])
     for field, value in update_data.items():
         setattr(campaign, field, value)
     
     db.commit()
     db.refresh(campaign)
+    index_entities(db, "campaign", [campaign.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -191,6 +248,35 @@ def update_campaign(
     
     return campaign
 
+@router.get("/{campaign_id}/audience", response_model=AudiencePreview)
+def get_campaign_audience(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Dry run of a saved campaign's targeting: audience size via COUNT"""
+    campaign = db.query(models.Campaign).filter(models.Campaign.id == campaign_id).first()
+    
+    if not campaign:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Campaign not found"
+        )
+    
+    if current_user.role != UserRole.SUPER_ADMIN:
+        if campaign.store_id != current_user.store_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+    
+    criteria = _check_target_customers(campaign.target_customers)
+    return {
+        "store_id": campaign.store_id,
+        "target_customers": criteria,
+        "audience_size": count_audience(db, campaign.store_id, criteria)
+    }
+
 @router.post("/{campaign_id}/activate")
 def activate_campaign(
     campaign_id: int,
@@ -208,6 +294,7 @@ def activate_campaign(
     
     campaign.status = models.CampaignStatus.ACTIVE
     db.commit()
+    index_entities(db, "campaign", [campaign_id])
     
     return {"message": "Campaign activated successfully", "campaign_id": campaign_id}
 
@@ -228,6 +315,7 @@ def pause_campaign(
     
     campaign.status = models.CampaignStatus.PAUSED
     db.commit()
+    index_entities(db, "campaign", [campaign_id])
     
     return {"message": "Campaign paused successfully", "campaign_id": campaign_id}
 
@@ -255,6 +343,7 @@ def get_campaign_stats(
         "campaign_id": campaign.id,
         "campaign_name": campaign.name,
         "total_sent": campaign.total_sent,
+        "total_failed": campaign.total_failed or 0,
         "total_opened": campaign.total_opened,
         "total_clicked": campaign.total_clicked,
         "total_converted": campaign.total_converted,
@@ -316,6 +405,7 @@ def delete_campaign(
     
     db.delete(campaign)
     db.commit()
+    index_entities(db, "campaign", [campaign_id])
     
     # Create audit log
     audit_log = models.AuditLog(
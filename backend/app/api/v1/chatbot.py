@@ -1,36 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
+import logging
 import random
 import re
 
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.db import models
 from app.api.dependencies import get_current_user
+from app.core.config import settings
+from app.services.chat_history_service import (
+    get_conversation, start_conversation, prompt_history, record_exchange, summarize_conversation
+)
+from app.services.ollama_service import ollama, OllamaUnavailable
+from app.services.retrieval_service import mentioned_store, search_index
+from app.services.store_context_service import store_context_cache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Ollama API configuration
-OLLAMA_BASE_URL = "http://localhost:11434"
-OLLAMA_MODEL = "phi4"
-
-try:
-    import httpx
-except ImportError:
-    httpx = None
+RECORD_PROMPT_CHARS = 300  # Per retrieved record in prompts and offline answers
 
 class ChatRequest(BaseModel):
     message: str
-    conversation_history: Optional[List[dict]] = []
+    chat_id: Optional[int] = None  # Omit to start a new conversation
+    conversation_history: Optional[List[dict]] = []  # Only read when starting a conversation (older clients)
 
 class ChatResponse(BaseModel):
     response: str
     context_used: Optional[dict] = None
     mode: str = "ai"  # ai or simulated
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None
 
 # ==========================================
 # SIMULATED AI ENGINE (FALLBACK SYSTEM)
@@ -49,10 +57,14 @@ class SimulatedAI:
         self.customers = context.get("customers", {})
         self.financial = context.get("financial", {})
         self.store = context.get("store", {})
+        self.records = context.get("records", [])  # Retrieved documents matching the question
 
     def _format_currency(self, amount: float) -> str:
         return f"₹{amount:,.2f}"
 
+    def _format_records(self, records: List[Dict[str, Any]]) -> str:
+        return "\n".join(f"• **{r['title']}**: {r['content'][:RECORD_PROMPT_CHARS]}" for r in records)
+
     def _get_random_intro(self) -> str:
         intros = [
             "Based on the latest data, ",
@@ -118,6 +130,14 @@ Here are the most critical ones:
 
 💡 *Recommendation:* You should reorder these items soon to avoid lost sales."""
 
+        products = [r for r in self.records if r["entity_type"] == "product"]
+        if products:
+            return f"""📦 **Matching Products**
+
+{self._format_records(products)}
+
+Your inventory holds **{total} unique products** worth **{value}** in total."""
+
         return f"""📦 **Inventory Overview**
 
 {self._get_random_intro()}You currently have **{total} unique products** in stock.
@@ -238,6 +258,10 @@ All your expenses are properly categorized."""
 *Would you like to see a specific expense category in detail?*"""
 
     def _handle_unknown(self) -> str:
+        if self.records:
+            return f"""🔎 **Here's what I found in your records:**
+
+{self._format_records(self.records)}"""
         responses = [
             "I'm not quite sure about that specific detail, but I can tell you about your **sales, inventory, or customers**. Which would you prefer?",
             "I'm specialized in your store's data. Try asking: *'How are sales today?'* or *'Show me low stock items'.*",
@@ -251,100 +275,37 @@ All your expenses are properly categorized."""
 # ==========================================
 
 def get_store_context(db: Session, user: models.User) -> dict:
-    """Fetch user-specific store context"""
-    context = {}
-    store_filter = {}
-    
+    """Fetch user-specific store context (cached aggregate snapshot)"""
+    store_id = None
     if user.role != models.UserRole.SUPER_ADMIN and user.store_id:
-        store_filter = {"store_id": user.store_id}
-
+        store_id = user.store_id
     try:
-        # Inventory
-        products_query = db.query(models.Product)
-        if store_filter:
-            products_query = products_query.filter_by(**store_filter)
-        products = products_query.all()
-        
-        context["inventory"] = {
-            "total_products": len(products),
-            "total_inventory_value": sum((p.cost_price or 0) * (p.current_stock or 0) for p in products),
-            "low_stock_count": len([p for p in products if (p.current_stock or 0) <= (p.minimum_stock or 5)]),
-            "out_of_stock_count": len([p for p in products if (p.current_stock or 0) == 0]),
-            "low_stock_items": [{"name": p.name, "stock": p.current_stock, "min_level": p.minimum_stock} for p in products if (p.current_stock or 0) <= (p.minimum_stock or 5)][:10]
-        }
-
-        # Sales
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        sales_query = db.query(models.Sale).filter(models.Sale.sale_date >= thirty_days_ago)
-        if store_filter:
-            sales_query = sales_query.filter_by(**store_filter)
-        sales = sales_query.all()
-        
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_sales = [s for s in sales if s.sale_date >= today_start]
-        
-        total_rev = sum(s.total_amount for s in sales)
-        total_tx = len(sales)
-        
-        # Get top selling products
-        product_sales = {}
-        for sale in sales:
-            for item in sale.items:
-                product_name = item.product.name if item.product else "Unknown"
-                if product_name in product_sales:
-                    product_sales[product_name] += item.quantity
-                else:
-                    product_sales[product_name] = item.quantity
-        
-        top_products = [{"name": name, "quantity": qty} for name, qty in sorted(product_sales.items(), key=lambda x: x[1], reverse=True)[:10]]
-        
-        context["sales"] = {
-            "last_30_days_revenue": total_rev,
-            "last_30_days_transactions": total_tx,
-            "average_transaction_value": total_rev / total_tx if total_tx > 0 else 0,
-            "today_revenue": sum(s.total_amount for s in today_sales),
-            "today_transactions": len(today_sales),
-            "top_products": top_products
-        }
-
-        # Customers
-        cust_query = db.query(models.Customer)
-        if store_filter:
-            cust_query = cust_query.filter_by(**store_filter)
-        customers = cust_query.all()
-        
-        context["customers"] = {
-            "total_customers": len(customers),
-            "top_customers": [{"name": c.name, "total_purchases": c.total_purchases or 0} for c in sorted(customers, key=lambda x: x.total_purchases or 0, reverse=True)[:5]]
-        }
-
-        # Financial
-        exp_query = db.query(models.Expense).filter(models.Expense.expense_date >= thirty_days_ago)
-        if store_filter:
-            exp_query = exp_query.filter_by(**store_filter)
-        expenses = exp_query.all()
-        total_exp = sum(e.amount for e in expenses)
-        
-        # Group expenses by category
-        expense_by_category = {}
-        for exp in expenses:
-            cat = exp.category or "other"
-            expense_by_category[cat] = expense_by_category.get(cat, 0) + exp.amount
-        
-        context["financial"] = {
-            "last_30_days_expenses": total_exp,
-            "estimated_profit": total_rev - total_exp,
-            "expense_by_category": expense_by_category,
-            "expense_count": len(expenses)
-        }
-        
+        return store_context_cache.get(db, store_id)
     except Exception as e:
         print(f"Error building context: {e}")
-        
-    return context
+        return {}
+
+def find_records(db: Session, user: models.User, message: str) -> List[dict]:
+    """Top-k indexed products, customers, campaigns and reports matching the question, within the user's store"""
+    store_id = mentioned_store(message)  # Super admins may ask about one store
+    if user.role != models.UserRole.SUPER_ADMIN and user.store_id:
+        store_id = user.store_id
+    try:
+        return search_index.search(db, message, store_id=store_id, k=settings.CHAT_RETRIEVAL_TOP_K)
+    except Exception as e:
+        logger.warning(f"Error searching records: {e}")
+        return []
 
 def create_system_prompt(context: dict) -> str:
     """Enhanced system prompt for the real AI"""
+    records = ""
+    if context.get("records"):
+        lines = "\n".join(f"- {r['title']}: {r['content'][:RECORD_PROMPT_CHARS]}" for r in context["records"])
+        records = f"""
+RELEVANT RECORDS (matched to the question):
+-------------------
+{lines}
+"""
     return f"""You are the SKOPE ERP AI Assistant. Your goal is to be a helpful, professional, and data-driven business analyst for the store manager.
 
 STORE DATA SNAPSHOT:
@@ -353,46 +314,68 @@ STORE DATA SNAPSHOT:
 📦 Products: {context.get('inventory', {}).get('total_products', 0)}
 👥 Customers: {context.get('customers', {}).get('total_customers', 0)}
 ⚠️ Low Stock Items: {context.get('inventory', {}).get('low_stock_count', 0)}
-
+{records}
 GUIDELINES:
 1. Always use Indian Rupees (₹) for currency.
 2. Be concise but insightful. Don't just give a number; explain what it means.
-3. If specific data is missing in the snapshot, politely say you don't have that detail but can discuss general trends.
+3. Answer questions about specific products, customers or campaigns from the relevant records. If specific data is missing in the snapshot, politely say you don't have that detail but can discuss general trends.
 4. If the user asks about low stock, list the items if available.
 5. Maintain a professional, encouraging tone.
 
 Respond directly to the user's latest query using this context."""
 
+def build_ai_messages(context: dict, history: List[dict], message: str) -> List[dict]:
+    """System prompt, the bounded conversation history and the new message, in Ollama chat format"""
+    return [{"role": "system", "content": create_system_prompt(context)}] + history + [{"role": "user", "content": message}]
+
+def prepare_chat(db: Session, user: models.User, request: ChatRequest):
+    """Store context, conversation id and prompt history for a new message (runs in the threadpool)"""
+    if request.chat_id is not None:
+        conversation = get_conversation(db, user.id, request.chat_id)
+        if conversation is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        history = prompt_history(db, conversation)
+    else:
+        conversation = start_conversation(db, user.id, request.message)
+        db.commit()
+        history = (request.conversation_history or [])[-settings.CHAT_HISTORY_WINDOW:]
+    # The snapshot is shared through the cache, so records go into a copy
+    context = {**get_store_context(db, user), "records": find_records(db, user, request.message)}
+    return context, conversation.id, history
+
+def save_reply(chat_id: int, question: str, answer: str, mode: str) -> int:
+    """Store a streamed exchange with its own session (the stream outlives the request's)"""
+    db = SessionLocal()
+    try:
+        return record_exchange(db, chat_id, question, answer, mode).id
+    finally:
+        db.close()
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
 # ==========================================
 # ROUTERS
 # ==========================================
 
 @router.get("/status")
 async def check_ollama_status():
-    """Check AI service status"""
-    if httpx is None:
+    """Check AI service status (model availability is cached briefly)"""
+    status = await ollama.status()
+    if status["model_available"]:
         return {
             "status": "online",
-            "message": "Simulated AI Active (Standard Mode)",
+            "message": "AI Engine Online",
             "model_available": True,
-            "mode": "simulated"
+            "mode": "ai"
+        }
+    if status["online"]:
+        return {
+            "status": "model_missing",
+            "message": f"Model {ollama.model} missing",
+            "model_available": False,
+            "mode": "ai"
         }
-        
-    try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            resp = await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-            if resp.status_code == 200:
-                models = [m['name'] for m in resp.json().get('models', [])]
-                has_model = any(OLLAMA_MODEL in m for m in models)
-                return {
-                    "status": "online" if has_model else "model_missing",
-                    "message": "AI Engine Online" if has_model else f"Model {OLLAMA_MODEL} missing",
-                    "model_available": has_model,
-                    "mode": "ai"
-                }
-    except:
-        pass
-        
     return {
         "status": "online", 
         "message": "Simulated AI Active (Fallback Mode)",
@@ -400,76 +383,176 @@ async def check_ollama_status():
         "mode": "simulated"
     }
 
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
 @router.get("/chat/{chat_id}")
-async def get_chat(
+def get_chat(
     chat_id: int,
+    before_id: Optional[int] = Query(None, description="next_before_id from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Get a chat conversation by ID (for compatibility with RAG chatbot frontend)"""
+    """
+    Get a conversation with its latest messages (oldest first within the page).
+    Keyset-paginated backwards: pass next_before_id to load older messages.
+    """
+    conversation = get_conversation(db, current_user.id, chat_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    query = db.query(models.ChatMessage).filter(models.ChatMessage.conversation_id == chat_id)
+    if before_id is not None:
+        query = query.filter(models.ChatMessage.id < before_id)
+    messages = query.order_by(models.ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
     return {
-        "id": chat_id,
-        "title": f"Chat {chat_id}",
-        "messages": [],
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat()
+        "id": conversation.id,
+        "title": conversation.title,
+        "summary": conversation.summary,
+        "message_count": conversation.message_count,
+        "created_at": _iso(conversation.created_at),
+        "updated_at": _iso(conversation.updated_at),
+        "has_more": has_more,
+        "next_before_id": messages[-1].id if has_more else None,
+        "messages": [
+            {
+                "id": m.id,
+                "role": m.role,
+                "content": m.content,
+                "mode": m.mode,
+                "created_at": _iso(m.created_at)
+            }
+            for m in reversed(messages)
+        ]
     }
 
+@router.delete("/chat/{chat_id}")
+def delete_chat(
+    chat_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Delete a conversation and its messages"""
+    conversation = get_conversation(db, current_user.id, chat_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    db.delete(conversation)
+    db.commit()
+    return {"message": "Chat deleted successfully"}
+
 @router.get("/chats")
-async def list_chats(
+def list_chats(
+    before_id: Optional[int] = Query(None, description="next_before_id from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """List all chat conversations for the current user"""
+    """List the current user's conversations, most recently active first (keyset-paginated)"""
+    query = db.query(models.ChatConversation).filter(models.ChatConversation.user_id == current_user.id)
+    if before_id is not None:
+        anchor = db.query(models.ChatConversation.updated_at).filter(
+            models.ChatConversation.id == before_id,
+            models.ChatConversation.user_id == current_user.id
+        ).scalar()
+        if anchor is None:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+        query = query.filter(or_(
+            models.ChatConversation.updated_at < anchor,
+            and_(models.ChatConversation.updated_at == anchor, models.ChatConversation.id < before_id)
+        ))
+    chats = query.order_by(
+        models.ChatConversation.updated_at.desc(), models.ChatConversation.id.desc()
+    ).limit(limit + 1).all()
+    has_more = len(chats) > limit
+    chats = chats[:limit]
+
     return {
+        "has_more": has_more,
+        "next_before_id": chats[-1].id if has_more else None,
         "chats": [
             {
-                "id": 1,
-                "title": "New Conversation",
-                "preview": "Ask me anything about your store...",
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
+                "id": chat.id,
+                "title": chat.title,
+                "preview": chat.preview or "",
+                "message_count": chat.message_count,
+                "created_at": _iso(chat.created_at),
+                "updated_at": _iso(chat.updated_at)
             }
+            for chat in chats
         ]
     }
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    context = get_store_context(db, current_user)
+    context, chat_id, history = await run_in_threadpool(prepare_chat, db, current_user, request)
     
+    response_text, mode = None, "simulated"
     # Try using real AI first if available
-    if httpx:
+    if await ollama.available():
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Fast check if server is up
-                await client.get(f"{OLLAMA_BASE_URL}/api/tags")
-                
-                system_prompt = create_system_prompt(context)
-                messages = [{"role": "system", "content": system_prompt}] + request.conversation_history[-5:] + [{"role": "user", "content": request.message}]
-                
-                response = await client.post(
-                    f"{OLLAMA_BASE_URL}/api/chat",
-                    json={
-                        "model": OLLAMA_MODEL,
-                        "messages": messages,
-                        "stream": False,
-                        "options": {"temperature": 0.7}
-                    }
-                )
-                
-                if response.status_code == 200:
-                    ai_content = response.json().get("message", {}).get("content", "")
-                    if ai_content:
-                        return ChatResponse(response=ai_content, mode="ai")
-        except:
+            response_text = await ollama.chat(build_ai_messages(context, history, request.message))
+            mode = "ai"
+        except OllamaUnavailable:
             pass # Fall through to simulated AI
             
     # Use Simulated AI
-    sim_ai = SimulatedAI(context)
-    response_text = sim_ai.generate_response(request.message)
-    
-    return ChatResponse(response=response_text, mode="simulated")
+    if not response_text:
+        sim_ai = SimulatedAI(context)
+        response_text, mode = sim_ai.generate_response(request.message), "simulated"
+
+    reply = await run_in_threadpool(record_exchange, db, chat_id, request.message, response_text, mode)
+    background_tasks.add_task(summarize_conversation, chat_id)
+    return ChatResponse(response=response_text, mode=mode, chat_id=chat_id, message_id=reply.id)
+
+@router.post("/chat/stream")
+async def stream_chat_with_ai(
+    request: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Same as /chat, streamed as Server-Sent Events while the model generates:
+    data: {"token": "..."} per chunk, then data: {"done": true, "mode": "ai"|"simulated", "chat_id": ..., "message_id": ...}.
+    If the model fails mid-answer the stream ends with {"error": "...", "done": true}; the partial answer is kept.
+    """
+    context, chat_id, history = await run_in_threadpool(prepare_chat, db, current_user, request)
+    messages = build_ai_messages(context, history, request.message)
+    use_ai = await ollama.available()
+
+    async def events():
+        if use_ai:
+            tokens = []
+            try:
+                async for token in ollama.stream_chat(messages):
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+                if tokens:
+                    message_id = await run_in_threadpool(save_reply, chat_id, request.message, "".join(tokens), "ai")
+                    yield sse_event({"done": True, "mode": "ai", "chat_id": chat_id, "message_id": message_id})
+                    return
+            except OllamaUnavailable as e:
+                if tokens:
+                    message_id = await run_in_threadpool(save_reply, chat_id, request.message, "".join(tokens), "ai")
+                    yield sse_event({"error": "AI response interrupted", "done": True, "mode": "ai", "chat_id": chat_id, "message_id": message_id})
+                    return
+                logger.warning(f"Ollama stream failed, using simulated AI: {e}")
+        response_text = SimulatedAI(context).generate_response(request.message)
+        yield sse_event({"token": response_text})
+        message_id = await run_in_threadpool(save_reply, chat_id, request.message, response_text, "simulated")
+        yield sse_event({"done": True, "mode": "simulated", "chat_id": chat_id, "message_id": message_id})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(summarize_conversation, chat_id)
+    )
@@ -1,93 +1,69 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from app.db.database import get_db
 from app.db import models
 from app.api.dependencies import get_current_user
+from app.services.comparison_service import load_daily_totals, bucket_totals, store_names
 
 router = APIRouter()
 
+
+def _resolve_stores(current_user: models.User, store_id: Optional[int], store_ids: Optional[str]) -> Optional[List[int]]:
+    """Stores to compare - None means the whole chain (super admins only)"""
+    if current_user.role != models.UserRole.SUPER_ADMIN:
+        return [current_user.store_id]
+    if store_ids:
+        return [int(s.strip()) for s in store_ids.split(",") if s.strip()]
+    if store_id:
+        return [store_id]
+    return None
+
+
+def _store_series(db: Session, series: dict, selected: Optional[List[int]]) -> list:
+    """One series per requested store, for side-by-side charts"""
+    names = store_names(db, selected)
+    return [
+        {"store_id": sid, "store_name": names.get(sid), "data": series[sid]}
+        for sid in selected
+    ]
+
+
 @router.get("/daily-comparison")
 def get_daily_comparison(
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
     store_id: Optional[int] = None,
+    store_ids: Optional[str] = Query(None, description="Comma-separated store ids to compare side by side (super admin)"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get day-wise comparison of revenue and profit"""
-    
+
     try:
-        # Parse dates
-        start = datetime.strptime(start_date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-        end = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        # Determine store filter
-        user_store_filter = None
-        if current_user.role != models.UserRole.SUPER_ADMIN:
-            user_store_filter = current_user.store_id
-        elif store_id:
-            user_store_filter = store_id
-        
-        # Build sales query
-        sales_query = db.query(models.Sale)
-        if user_store_filter:
-            sales_query = sales_query.filter(models.Sale.store_id == user_store_filter)
-        
-        sales = sales_query.filter(
-            models.Sale.sale_date >= start,
-            models.Sale.sale_date <= end
-        ).all()
-        
-        # Build expenses query
-        expense_query = db.query(models.Expense)
-        if user_store_filter:
-            expense_query = expense_query.filter(models.Expense.store_id == user_store_filter)
-        
-        expenses = expense_query.filter(
-            models.Expense.expense_date >= start,
-            models.Expense.expense_date <= end
-        ).all()
-        
-        # Group by date
-        daily_data = {}
-        current_date = start
-        while current_date <= end:
-            date_str = current_date.strftime("%Y-%m-%d")
-            daily_data[date_str] = {
-                "date": date_str,
-                "revenue": 0,
-                "expenses": 0,
-                "profit": 0,
-                "transactions": 0
-            }
-            current_date += timedelta(days=1)
-        
-        # Aggregate sales
-        for sale in sales:
-            date_str = sale.sale_date.strftime("%Y-%m-%d")
-            if date_str in daily_data:
-                daily_data[date_str]["revenue"] += float(sale.total_amount)
-                daily_data[date_str]["transactions"] += 1
-        
-        # Aggregate expenses
-        for expense in expenses:
-            date_str = expense.expense_date.strftime("%Y-%m-%d")
-            if date_str in daily_data:
-                daily_data[date_str]["expenses"] += float(expense.amount)
-        
-        # Calculate profit
-        for date_str in daily_data:
-            daily_data[date_str]["profit"] = daily_data[date_str]["revenue"] - daily_data[date_str]["expenses"]
-        
-        return {
+        # Half-open range [start_date, end_date + 1 day)
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() + timedelta(days=1)
+        selected = _resolve_stores(current_user, store_id, store_ids)
+
+        series = bucket_totals(
+            load_daily_totals(db, selected, start, end),
+            keys=[start + timedelta(days=i) for i in range((end - start).days)],
+            key_of=lambda day: day,
+            label_of=lambda day: {"date": day.strftime("%Y-%m-%d")},
+            store_ids=selected
+        )
+
+        response = {
             "start_date": start_date,
             "end_date": end_date,
-            "data": list(daily_data.values())
+            "data": series[None]
         }
-    
+        if store_ids and selected:
+            response["stores"] = _store_series(db, series, selected)
+        return response
+
     except Exception as e:
         print(f"Daily comparison error: {e}")
         return {
@@ -102,77 +78,41 @@ def get_daily_comparison(
 def get_yearly_comparison(
     years: str = Query(..., description="Comma-separated years to compare (e.g., '2024,2025')"),
     store_id: Optional[int] = None,
+    store_ids: Optional[str] = Query(None, description="Comma-separated store ids to compare side by side (super admin)"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get yearly comparison of revenue and profit by month"""
-    
+
     try:
-        # Parse years
-        year_list = [int(y.strip()) for y in years.split(",")]
-        
-        # Determine store filter
-        user_store_filter = None
-        if current_user.role != models.UserRole.SUPER_ADMIN:
-            user_store_filter = current_user.store_id
-        elif store_id:
-            user_store_filter = store_id
-        
-        result = {}
-        
-        for year in year_list:
-            # Build sales query
-            sales_query = db.query(models.Sale)
-            if user_store_filter:
-                sales_query = sales_query.filter(models.Sale.store_id == user_store_filter)
-            
-            sales = sales_query.filter(
-                extract('year', models.Sale.sale_date) == year
-            ).all()
-            
-            # Build expenses query
-            expense_query = db.query(models.Expense)
-            if user_store_filter:
-                expense_query = expense_query.filter(models.Expense.store_id == user_store_filter)
-            
-            expenses = expense_query.filter(
-                extract('year', models.Expense.expense_date) == year
-            ).all()
-            
-            # Group by month
-            monthly_data = {}
-            for month in range(1, 13):
-                month_name = datetime(year, month, 1).strftime("%b")
-                monthly_data[month] = {
-                    "month": month_name,
-                    "revenue": 0,
-                    "expenses": 0,
-                    "profit": 0,
-                    "transactions": 0
-                }
-            
-            # Aggregate sales
-            for sale in sales:
-                month = sale.sale_date.month
-                monthly_data[month]["revenue"] += float(sale.total_amount)
-                monthly_data[month]["transactions"] += 1
-            
-            # Aggregate expenses
-            for expense in expenses:
-                month = expense.expense_date.month
-                monthly_data[month]["expenses"] += float(expense.amount)
-            
-            # Calculate profit
-            for month in monthly_data:
-                monthly_data[month]["profit"] = monthly_data[month]["revenue"] - monthly_data[month]["expenses"]
-            
-            result[str(year)] = list(monthly_data.values())
-        
-        return {
+        # Parse years - each once, in order, as the buckets are sliced by position
+        year_list = sorted({int(y) for y in years.split(",") if y.strip()})
+        selected = _resolve_stores(current_user, store_id, store_ids)
+
+        # One grouped read over [Jan 1 of the first year, Jan 1 after the last)
+        rows = load_daily_totals(db, selected, date(min(year_list), 1, 1), date(max(year_list) + 1, 1, 1))
+        series = bucket_totals(
+            rows,
+            keys=[(year, month) for year in year_list for month in range(1, 13)],
+            key_of=lambda day: (day.year, day.month),
+            label_of=lambda key: {"month": datetime(key[0], key[1], 1).strftime("%b")},
+            store_ids=selected
+        )
+
+        def by_year(entries):
+            return {str(year): entries[i * 12:(i + 1) * 12] for i, year in enumerate(year_list)}
+
+        response = {
             "years": year_list,
-            "data": result
+            "data": by_year(series[None])
         }
-    
+        if store_ids and selected:
+            response["stores"] = [
+                {**store, "data": by_year(store["data"])}
+                for store in _store_series(db, series, selected)
+            ]
+        return response
+
     except Exception as e:
         print(f"Yearly comparison error: {e}")
         return {
@@ -187,88 +127,57 @@ def get_monthly_comparison(
     year: int = Query(..., description="Year to compare"),
     months: str = Query(..., description="Comma-separated months to compare (e.g., '1,2,3')"),
     store_id: Optional[int] = None,
+    store_ids: Optional[str] = Query(None, description="Comma-separated store ids to compare side by side (super admin)"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get monthly comparison of revenue and profit by day"""
-    
+
     try:
-        # Parse months
-        month_list = [int(m.strip()) for m in months.split(",")]
-        
-        # Determine store filter
-        user_store_filter = None
-        if current_user.role != models.UserRole.SUPER_ADMIN:
-            user_store_filter = current_user.store_id
-        elif store_id:
-            user_store_filter = store_id
-        
-        result = {}
-        
+        # Parse months - each once, in order, as the buckets are sliced by position
+        month_list = sorted({int(m) for m in months.split(",") if m.strip()})
+        selected = _resolve_stores(current_user, store_id, store_ids)
+
+        # Day keys per requested month, bounded by each month's half-open range
+        keys = []
+        spans = []
         for month in month_list:
-            # Get month date range
-            start_date = datetime(year, month, 1)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1) - timedelta(seconds=1)
-            else:
-                end_date = datetime(year, month + 1, 1) - timedelta(seconds=1)
-            
-            # Build sales query
-            sales_query = db.query(models.Sale)
-            if user_store_filter:
-                sales_query = sales_query.filter(models.Sale.store_id == user_store_filter)
-            
-            sales = sales_query.filter(
-                models.Sale.sale_date >= start_date,
-                models.Sale.sale_date <= end_date
-            ).all()
-            
-            # Build expenses query
-            expense_query = db.query(models.Expense)
-            if user_store_filter:
-                expense_query = expense_query.filter(models.Expense.store_id == user_store_filter)
-            
-            expenses = expense_query.filter(
-                models.Expense.expense_date >= start_date,
-                models.Expense.expense_date <= end_date
-            ).all()
-            
-            # Group by day
-            days_in_month = (end_date - start_date).days + 1
-            daily_data = {}
-            for day in range(1, days_in_month + 1):
-                daily_data[day] = {
-                    "day": day,
-                    "revenue": 0,
-                    "expenses": 0,
-                    "profit": 0,
-                    "transactions": 0
-                }
-            
-            # Aggregate sales
-            for sale in sales:
-                day = sale.sale_date.day
-                daily_data[day]["revenue"] += float(sale.total_amount)
-                daily_data[day]["transactions"] += 1
-            
-            # Aggregate expenses
-            for expense in expenses:
-                day = expense.expense_date.day
-                daily_data[day]["expenses"] += float(expense.amount)
-            
-            # Calculate profit
-            for day in daily_data:
-                daily_data[day]["profit"] = daily_data[day]["revenue"] - daily_data[day]["expenses"]
-            
-            month_name = datetime(year, month, 1).strftime("%B")
-            result[month_name] = list(daily_data.values())
-        
-        return {
+            start = date(year, month, 1)
+            end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+            days_in_month = (end - start).days
+            spans.append((month, days_in_month))
+            keys += [(month, day) for day in range(1, days_in_month + 1)]
+
+        rows = load_daily_totals(db, selected, date(year, min(month_list), 1),
+                                 date(year + 1, 1, 1) if max(month_list) == 12 else date(year, max(month_list) + 1, 1))
+        series = bucket_totals(
+            rows,
+            keys=keys,
+            key_of=lambda day: (day.month, day.day),
+            label_of=lambda key: {"day": key[1]},
+            store_ids=selected
+        )
+
+        def by_month(entries):
+            result = {}
+            offset = 0
+            for month, days_in_month in spans:
+                result[datetime(year, month, 1).strftime("%B")] = entries[offset:offset + days_in_month]
+                offset += days_in_month
+            return result
+
+        response = {
             "year": year,
             "months": month_list,
-            "data": result
+            "data": by_month(series[None])
         }
-    
+        if store_ids and selected:
+            response["stores"] = [
+                {**store, "data": by_month(store["data"])}
+                for store in _store_series(db, series, selected)
+            ]
+        return response
+
     except Exception as e:
         print(f"Monthly comparison error: {e}")
         return {
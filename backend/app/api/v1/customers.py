@@ -6,6 +6,8 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas.customer import CustomerCreate, CustomerUpdate, CustomerResponse, CustomerWithPurchaseHistory
 from app.api.dependencies import get_current_user
+from app.services.retrieval_service import index_entities
+from app.services.store_context_service import store_context_cache
 import json
 
 router = APIRouter()
@@ -32,6 +34,8 @@ def create_customer(
     db.add(db_customer)
     db.commit()
     db.refresh(db_customer)
+    store_context_cache.invalidate(db_customer.store_id)
+    index_entities(db, "customer", [db_customer.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -175,6 +179,8 @@ def update_customer(
     
     db.commit()
     db.refresh(customer)
+    store_context_cache.invalidate(customer.store_id)
+    index_entities(db, "customer", [customer.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -221,6 +227,8 @@ def delete_customer(
     
     db.delete(customer)
     db.commit()
+    store_context_cache.invalidate(customer.store_id)
+    index_entities(db, "customer", [customer.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -6,6 +6,7 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas.financial import ExpenseCreate, ExpenseUpdate, ExpenseResponse, DailyClosingReport
 from app.api.dependencies import get_current_user, get_store_manager_or_admin
+from app.services.store_context_service import store_context_cache
 import json
 import os
 import shutil
@@ -31,6 +32,7 @@ def create_expense(
     db.add(db_expense)
     db.commit()
     db.refresh(db_expense)
+    store_context_cache.invalidate(db_expense.store_id)
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -171,6 +173,7 @@ def update_expense(
     
     db.commit()
     db.refresh(expense)
+    store_context_cache.invalidate(expense.store_id)
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -209,6 +212,7 @@ def delete_expense(
     
     db.delete(expense)
     db.commit()
+    store_context_cache.invalidate(expense.store_id)
     
     # Create audit log
     audit_log = models.AuditLog(
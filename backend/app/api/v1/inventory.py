@@ -5,6 +5,8 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, BatchCreate, BatchResponse
 from app.api.dependencies import get_current_user, get_store_manager_or_admin
+from app.services.retrieval_service import index_entities
+from app.services.store_context_service import store_context_cache
 import json
 
 router = APIRouter()
@@ -31,6 +33,8 @@ def create_product(
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    store_context_cache.invalidate(db_product.store_id)
+    index_entities(db, "product", [db_product.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -122,6 +126,8 @@ def update_product(
     
     db.commit()
     db.refresh(product)
+    store_context_cache.invalidate(product.store_id)
+    index_entities(db, "product", [product.id])
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -174,6 +180,8 @@ def create_batch(
     
     db.commit()
     db.refresh(db_batch)
+    store_context_cache.invalidate(product.store_id)
+    index_entities(db, "product", [product.id])
     
     # Create audit log
     audit_log = models.AuditLog(
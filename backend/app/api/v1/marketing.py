@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from datetime import datetime
 from app.db.database import get_db
 from app.db import models
 from app.schemas.marketing import (
@@ -13,6 +12,7 @@ from app.schemas.marketing import (
     MetaAdsAuthRequest
 )
 from app.api.dependencies import get_current_user
+from app.services.ad_sync_service import AdSyncError, get_client, sync_integrations
 import json
 
 router = APIRouter()
@@ -138,95 +138,51 @@ def delete_integration(
     
     return {"success": True, "message": "Integration deleted"}
 
-@router.post("/sync/google-ads/{integration_id}")
-def sync_google_ads_campaigns(
-    integration_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    """
-    Sync campaigns from Google Ads
-    In production, this would:
-    1. Fetch campaigns from Google Ads API
-    2. Update local database with campaign performance
-    3. Return summary of synced campaigns
-    """
+def _sync_integration(db: Session, integration_id: int, platform: str, label: str) -> dict:
     integration = db.query(models.MarketingIntegration).filter(
         models.MarketingIntegration.id == integration_id,
-        models.MarketingIntegration.platform == "google_ads"
+        models.MarketingIntegration.platform == platform
     ).first()
     
     if not integration:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Google Ads integration not found"
+            detail=f"{label} integration not found"
+        )
+    if not integration.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{label} integration is not active"
         )
-    
-    # SIMULATION: Create mock synced campaigns for demonstration
-    mock_campaigns = [
-        {
-            "external_campaign_id": f"GOOG-{datetime.now().strftime('%M%S')}-1",
-            "campaign_name": "Summer Sale Search - " + datetime.now().strftime("%B"),
-            "status": "active",
-            "impressions": 15420,
-            "clicks": 845,
-            "conversions": 124,
-            "spend": 450.50,
-            "ctr": 5.48,
-            "cpc": 0.53,
-            "roas": 4.2
-        },
-        {
-            "external_campaign_id": f"GOOG-{datetime.now().strftime('%M%S')}-2",
-            "campaign_name": "Brand Awareness Display",
-            "status": "active",
-            "impressions": 45000,
-            "clicks": 120,
-            "conversions": 15,
-            "spend": 150.00,
-            "ctr": 0.27,
-            "cpc": 1.25,
-            "roas": 1.5
-        }
-    ]
-
-    count = 0
-    for mock in mock_campaigns:
-        # Check if exists
-        exists = db.query(models.MarketingCampaignSync).filter(
-            models.MarketingCampaignSync.integration_id == integration_id,
-            models.MarketingCampaignSync.external_campaign_id == mock["external_campaign_id"]
-        ).first()
 
-        if not exists:
-            sync_record = models.MarketingCampaignSync(
-                integration_id=integration_id,
-                platform="google_ads",
-                external_campaign_id=mock["external_campaign_id"],
-                campaign_name=mock["campaign_name"],
-                status=mock["status"],
-                impressions=mock["impressions"],
-                clicks=mock["clicks"],
-                conversions=mock["conversions"],
-                spend=mock["spend"],
-                ctr=mock["ctr"],
-                cpc=mock["cpc"],
-                roas=mock["roas"],
-                last_synced_at=datetime.utcnow()
-            )
-            db.add(sync_record)
-            count += 1
-    
-    # Update integration last synced time
-    integration.last_sync_at = datetime.utcnow()
-    db.commit()
+    try:
+        client = get_client()
+        result = sync_integrations(db, integration_ids=[integration_id], client=client)
+    except AdSyncError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    if result["failed"]:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"{label} sync failed: {result['errors'][integration_id]}"
+        )
 
-    return {
+    response = {
         "success": True,
-        "message": "Google Ads sync completed",
-        "campaigns_synced": count,
-        "note": "Simulated data for demonstration"
+        "message": f"{label} sync completed",
+        "campaigns_synced": result["campaigns"]
     }
+    if client.simulated:
+        response["note"] = "Simulated data for demonstration"
+    return response
+
+@router.post("/sync/google-ads/{integration_id}")
+def sync_google_ads_campaigns(
+    integration_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Sync campaigns and their latest performance from Google Ads"""
+    return _sync_integration(db, integration_id, "google_ads", "Google Ads")
 
 @router.post("/sync/meta-ads/{integration_id}")
 def sync_meta_ads_campaigns(
@@ -234,86 +190,26 @@ def sync_meta_ads_campaigns(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """
-    Sync campaigns from Meta Ads
-    In production, this would:
-    1. Fetch campaigns from Meta Marketing API
-    2. Update local database with campaign performance
-    3. Return summary of synced campaigns
-    """
-    integration = db.query(models.MarketingIntegration).filter(
-        models.MarketingIntegration.id == integration_id,
-        models.MarketingIntegration.platform == "meta_ads"
-    ).first()
-    
-    if not integration:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Meta Ads integration not found"
-        )
-    
-    # SIMULATION: Create mock synced campaigns for Meta
-    mock_campaigns = [
-        {
-            "external_campaign_id": f"META-{datetime.now().strftime('%M%S')}-1",
-            "campaign_name": "Instagram Story Retargeting",
-            "status": "active",
-            "impressions": 85000,
-            "clicks": 1560,
-            "conversions": 89,
-            "spend": 850.00,
-            "ctr": 1.83,
-            "cpc": 0.54,
-            "roas": 3.5
-        },
-        {
-            "external_campaign_id": f"META-{datetime.now().strftime('%M%S')}-2",
-            "campaign_name": "Facebook Feed Prospection",
-            "status": "active",
-            "impressions": 120500,
-            "clicks": 3400,
-            "conversions": 150,
-            "spend": 1200.00,
-            "ctr": 2.82,
-            "cpc": 0.35,
-            "roas": 2.8
-        }
-    ]
-
-    count = 0
-    for mock in mock_campaigns:
-        exists = db.query(models.MarketingCampaignSync).filter(
-            models.MarketingCampaignSync.integration_id == integration_id,
-            models.MarketingCampaignSync.external_campaign_id == mock["external_campaign_id"]
-        ).first()
-
-        if not exists:
-            sync_record = models.MarketingCampaignSync(
-                integration_id=integration_id,
-                platform="meta_ads",
-                external_campaign_id=mock["external_campaign_id"],
-                campaign_name=mock["campaign_name"],
-                status=mock["status"],
-                impressions=mock["impressions"],
-                clicks=mock["clicks"],
-                conversions=mock["conversions"],
-                spend=mock["spend"],
-                ctr=mock["ctr"],
-                cpc=mock["cpc"],
-                roas=mock["roas"],
-                last_synced_at=datetime.utcnow()
-            )
-            db.add(sync_record)
-            count += 1
-            
-    integration.last_sync_at = datetime.utcnow()
-    db.commit()
+    """Sync campaigns and their latest performance from Meta Ads"""
+    return _sync_integration(db, integration_id, "meta_ads", "Meta Ads")
 
+@router.post("/sync/all")
+def sync_all_campaigns(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Sync every active Google / Meta Ads integration of the store (all stores for super admins) concurrently"""
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    try:
+        result = sync_integrations(db, store_id=store_id)
+    except AdSyncError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
     return {
-        "success": True,
-        "message": "Meta Ads sync completed",
-        "campaigns_synced": count,
-        "note": "Simulated data for demonstration"
+        "success": result["failed"] == 0,
+        "integrations_synced": result["integrations"],
+        "integrations_failed": result["failed"],
+        "campaigns_synced": result["campaigns"],
+        "errors": {str(integration_id): error for integration_id, error in result["errors"].items()}
     }
 
 @router.get("/campaigns/synced", response_model=List[MarketingCampaignSyncResponse])
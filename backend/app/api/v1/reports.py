@@ -6,6 +6,7 @@ from typing import Optional, List
 from app.db.database import get_db
 from app.db import models
 from app.api.dependencies import get_current_user
+from app.services import olap_service
 import io
 import pandas as pd
 from pydantic import BaseModel
@@ -580,37 +581,42 @@ def get_item_wise_margin_report(
     if not end_date:
         end_date = datetime.now()
     
-    # Query sales with margin calculation
-    query = db.query(
-        models.Product.name,
-        models.Product.sku,
-        models.Product.cost_price,
-        func.avg(models.SaleItem.unit_price).label('avg_selling_price'),
-        func.sum(models.SaleItem.quantity).label('quantity_sold'),
-        func.sum(models.Sale.discount * models.SaleItem.total_price / func.nullif(models.Sale.total_amount, 0)).label('total_discount'),
-        func.sum(models.SaleItem.total_price - (models.Product.cost_price * models.SaleItem.quantity)).label('total_margin')
-    ).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
-    ).join(
-        models.Product, models.SaleItem.product_id == models.Product.id
-    ).filter(
-        models.Sale.sale_date >= start_date,
-        models.Sale.sale_date <= end_date
-    )
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    
+    # Columnar mirror when enabled, otherwise the OLTP tables
+    results = olap_service.item_wise_margin(store_id, start_date, end_date)
+    if results is None:
+        # Query sales with margin calculation
+        query = db.query(
+            models.Product.name,
+            models.Product.sku,
+            models.Product.cost_price,
+            func.avg(models.SaleItem.unit_price).label('avg_selling_price'),
+            func.sum(models.SaleItem.quantity).label('quantity_sold'),
+            func.sum(models.Sale.discount * models.SaleItem.total_price / func.nullif(models.Sale.total_amount, 0)).label('total_discount'),
+            func.sum(models.SaleItem.total_price - (models.Product.cost_price * models.SaleItem.quantity)).label('total_margin')
+        ).join(
+            models.Sale, models.SaleItem.sale_id == models.Sale.id
+        ).join(
+            models.Product, models.SaleItem.product_id == models.Product.id
+        ).filter(
+            models.Sale.sale_date >= start_date,
+            models.Sale.sale_date <= end_date
+        )
     
-    # Filter by store
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Product.store_id == current_user.store_id)
+        # Filter by store
+        if store_id is not None:
+            query = query.filter(models.Product.store_id == store_id)
     
-    results = query.group_by(models.Product.id, models.Product.name, models.Product.sku, models.Product.cost_price).all()
+        results = [row._asdict() for row in query.group_by(models.Product.id, models.Product.name, models.Product.sku, models.Product.cost_price)]
     
     margin_report = []
     for row in results:
-        cost_price = float(row.cost_price or 0)
-        selling_price = float(row.avg_selling_price or 0)
-        quantity_sold = int(row.quantity_sold or 0)
-        total_discount = float(row.total_discount or 0)
-        total_margin = float(row.total_margin or 0)
+        cost_price = float(row["cost_price"] or 0)
+        selling_price = float(row["avg_selling_price"] or 0)
+        quantity_sold = int(row["quantity_sold"] or 0)
+        total_discount = float(row["total_discount"] or 0)
+        total_margin = float(row["total_margin"] or 0)
         
         # Calculate per-unit net margin (selling price - cost price)
         per_unit_margin = selling_price - cost_price
@@ -619,8 +625,8 @@ def get_item_wise_margin_report(
         margin_percent = ((selling_price - cost_price) / selling_price * 100) if selling_price > 0 else 0
         
         margin_report.append({
-            "item_name": row.name,
-            "sku": row.sku,
+            "item_name": row["name"],
+            "sku": row["sku"],
             "purchase_price": round(cost_price, 2),
             "selling_price": round(selling_price, 2),
             "discount": round(total_discount, 2),
@@ -647,34 +653,39 @@ def get_brand_wise_profitability(
     if not end_date:
         end_date = datetime.now()
     
-    # Query by brand
-    query = db.query(
-        models.Product.brand,
-        func.sum(models.SaleItem.total_price).label('revenue'),
-        func.sum(models.SaleItem.total_price - (models.Product.cost_price * models.SaleItem.quantity)).label('gross_profit')
-    ).join(
-        models.Sale, models.SaleItem.sale_id == models.Sale.id
-    ).join(
-        models.Product, models.SaleItem.product_id == models.Product.id
-    ).filter(
-        models.Sale.sale_date >= start_date,
-        models.Sale.sale_date <= end_date
-    )
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     
-    # Filter by store
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Product.store_id == current_user.store_id)
+    # Columnar mirror when enabled, otherwise the OLTP tables
+    results = olap_service.brand_profitability(store_id, start_date, end_date)
+    if results is None:
+        # Query by brand
+        query = db.query(
+            models.Product.brand,
+            func.sum(models.SaleItem.total_price).label('revenue'),
+            func.sum(models.SaleItem.total_price - (models.Product.cost_price * models.SaleItem.quantity)).label('gross_profit')
+        ).join(
+            models.Sale, models.SaleItem.sale_id == models.Sale.id
+        ).join(
+            models.Product, models.SaleItem.product_id == models.Product.id
+        ).filter(
+            models.Sale.sale_date >= start_date,
+            models.Sale.sale_date <= end_date
+        )
+    
+        # Filter by store
+        if store_id is not None:
+            query = query.filter(models.Product.store_id == store_id)
     
-    results = query.group_by(models.Product.brand).all()
+        results = [row._asdict() for row in query.group_by(models.Product.brand)]
     
     brand_report = []
     for row in results:
-        revenue = float(row.revenue or 0)
-        gross_profit = float(row.gross_profit or 0)
+        revenue = float(row["revenue"] or 0)
+        gross_profit = float(row["gross_profit"] or 0)
         margin_percent = (gross_profit / revenue * 100) if revenue > 0 else 0
         
         brand_report.append({
-            "brand": row.brand or "Unknown",
+            "brand": row["brand"] or "Unknown",
             "revenue": round(revenue, 2),
             "gross_profit": round(gross_profit, 2),
             "margin_percent": round(margin_percent, 2)
@@ -699,21 +710,30 @@ def get_discount_impact_report(
     if not end_date:
         end_date = datetime.now()
     
-    # Query sales with discount
-    query = db.query(models.Sale).filter(
-        models.Sale.sale_date >= start_date,
-        models.Sale.sale_date <= end_date
-    )
-    
-    # Filter by store
-    if current_user.role != models.UserRole.SUPER_ADMIN:
-        query = query.filter(models.Sale.store_id == current_user.store_id)
-    
-    sales = query.all()
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
     
-    total_discount = sum(sale.discount for sale in sales)
-    total_sales_value = sum(sale.total_amount + sale.discount for sale in sales)
-    total_actual_sales = sum(sale.total_amount for sale in sales)
+    # Columnar mirror when enabled, otherwise the OLTP tables
+    totals = olap_service.discount_totals(store_id, start_date, end_date)
+    if totals is not None:
+        total_discount = float(totals["total_discount"])
+        total_actual_sales = float(totals["total_amount"])
+        total_sales_value = total_actual_sales + total_discount
+    else:
+        # Query sales with discount
+        query = db.query(models.Sale).filter(
+            models.Sale.sale_date >= start_date,
+            models.Sale.sale_date <= end_date
+        )
+        
+        # Filter by store
+        if store_id is not None:
+            query = query.filter(models.Sale.store_id == store_id)
+        
+        sales = query.all()
+        
+        total_discount = sum(sale.discount for sale in sales)
+        total_sales_value = sum(sale.total_amount + sale.discount for sale in sales)
+        total_actual_sales = sum(sale.total_amount for sale in sales)
     
     # Calculate profit erosion (simplified)
     profit_erosion = total_discount * 0.7  # Assuming 70% of discount eats into profit
@@ -7,6 +7,9 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas.sale import SaleCreate, SaleResponse, DailySalesStats, MonthlySalesStats
 from app.api.dependencies import get_current_user
+from app.services.rollup_service import record_sale
+from app.services.retrieval_service import index_entities
+from app.services.store_context_service import store_context_cache
 import json
 import random
 
@@ -107,9 +110,16 @@ def create_sale(
         customer = db.query(models.Customer).filter(models.Customer.id == sale.customer_id).first()
         if customer:
             customer.total_purchases += total_amount
+            customer.last_purchase_date = db_sale.sale_date or datetime.now()
+    
+    # Keep the hourly sales rollup in step with the sale (same transaction)
+    record_sale(db, db_sale)
     
     db.commit()
     db.refresh(db_sale)
+    store_context_cache.invalidate(db_sale.store_id)
+    index_entities(db, "product", [item.product_id for item in sale.items])
+    index_entities(db, "customer", [db_sale.customer_id])
     
     # Create audit log
     audit_log = models.AuditLog(
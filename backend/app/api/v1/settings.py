@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.db import models
 from app.api.dependencies import get_current_user, get_super_admin
+from app.services.settings_service import settings_cache
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
+from datetime import datetime
 
 router = APIRouter()
 
@@ -18,7 +20,7 @@ class SystemSettingBase(BaseModel):
 
 class SystemSettingRead(SystemSettingBase):
     id: int
-    updated_at: Optional[str] = None
+    updated_at: Optional[datetime] = None
     model_config = ConfigDict(from_attributes=True)
 
 class SystemSettingUpdate(BaseModel):
@@ -50,7 +52,9 @@ def create_setting(
     
     db_setting = models.SystemSetting(**setting.model_dump())
     db.add(db_setting)
+    settings_cache.bump(db)
     db.commit()
+    settings_cache.invalidate()
     db.refresh(db_setting)
     return db_setting
 
@@ -68,7 +72,9 @@ def update_setting(
         # If it doesn't exist, create it (convenience for UI)
         db_setting = models.SystemSetting(key=key, value=setting.value, description=setting.description)
         db.add(db_setting)
+        settings_cache.bump(db)
         db.commit()
+        settings_cache.invalidate()
         db.refresh(db_setting)
         return db_setting
     
@@ -76,11 +82,22 @@ def update_setting(
     if setting.description:
         db_setting.description = setting.description
         
+    settings_cache.bump(db)
     db.commit()
+    settings_cache.invalidate()
     db.refresh(db_setting)
     return db_setting
 
 @router.get("/public", response_model=List[SystemSettingRead])
-def get_public_settings(db: Session = Depends(get_db)):
-    """Get public settings (non-encrypted)"""
-    return db.query(models.SystemSetting).filter(models.SystemSetting.is_encrypted == False).all()
+def get_public_settings(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Get public settings (non-encrypted), served from the settings cache with an ETag"""
+    public, etag = settings_cache.public(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return public
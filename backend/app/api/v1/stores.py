@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from typing import List, Optional
+from datetime import date, timedelta
 from app.db.database import get_db
 from app.db import models
 from app.schemas.store import StoreCreate, StoreUpdate, StoreResponse, StoreStats
 from app.api.dependencies import get_super_admin, get_current_user
+from app.services.store_stats_service import store_stats_cache
 import json
 
 router = APIRouter()
@@ -32,6 +33,7 @@ def create_store(
     db.add(db_store)
     db.commit()
     db.refresh(db_store)
+    store_stats_cache.invalidate()
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -65,52 +67,20 @@ def get_stores(
 
 @router.get("/stats", response_model=List[StoreStats])
 def get_stores_stats(
+    response: Response,
+    start_date: Optional[date] = Query(None, description="Limit sales and new customers to this date onwards"),
+    end_date: Optional[date] = Query(None, description="Limit sales and new customers up to this date (inclusive)"),
+    refresh: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get statistics for all stores"""
     # Super admin sees all stores, others see their store only
-    if current_user.role == models.UserRole.SUPER_ADMIN:
-        stores = db.query(models.Store).filter(models.Store.is_active == True).all()
-    else:
-        stores = db.query(models.Store).filter(
-            models.Store.id == current_user.store_id,
-            models.Store.is_active == True
-        ).all()
-    
-    stats = []
-    for store in stores:
-        # Count products
-        total_products = db.query(models.Product).filter(
-            models.Product.store_id == store.id,
-            models.Product.is_active == True
-        ).count()
-        
-        # Sum sales
-        total_sales = db.query(func.sum(models.Sale.total_amount)).filter(
-            models.Sale.store_id == store.id
-        ).scalar() or 0
-        
-        # Count customers (Customer model doesn't have is_active)
-        total_customers = db.query(models.Customer).filter(
-            models.Customer.store_id == store.id
-        ).count()
-        
-        # Count users
-        total_users = db.query(models.User).filter(
-            models.User.store_id == store.id,
-            models.User.is_active == True
-        ).count()
-        
-        stats.append(StoreStats(
-            store_id=store.id,
-            store_name=store.name,
-            total_products=total_products,
-            total_sales=float(total_sales),
-            total_customers=total_customers,
-            total_users=total_users
-        ))
-    
+    store_id = None if current_user.role == models.UserRole.SUPER_ADMIN else current_user.store_id
+    end = end_date + timedelta(days=1) if end_date else None
+
+    stats, generated_at = store_stats_cache.get(db, store_id, start_date, end, refresh=refresh)
+    response.headers["X-Stats-Generated-At"] = generated_at.isoformat()
     return stats
 
 @router.get("/{store_id}", response_model=StoreResponse)
@@ -164,6 +134,7 @@ def update_store(
     
     db.commit()
     db.refresh(store)
+    store_stats_cache.invalidate()
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -208,6 +179,7 @@ def delete_store(
     # Soft delete - just deactivate
     store.is_active = False
     db.commit()
+    store_stats_cache.invalidate()
     
     # Create audit log
     audit_log = models.AuditLog(
@@ -4,6 +4,8 @@ from app.db.database import get_db, SessionLocal
 from app.db import models
 from app.core.security import get_password_hash
 from app.api.dependencies import get_current_user, get_super_admin
+from app.services.rollup_service import rebuild_hourly_rollup
+from app.services.store_context_service import store_context_cache
 from datetime import datetime, timedelta
 import random
 import logging
@@ -298,6 +300,10 @@ def seed_database(
         
         db.commit()
         
+        # Seeded sales bypass checkout, so rebuild the hourly rollup for this store
+        rebuild_hourly_rollup(db, store_id=store.id)
+        store_context_cache.invalidate(store.id)
+        
         return {
             "status": "success",
             "message": "Database seeded successfully",
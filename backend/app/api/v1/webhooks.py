@@ -0,0 +1,89 @@
+"""
+Provider delivery-status webhooks.
+Events are only staged here; the delivery_events scheduler job applies them to campaign logs in batches.
+
+Every request must prove where it came from: Twilio callbacks by X-Twilio-Signature
+(HMAC of the callback URL and form with TWILIO_AUTH_TOKEN), SendGrid batches by the
+signed Event Webhook headers (SENDGRID_WEBHOOK_PUBLIC_KEY), or either by the shared
+?token=DELIVERY_WEBHOOK_TOKEN. With none of these configured the webhooks reject everything.
+"""
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from app.db.database import get_db
+from app.core.config import settings
+from app.services.delivery_event_service import record_twilio_status, record_sendgrid_events
+from app.services.settings_service import settings_cache
+
+router = APIRouter()
+
+
+def _valid_token(token: Optional[str]) -> bool:
+    """Shared-secret check on the callback URL; never passes when DELIVERY_WEBHOOK_TOKEN is unset"""
+    expected = settings.DELIVERY_WEBHOOK_TOKEN
+    return bool(expected) and hmac.compare_digest((token or "").encode(), expected.encode())
+
+
+async def twilio_form(request: Request) -> Dict[str, str]:
+    """Form-encoded callback body, read on the event loop so the endpoint itself can run in the threadpool"""
+    form = await request.form()
+    return {key: str(value) for key, value in form.items()}
+
+
+async def raw_body(request: Request) -> bytes:
+    return await request.body()
+
+
+def verify_twilio_request(
+    request: Request,
+    form: Dict[str, str] = Depends(twilio_form),
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """X-Twilio-Signature over the URL Twilio was given (DELIVERY_STATUS_CALLBACK_URL) and the form, or the URL token"""
+    auth_token = settings_cache.get(db, "TWILIO_AUTH_TOKEN")
+    signature = request.headers.get("X-Twilio-Signature")
+    if auth_token and signature:
+        from twilio.request_validator import RequestValidator
+        url = settings.DELIVERY_STATUS_CALLBACK_URL or str(request.url)
+        if RequestValidator(auth_token).validate(url, form, signature):
+            return
+    if not _valid_token(token):
+        raise HTTPException(status_code=403, detail="Invalid webhook signature")
+
+
+def verify_sendgrid_request(
+    request: Request,
+    body: bytes = Depends(raw_body),
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """SendGrid signed Event Webhook (ECDSA over timestamp + raw body), or the URL token"""
+    public_key = settings_cache.get(db, "SENDGRID_WEBHOOK_PUBLIC_KEY")
+    signature = request.headers.get("X-Twilio-Email-Event-Webhook-Signature")
+    timestamp = request.headers.get("X-Twilio-Email-Event-Webhook-Timestamp")
+    if public_key and signature and timestamp:
+        from sendgrid.helpers.eventwebhook import EventWebhook
+        webhook = EventWebhook()
+        try:
+            if webhook.verify_signature(body.decode(), signature, timestamp, webhook.convert_public_key_to_ecdsa(public_key)):
+                return
+        except Exception:
+            pass  # Malformed key or signature: not verified
+    if not _valid_token(token):
+        raise HTTPException(status_code=403, detail="Invalid webhook signature")
+
+
+@router.post("/twilio/status", dependencies=[Depends(verify_twilio_request)])
+def twilio_status_callback(form: Dict[str, str] = Depends(twilio_form), db: Session = Depends(get_db)):
+    """Twilio message status callback (form encoded, one message per request)"""
+    accepted = record_twilio_status(db, form)
+    return {"accepted": accepted}
+
+
+@router.post("/sendgrid/events", dependencies=[Depends(verify_sendgrid_request)])
+def sendgrid_event_webhook(events: List[Dict[str, Any]], db: Session = Depends(get_db)):
+    """SendGrid Event Webhook (JSON array, up to thousands of events per request)"""
+    accepted = record_sendgrid_events(db, events)
+    return {"accepted": accepted, "received": len(events)}
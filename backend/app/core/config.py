@@ -20,6 +20,104 @@ class Settings(BaseSettings):
     
     # CORS settings - allow all origins for now (can be restricted in production)
     CORS_ORIGINS: list = ["*"]
+
+    # Background jobs (metric baselines, campaign triggers etc.) - every worker may run the
+    # scheduler; a database lease lets only one of them execute jobs at a time
+    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_LEASE_SECONDS: int = int(os.getenv("SCHEDULER_LEASE_SECONDS", "90"))
+    METRIC_BASELINE_INTERVAL_SECONDS: int = int(os.getenv("METRIC_BASELINE_INTERVAL_SECONDS", "3600"))
+    CAMPAIGN_TRIGGER_INTERVAL_SECONDS: int = int(os.getenv("CAMPAIGN_TRIGGER_INTERVAL_SECONDS", "300"))
+    # Automated campaigns skip customers messaged by any campaign within this many hours
+    MARKETING_MIN_HOURS_BETWEEN_MESSAGES: int = int(os.getenv("MARKETING_MIN_HOURS_BETWEEN_MESSAGES", "24"))
+
+    # Campaign delivery: worker concurrency, per-channel send rates (messages/second), retries
+    CAMPAIGN_DISPATCH_CONCURRENCY: int = int(os.getenv("CAMPAIGN_DISPATCH_CONCURRENCY", "50"))
+    CAMPAIGN_DISPATCH_BATCH_SIZE: int = int(os.getenv("CAMPAIGN_DISPATCH_BATCH_SIZE", "200"))  # Committed together
+    CAMPAIGN_JOB_SIZE: int = int(os.getenv("CAMPAIGN_JOB_SIZE", "1000"))  # Recipients per queue job
+    CAMPAIGN_DISPATCH_MAX_RETRIES: int = int(os.getenv("CAMPAIGN_DISPATCH_MAX_RETRIES", "4"))
+    SMS_RATE_PER_SECOND: float = float(os.getenv("SMS_RATE_PER_SECOND", "30"))
+    WHATSAPP_RATE_PER_SECOND: float = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "20"))
+    EMAIL_RATE_PER_SECOND: float = float(os.getenv("EMAIL_RATE_PER_SECOND", "100"))
+    # Provider API hosts - point at fake_message_provider.py for load testing
+    TWILIO_API_BASE: str = os.getenv("TWILIO_API_BASE", "https://api.twilio.com")
+    SENDGRID_API_BASE: str = os.getenv("SENDGRID_API_BASE", "https://api.sendgrid.com")
+
+    # Delivery status webhooks (/api/v1/webhooks/...) only accept verified requests: Twilio's
+    # X-Twilio-Signature (checked with TWILIO_AUTH_TOKEN against DELIVERY_STATUS_CALLBACK_URL, which
+    # Twilio is given per message), SendGrid's signed events (SENDGRID_WEBHOOK_PUBLIC_KEY, also a
+    # system setting), or ?token=DELIVERY_WEBHOOK_TOKEN on the URL. Nothing configured rejects everything
+    DELIVERY_WEBHOOK_TOKEN: str = os.getenv("DELIVERY_WEBHOOK_TOKEN", "")
+    DELIVERY_STATUS_CALLBACK_URL: str = os.getenv("DELIVERY_STATUS_CALLBACK_URL", "")
+    DELIVERY_EVENT_APPLY_SECONDS: int = int(os.getenv("DELIVERY_EVENT_APPLY_SECONDS", "10"))
+    DELIVERY_EVENT_BATCH_SIZE: int = int(os.getenv("DELIVERY_EVENT_BATCH_SIZE", "5000"))
+    DELIVERY_EVENT_MAX_AGE_SECONDS: int = int(os.getenv("DELIVERY_EVENT_MAX_AGE_SECONDS", "3600"))
+
+    # Durable job queue - campaign delivery runs in message_worker.py processes, never in API workers.
+    # QUEUE_WORKER_IN_API=true runs one worker thread inside the API instead (single-process demos only)
+    QUEUE_WORKER_IN_API: bool = os.getenv("QUEUE_WORKER_IN_API", "false").lower() == "true"
+    QUEUE_VISIBILITY_TIMEOUT_SECONDS: int = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    QUEUE_MAX_ATTEMPTS: int = int(os.getenv("QUEUE_MAX_ATTEMPTS", "5"))
+    QUEUE_POLL_SECONDS: float = float(os.getenv("QUEUE_POLL_SECONDS", "2"))
+
+    # Store overview snapshot lifetime (0 disables the cache)
+    STORE_STATS_CACHE_SECONDS: int = int(os.getenv("STORE_STATS_CACHE_SECONDS", "60"))
+    # AI assistant store context snapshot lifetime (0 disables the cache); writes clear it early
+    STORE_CONTEXT_CACHE_SECONDS: int = int(os.getenv("STORE_CONTEXT_CACHE_SECONDS", "120"))
+
+    # How often each process checks whether system settings changed elsewhere
+    SETTINGS_CACHE_CHECK_SECONDS: float = float(os.getenv("SETTINGS_CACHE_CHECK_SECONDS", "5"))
+
+    # Local LLM for the chatbot (Ollama); model availability is re-checked at most every OLLAMA_STATUS_TTL_SECONDS
+    OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "phi4")
+    OLLAMA_TIMEOUT_SECONDS: float = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "120"))  # Max gap between streamed chunks
+    OLLAMA_STATUS_TTL_SECONDS: float = float(os.getenv("OLLAMA_STATUS_TTL_SECONDS", "30"))
+    # Chat prompts carry the conversation summary plus the messages not folded into it; folding keeps
+    # the last this-many messages verbatim and starts once twice as many are waiting
+    CHAT_HISTORY_WINDOW: int = int(os.getenv("CHAT_HISTORY_WINDOW", "6"))
+    CHAT_SUMMARY_MAX_CHARS: int = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))
+    # Retrieval over products, customers, campaigns and monthly reports: top-k records per chat prompt
+    CHAT_RETRIEVAL_TOP_K: int = int(os.getenv("CHAT_RETRIEVAL_TOP_K", "5"))
+    SEARCH_INDEX_SYNC_SECONDS: int = int(os.getenv("SEARCH_INDEX_SYNC_SECONDS", "300"))  # Sweep for writes made outside the API
+    SEARCH_INDEX_CHECK_SECONDS: float = float(os.getenv("SEARCH_INDEX_CHECK_SECONDS", "2"))  # Pull other processes' changes
+
+    # Sandbox ad connections: mock campaigns (0 = one per template) and days of analytics generated;
+    # raise them to build large ad histories for load tests
+    SANDBOX_AD_CAMPAIGNS: int = int(os.getenv("SANDBOX_AD_CAMPAIGNS", "0"))
+    SANDBOX_AD_HISTORY_DAYS: int = int(os.getenv("SANDBOX_AD_HISTORY_DAYS", "30"))
+
+    # Ad audience upload files: customers hashed per chunk, and the country code for bare 10-digit phones
+    AUDIENCE_EXPORT_CHUNK_SIZE: int = int(os.getenv("AUDIENCE_EXPORT_CHUNK_SIZE", "10000"))
+    AUDIENCE_PHONE_COUNTRY_CODE: str = os.getenv("AUDIENCE_PHONE_COUNTRY_CODE", "91")
+    # Auto-sync audiences are re-evaluated and their changes uploaded every AUDIENCE_SYNC_INTERVAL_SECONDS
+    # through AUDIENCE_UPLOADER ("local" writes hashed CSV batches to AUDIENCE_UPLOAD_DIR)
+    AUDIENCE_SYNC_INTERVAL_SECONDS: int = int(os.getenv("AUDIENCE_SYNC_INTERVAL_SECONDS", "3600"))
+    AUDIENCE_UPLOADER: str = os.getenv("AUDIENCE_UPLOADER", "local")
+    AUDIENCE_UPLOAD_DIR: str = os.getenv("AUDIENCE_UPLOAD_DIR", (_BACKEND_DIR / "audience_uploads").as_posix())
+    AUDIENCE_UPLOAD_KEEP_FILES: int = int(os.getenv("AUDIENCE_UPLOAD_KEEP_FILES", "20"))  # Latest batches kept per audience
+
+    # Offline conversion attribution of POS sales to ad touchpoints (model: last_click or linear)
+    ATTRIBUTION_MODEL: str = os.getenv("ATTRIBUTION_MODEL", "last_click")
+    ATTRIBUTION_LOOKBACK_DAYS: int = int(os.getenv("ATTRIBUTION_LOOKBACK_DAYS", "28"))
+    ATTRIBUTION_BATCH_SIZE: int = int(os.getenv("ATTRIBUTION_BATCH_SIZE", "20000"))
+    # Sales are attributed once this old, so touchpoints recorded late (backdated) still get credit
+    ATTRIBUTION_SETTLE_HOURS: float = float(os.getenv("ATTRIBUTION_SETTLE_HOURS", "24"))
+    ATTRIBUTION_INTERVAL_SECONDS: int = int(os.getenv("ATTRIBUTION_INTERVAL_SECONDS", "3600"))
+
+    # Ad platform campaign sync for marketing integrations: accounts fetched concurrently through AD_SYNC_CLIENT
+    # ("fake" generates AD_SYNC_FAKE_CAMPAIGNS campaigns per account) and upserted AD_SYNC_BATCH_SIZE rows at a time
+    AD_SYNC_CLIENT: str = os.getenv("AD_SYNC_CLIENT", "fake")
+    AD_SYNC_CONCURRENCY: int = int(os.getenv("AD_SYNC_CONCURRENCY", "10"))
+    AD_SYNC_TIMEOUT_SECONDS: float = float(os.getenv("AD_SYNC_TIMEOUT_SECONDS", "60"))
+    AD_SYNC_BATCH_SIZE: int = int(os.getenv("AD_SYNC_BATCH_SIZE", "1000"))
+    AD_SYNC_INTERVAL_SECONDS: int = int(os.getenv("AD_SYNC_INTERVAL_SECONDS", "3600"))
+    AD_SYNC_FAKE_CAMPAIGNS: int = int(os.getenv("AD_SYNC_FAKE_CAMPAIGNS", "2"))
+    AD_SYNC_FAKE_LATENCY_MS: int = int(os.getenv("AD_SYNC_FAKE_LATENCY_MS", "100"))
+
+    # Columnar analytics mirror (needs `pip install duckdb`); analytical reports read it when enabled
+    OLAP_ENABLED: bool = os.getenv("OLAP_ENABLED", "false").lower() == "true"
+    OLAP_MIRROR_DIR: str = os.getenv("OLAP_MIRROR_DIR", (_BACKEND_DIR / "analytics_mirror").as_posix())
+    OLAP_SYNC_INTERVAL_SECONDS: int = int(os.getenv("OLAP_SYNC_INTERVAL_SECONDS", "300"))
     
     class Config:
         env_file = ".env"
@@ -1,8 +1,9 @@
-from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum as SQLEnum, JSON
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Boolean, Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Enum as SQLEnum, JSON, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql import func, text
 from app.db.database import Base
 import enum
+from datetime import date
 
 class UserRole(str, enum.Enum):
     SUPER_ADMIN = "super_admin"
@@ -119,8 +120,16 @@ class Batch(Base):
     
     product = relationship("Product", back_populates="batches")
 
+def birthday_day_of_year(value) -> int:
+    """Day of year of a birthday in a leap year, so Feb 29 is 60 and Mar 1 is always 61"""
+    return date(2000, value.month, value.day).timetuple().tm_yday
+
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = (
+        Index("ix_customers_store_birthday", "store_id", "birthday_doy"),
+        Index("ix_customers_store_last_purchase", "store_id", "last_purchase_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -132,12 +141,20 @@ class Customer(Base):
     store_id = Column(Integer, ForeignKey("stores.id"))
     total_purchases = Column(Float, default=0.0)
     loyalty_points = Column(Integer, default=0)
+    # Maintained for automated campaign triggers (see campaign_trigger_service)
+    birthday_doy = Column(Integer)
+    last_purchase_date = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     store = relationship("Store", back_populates="customers")
     sales = relationship("Sale", back_populates="customer")
 
+    @validates("date_of_birth")
+    def _set_birthday_doy(self, key, value):
+        self.birthday_doy = birthday_day_of_year(value) if value else None
+        return value
+
 class Sale(Base):
     __tablename__ = "sales"
     
@@ -176,7 +193,7 @@ class SaleItem(Base):
     gst_amount = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
     serial_number = Column(String)
-    warranty_expires_at = Column(DateTime(timezone=True))
+    warranty_expires_at = Column(DateTime(timezone=True), index=True)
     
     sale = relationship("Sale", back_populates="sale_items")
     product = relationship("Product", back_populates="sale_items")
@@ -230,10 +247,12 @@ class Campaign(Base):
     
     # Stats
     total_sent = Column(Integer, default=0)
+    total_failed = Column(Integer, default=0)
     total_opened = Column(Integer, default=0)
     total_clicked = Column(Integer, default=0)
     total_converted = Column(Integer, default=0)
     revenue = Column(Float, default=0.0)
+    last_run_at = Column(DateTime(timezone=True))
     
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -244,17 +263,30 @@ class Campaign(Base):
 
 class CampaignLog(Base):
     __tablename__ = "campaign_logs"
+    __table_args__ = (
+        Index("ix_campaign_logs_run_customer", "run_id", "customer_id"),
+        # Newest-first log pages per campaign (keyset on sent_at, id)
+        Index("ix_campaign_logs_campaign_sent", "campaign_id", text("sent_at DESC"), text("id DESC")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    run_id = Column(Integer, ForeignKey("campaign_runs.id"))  # Queued delivery this message belongs to
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
     sent_at = Column(DateTime(timezone=True), server_default=func.now())
+    delivered_at = Column(DateTime(timezone=True))
     opened_at = Column(DateTime(timezone=True))
     clicked_at = Column(DateTime(timezone=True))
     converted_at = Column(DateTime(timezone=True))
     status = Column(String, default="sent")  # sent, delivered, failed, opened, clicked, converted
+    channel = Column(String)
+    message_sent = Column(Text)
+    error_message = Column(Text)
+    provider_message_id = Column(String, index=True)  # Twilio SID / SendGrid message id, matched by status webhooks
+    attempts = Column(Integer, default=1)
     
     campaign = relationship("Campaign", back_populates="campaign_logs")
+    customer = relationship("Customer")
 
 class MarketingIntegration(Base):
     __tablename__ = "marketing_integrations"
@@ -277,6 +309,10 @@ class MarketingIntegration(Base):
 
 class MarketingCampaignSync(Base):
     __tablename__ = "marketing_campaign_syncs"
+    __table_args__ = (
+        # One row per platform campaign; ad syncs upsert on it
+        Index("uq_marketing_campaign_syncs_integration_campaign", "integration_id", "external_campaign_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     integration_id = Column(Integer, ForeignKey("marketing_integrations.id"), nullable=False)
@@ -459,7 +495,7 @@ class Audience(Base):
     
     # Source criteria from ERP
     source_criteria = Column(JSON)  # e.g., {"segment": "past_buyers", "days": 30}
-    customer_ids = Column(JSON)  # List of customer IDs from ERP
+    customer_ids = Column(JSON)  # Legacy member list; members are now rows in audience_members
     
     # Platform-specific IDs
     external_audience_id = Column(String)
@@ -477,15 +513,36 @@ class Audience(Base):
     store = relationship("Store")
     ad_account = relationship("AdAccountConnection")
 
+class AudienceMember(Base):
+    """Customers in an ad audience (one row per member, kept as a tombstone until a removal is uploaded)"""
+    __tablename__ = "audience_members"
+    __table_args__ = (
+        Index("ix_audience_members_pending", "audience_id", "synced_at"),
+    )
+
+    audience_id = Column(Integer, ForeignKey("audiences.id"), primary_key=True)
+    customer_id = Column(Integer, primary_key=True)  # No foreign key: a removal row outlives a deleted customer
+    added_at = Column(DateTime(timezone=True))
+    removed_at = Column(DateTime(timezone=True))  # Left the segment; deleted once the removal is uploaded
+    synced_at = Column(DateTime(timezone=True))  # NULL while the add / removal is waiting for upload
+    # Identifiers as last uploaded (SHA-256 hex, empty when missing), sent again to remove the member
+    email_sha256 = Column(String(64))
+    phone_sha256 = Column(String(64))
+    fn_sha256 = Column(String(64))
+    ln_sha256 = Column(String(64))
+
 class ConversionTracking(Base):
     """Track conversions from ads"""
     __tablename__ = "conversion_tracking"
+    __table_args__ = (
+        Index("ix_conversion_tracking_customer_date", "customer_id", "conversion_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
     campaign_id = Column(Integer, ForeignKey("ad_campaign_creations.id"))
     
-    conversion_type = Column(String, nullable=False)  # store_visit, lead, sale, call
+    conversion_type = Column(String, nullable=False)  # click, store_visit, lead, sale, call
     customer_id = Column(Integer, ForeignKey("customers.id"))
     sale_id = Column(Integer, ForeignKey("sales.id"))
     
@@ -511,6 +568,9 @@ class ConversionTracking(Base):
 class AdCampaignAnalytics(Base):
     """Daily analytics for ad campaigns"""
     __tablename__ = "ad_campaign_analytics"
+    __table_args__ = (
+        Index("ix_ad_campaign_analytics_campaign_date", "campaign_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     campaign_id = Column(Integer, ForeignKey("ad_campaign_creations.id"), nullable=False)
@@ -537,6 +597,22 @@ class AdCampaignAnalytics(Base):
     
     campaign = relationship("AdCampaignCreation")
 
+class SaleAttribution(Base):
+    """Share of a POS sale credited to an ad campaign under one attribution model"""
+    __tablename__ = "sale_attributions"
+    __table_args__ = (
+        UniqueConstraint("model", "sale_id", "campaign_id", name="uq_sale_attributions_model_sale_campaign"),
+        Index("ix_sale_attributions_campaign_date", "campaign_id", "sale_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    model = Column(String, nullable=False)  # last_click, linear
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("ad_campaign_creations.id"), nullable=False)
+    credit = Column(Float, nullable=False)  # Fraction of the sale, 0-1
+    revenue = Column(Float, nullable=False)
+    sale_date = Column(DateTime(timezone=True), nullable=False)
+
 # ============ STAFF PERFORMANCE MODELS ============
 
 class StaffAttendance(Base):
@@ -583,6 +659,138 @@ class StaffTarget(Base):
     user = relationship("User")
     store = relationship("Store")
 
+# ============ ANALYTICS MODELS ============
+
+class ProductSimilarity(Base):
+    """Top-K item-item neighbours built offline by the recommendation index"""
+    __tablename__ = "product_similarities"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    similar_product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    score = Column(Float, nullable=False)  # Cosine similarity over customer x product purchases
+    rank = Column(Integer, nullable=False)  # 1 = most similar
+    built_at = Column(DateTime(timezone=True), nullable=False)
+
+class DemandForecast(Base):
+    """Per-SKU daily demand forecast used for reorder planning"""
+    __tablename__ = "demand_forecasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    start_date = Column(DateTime(timezone=True), nullable=False)  # First forecast day
+    horizon_days = Column(Integer, nullable=False)
+    daily_forecast = Column(JSON, nullable=False)  # Units per day, start_date onwards
+    total_forecast = Column(Float, default=0.0)
+    total_lower = Column(Float, default=0.0)
+    total_upper = Column(Float, default=0.0)
+    avg_daily_demand = Column(Float, default=0.0)  # Over the history window
+    generated_at = Column(DateTime(timezone=True), nullable=False)
+
+    product = relationship("Product")
+
+class SalesHourlyRollup(Base):
+    """Transactions and revenue per store per hour, maintained at checkout"""
+    __tablename__ = "sales_hourly_rollups"
+    __table_args__ = (
+        UniqueConstraint("store_id", "date", "hour", name="uq_sales_hourly_rollup"),
+        Index("ix_sales_hourly_rollup_date", "date", "store_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    hour = Column(Integer, nullable=False)  # 0-23
+    day_of_week = Column(Integer, nullable=False)  # Monday = 0
+    transactions = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+    discount = Column(Float, default=0.0)
+
+class StoreMetricBaseline(Base):
+    """Rolling per-store, per-weekday daily mean/stddev of a monitored metric"""
+    __tablename__ = "store_metric_baselines"
+    __table_args__ = (
+        UniqueConstraint("store_id", "metric", "day_of_week", name="uq_store_metric_baseline"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    metric = Column(String, nullable=False)  # revenue, transactions, discount, expenses
+    day_of_week = Column(Integer, nullable=False)  # Monday = 0
+    mean = Column(Float, default=0.0)
+    stddev = Column(Float, default=0.0)
+    samples = Column(Integer, default=0)  # Days in the window for this weekday
+    seasonal_index = Column(Float, default=1.0)  # Weekday mean / mean across all weekdays
+    intraday_profile = Column(JSON)  # Cumulative share of the day's total by end of each hour
+    window_start = Column(Date, nullable=False)
+    window_end = Column(Date, nullable=False)  # Exclusive
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+class MetricAnomaly(Base):
+    """Latest z-score evaluation of a store metric for a day, refreshed with the baselines"""
+    __tablename__ = "metric_anomalies"
+    __table_args__ = (
+        UniqueConstraint("store_id", "metric", "date", name="uq_metric_anomaly"),
+        Index("ix_metric_anomaly_date", "date", "is_anomaly"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
+    metric = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    observed = Column(Float, default=0.0)
+    expected = Column(Float, default=0.0)  # Pro-rated to the time of evaluation for the current day
+    stddev = Column(Float, default=0.0)
+    z_score = Column(Float, default=0.0)
+    day_fraction = Column(Float, default=1.0)  # Share of a typical day elapsed at evaluation
+    is_anomaly = Column(Boolean, default=False)
+    severity = Column(String)  # warning, critical, success
+    evaluated_at = Column(DateTime(timezone=True), nullable=False)
+
+    store = relationship("Store")
+
+class CampaignRun(Base):
+    """One queued execution of a campaign, delivered by queue workers in batches"""
+    __tablename__ = "campaign_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False, index=True)
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    total_recipients = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    total_jobs = Column(Integer, default=0)
+    requested_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    campaign = relationship("Campaign")
+
+class QueueJob(Base):
+    """Durable work item leased by queue workers (see app/services/queue_service.py)"""
+    __tablename__ = "queue_jobs"
+    __table_args__ = (
+        Index("ix_queue_jobs_claim", "queue", "status", "available_at"),
+        Index("ix_queue_jobs_group", "group_key", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    queue = Column(String, nullable=False, default="default")
+    kind = Column(String, nullable=False)  # Handler name, e.g. campaign_batch
+    payload = Column(JSON, nullable=False)
+    group_key = Column(String)  # Jobs of one logical operation, e.g. campaign_run:12
+    status = Column(String, nullable=False, default="pending")  # pending, leased, done, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    available_at = Column(DateTime(timezone=True), nullable=False)
+    leased_by = Column(String)
+    lease_expires_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True))
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
@@ -610,3 +818,111 @@ class SystemSetting(Base):
     
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class CacheVersion(Base):
+    """Change counter per cached dataset, shared by all API/worker processes"""
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)  # e.g. system_settings
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SchedulerLease(Base):
+    """Leadership lease so only one process runs the background scheduler's jobs"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)  # host:pid
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    acquired_at = Column(DateTime(timezone=True))
+
+class Watermark(Base):
+    """High-water mark of an incremental job, e.g. the last sale id or evaluation time processed"""
+    __tablename__ = "watermarks"
+
+    name = Column(String, primary_key=True)  # e.g. customer_last_purchase, campaign_trigger:12
+    position = Column(Integer)
+    position_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class CampaignContact(Base):
+    """Latest successful send of a campaign to a customer, for frequency caps"""
+    __tablename__ = "campaign_contacts"
+    __table_args__ = (
+        UniqueConstraint("campaign_id", "customer_id", name="uq_campaign_contact"),
+        Index("ix_campaign_contacts_customer_sent", "customer_id", "last_sent_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=False)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
+    last_sent_at = Column(DateTime(timezone=True), nullable=False)
+    sends = Column(Integer, nullable=False, default=0)
+
+class DeliveryEvent(Base):
+    """Provider status / engagement event received by a webhook, waiting to be applied to campaign_logs"""
+    __tablename__ = "delivery_events"
+    __table_args__ = (
+        Index("ix_delivery_events_available", "available_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False)  # twilio, sendgrid
+    provider_message_id = Column(String, nullable=False)
+    event = Column(String, nullable=False)  # delivered, opened, clicked, failed
+    detail = Column(String)  # Error code / bounce reason
+    occurred_at = Column(DateTime(timezone=True), nullable=False)
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    available_at = Column(DateTime(timezone=True), nullable=False)  # Pushed back while the message's log is not found
+    attempts = Column(Integer, nullable=False, default=0)
+
+class ChatConversation(Base):
+    """AI assistant conversation; turns older than the prompt window are folded into `summary` once"""
+    __tablename__ = "chat_conversations"
+    __table_args__ = (
+        Index("ix_chat_conversations_user_updated", "user_id", "updated_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String, nullable=False)
+    preview = Column(String)  # Start of the latest message, for chat lists
+    summary = Column(Text)
+    summary_through_id = Column(Integer, nullable=False, default=0)  # Last chat_messages.id folded into summary
+    message_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_id_id", "conversation_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("chat_conversations.id"), nullable=False)
+    role = Column(String, nullable=False)  # user, assistant
+    content = Column(Text, nullable=False)
+    mode = Column(String)  # ai / simulated, for assistant messages
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    conversation = relationship("ChatConversation", back_populates="messages")
+
+class SearchDocument(Base):
+    """Text rendering of an ERP entity for the assistant's retrieval index (one row per entity)"""
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        Index("ix_search_documents_updated", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, nullable=False)  # e.g. product:12, report:3:2026-03
+    entity_type = Column(String, nullable=False)  # product, customer, campaign, report
+    entity_id = Column(Integer)
+    store_id = Column(Integer)
+    title = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)  # Tombstone, so other processes drop it too
+    updated_at = Column(DateTime(timezone=True), nullable=False)
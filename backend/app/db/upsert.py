@@ -0,0 +1,53 @@
+"""
+Portable INSERT ... ON CONFLICT helper for SQLite and PostgreSQL
+"""
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy.orm import Session
+
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for dialect '{dialect}'")
+    return insert
+
+
+def upsert(
+    db: Session,
+    model,
+    rows: List[Dict],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    increment_columns: Optional[Sequence[str]] = None
+) -> None:
+    """
+    Insert `rows` into `model`'s table in one executemany call. On a conflict
+    with the unique index over `conflict_columns`, `update_columns` are
+    overwritten with the new values and `increment_columns` are added to the
+    existing values. The single-row statement is compiled once and cached, so
+    large batches do not pay for rendering a multi-row VALUES clause.
+
+    Does not commit; runs inside the caller's transaction.
+    """
+    if not rows:
+        return
+
+    insert = _dialect_insert(db)
+    table = model.__table__
+    stmt = insert(table)
+
+    set_ = {}
+    for column in update_columns or ():
+        set_[column] = stmt.excluded[column]
+    for column in increment_columns or ():
+        set_[column] = table.c[column] + stmt.excluded[column]
+
+    if set_:
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict_columns), set_=set_)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+    db.execute(stmt, rows)
@@ -5,7 +5,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.api.v1 import auth, inventory, sales, customers, financial, reports, users, campaigns, marketing, stores, chatbot, dashboard, system, automation, ads, comparison, campaign_execution
+from app.api.v1 import auth, inventory, sales, customers, financial, reports, users, campaigns, marketing, stores, chatbot, dashboard, system, automation, ads, comparison, campaign_execution, analytics, webhooks
 from app.api.v1 import settings as api_settings
 from app.core.config import settings
 from app.db.database import engine
@@ -75,7 +75,9 @@ app.include_router(system.router, prefix="/api/v1/system", tags=["System"])
 app.include_router(automation.router, prefix="/api/v1/automation", tags=["Automation & AI"])
 app.include_router(ads.router, prefix="/api/v1/ads", tags=["Ad Platform Integration"])
 app.include_router(comparison.router, prefix="/api/v1/comparison", tags=["Comparison Analytics"])
+app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["Advanced Analytics"])
 app.include_router(api_settings.router, prefix="/api/v1/settings", tags=["System Settings"])
+app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["Webhooks"])
 
 from app.api.dependencies import get_db
 from app.db.database import SessionLocal
@@ -151,12 +153,58 @@ def startup_db_client():
              db.commit()
              print("Reset manager user password")
 
+        # Sales written outside checkout (seed scripts, imports) are missing from the hourly rollup
+        from app.services.rollup_service import ensure_hourly_rollup
+        buckets = ensure_hourly_rollup(db)
+        if buckets is not None:
+            print(f"Rebuilt hourly sales rollup ({buckets} buckets)")
+
     except Exception as e:
         print(f"Error seeding data: {e}")
         db.rollback()
     finally:
         db.close()
 
+    if settings.SCHEDULER_ENABLED:
+        from app.services.scheduler import scheduler
+        from app.services.anomaly_service import refresh_baselines
+        scheduler.add_job("metric_baselines", refresh_baselines, settings.METRIC_BASELINE_INTERVAL_SECONDS)
+        from app.services.campaign_trigger_service import run_trigger_check
+        scheduler.add_job("campaign_triggers", run_trigger_check, settings.CAMPAIGN_TRIGGER_INTERVAL_SECONDS)
+        from app.services.delivery_event_service import apply_delivery_events
+        scheduler.add_job("delivery_events", apply_delivery_events, settings.DELIVERY_EVENT_APPLY_SECONDS)
+        from app.services.retrieval_service import sync_search_documents
+        scheduler.add_job("search_index_sync", sync_search_documents, settings.SEARCH_INDEX_SYNC_SECONDS)
+        from app.services.audience_service import sync_auto_audiences
+        scheduler.add_job("audience_sync", sync_auto_audiences, settings.AUDIENCE_SYNC_INTERVAL_SECONDS)
+        from app.services.attribution_service import run_attribution
+        scheduler.add_job("sale_attribution", run_attribution, settings.ATTRIBUTION_INTERVAL_SECONDS)
+        from app.services.ad_sync_service import sync_integrations
+        scheduler.add_job("ad_platform_sync", sync_integrations, settings.AD_SYNC_INTERVAL_SECONDS)
+        if settings.OLAP_ENABLED:
+            from app.services.olap_service import sync_analytics_mirror
+            scheduler.add_job("analytics_mirror_sync", sync_analytics_mirror, settings.OLAP_SYNC_INTERVAL_SECONDS)
+        scheduler.start()
+
+    if settings.QUEUE_WORKER_IN_API:
+        from app.services import marketing_service  # noqa: F401  (registers the campaign_batch handler)
+        from app.services.queue_service import QueueWorker
+        app.state.queue_worker = QueueWorker()
+        app.state.queue_worker.start()
+
+@app.on_event("shutdown")
+def shutdown_scheduler():
+    from app.services.scheduler import scheduler
+    scheduler.shutdown()
+    queue_worker = getattr(app.state, "queue_worker", None)
+    if queue_worker is not None:
+        queue_worker.shutdown()
+
+@app.on_event("shutdown")
+async def close_ollama_client():
+    from app.services.ollama_service import ollama
+    await ollama.aclose()
+
 @app.get("/")
 def read_root():
     return {"message": "SKOPE ERP API", "version": "1.0.0"}
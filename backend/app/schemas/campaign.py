@@ -28,14 +28,25 @@ class CampaignUpdate(BaseModel):
     status: Optional[CampaignStatus] = None
     message_template: Optional[str] = None
     subject: Optional[str] = None
+    target_customers: Optional[Dict[str, Any]] = None
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
 
+class AudiencePreviewRequest(BaseModel):
+    store_id: Optional[int] = None  # Defaults to the user's store
+    target_customers: Optional[Dict[str, Any]] = None
+
+class AudiencePreview(BaseModel):
+    store_id: int
+    target_customers: Dict[str, Any]
+    audience_size: int
+
 class CampaignResponse(CampaignBase):
     id: int
     status: CampaignStatus
     store_id: int
     total_sent: int
+    total_failed: Optional[int] = 0
     total_opened: int
     total_clicked: int
     total_converted: int
@@ -49,6 +60,7 @@ class CampaignStats(BaseModel):
     campaign_id: int
     campaign_name: str
     total_sent: int
+    total_failed: Optional[int] = 0
     total_opened: int
     total_clicked: int
     total_converted: int
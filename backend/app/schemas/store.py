@@ -34,7 +34,10 @@ class StoreStats(BaseModel):
     store_name: str
     total_products: int
     total_sales: float
+    total_transactions: int = 0
+    average_bill: float = 0.0
     total_customers: int
+    new_customers: int = 0
     total_users: int
     
     class Config:
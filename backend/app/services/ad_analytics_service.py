@@ -0,0 +1,150 @@
+"""
+Ad Analytics Service
+Ad campaign totals and day / week / month series aggregated in SQL
+
+ad_campaign_analytics holds one row per campaign per day; every figure here is
+a SUM over an index range on (campaign_id, date), so no analytics row is loaded
+into Python and the response size depends only on the requested bucketing.
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from app.db import models
+
+BUCKETS = ("day", "week", "month")
+
+A = models.AdCampaignAnalytics
+
+
+def _totals_columns():
+    return [
+        func.coalesce(func.sum(A.spend), 0).label("spend"),
+        func.coalesce(func.sum(A.impressions), 0).label("impressions"),
+        func.coalesce(func.sum(A.clicks), 0).label("clicks"),
+        func.coalesce(func.sum(A.reach), 0).label("reach"),
+        func.coalesce(func.sum(A.leads), 0).label("leads"),
+        func.coalesce(func.sum(A.store_visits), 0).label("store_visits"),
+        func.coalesce(func.sum(A.sales_attributed), 0).label("sales"),
+        func.coalesce(func.sum(A.revenue_attributed), 0).label("revenue"),
+    ]
+
+
+def _in_range(query, start_date: Optional[datetime], end_date: Optional[datetime]):
+    if start_date:
+        query = query.filter(A.date >= start_date)
+    if end_date:
+        query = query.filter(A.date <= end_date)
+    return query
+
+
+def _ratios(spend: float, impressions: int, clicks: int, revenue: float) -> Dict[str, float]:
+    return {
+        "ctr": round(clicks / impressions * 100, 2) if impressions > 0 else 0,
+        "cpc": round(spend / clicks, 2) if clicks > 0 else 0,
+        "roas": round(revenue / spend, 2) if spend > 0 else 0,
+    }
+
+
+def _bucket_expression(db: Session, bucket: str):
+    """Start date of the day / ISO week (Monday) / month containing A.date"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date(func.date_trunc(bucket, A.date))
+    if bucket == "week":
+        return func.date(A.date, "weekday 0", "-6 days")  # Following Sunday (or same day), back to Monday
+    if bucket == "month":
+        return func.date(A.date, "start of month")
+    return func.date(A.date)
+
+
+def _as_date(value) -> str:
+    """func.date() returns a string on SQLite and a date on PostgreSQL"""
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def store_overview(
+    db: Session,
+    store_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
+    """Campaign counts and analytics totals for one store (two aggregate queries)"""
+    C = models.AdCampaignCreation
+    campaigns, active = db.query(
+        func.count(C.id),
+        func.coalesce(func.sum(case((C.status == models.AdCampaignStatus.ACTIVE, 1), else_=0)), 0)
+    ).filter(C.store_id == store_id).one()
+    totals = _in_range(
+        db.query(*_totals_columns()).select_from(A).join(C, C.id == A.campaign_id).filter(C.store_id == store_id),
+        start_date, end_date
+    ).one()
+    spend, revenue = float(totals.spend), float(totals.revenue)
+    return {
+        "total_campaigns": int(campaigns),
+        "active_campaigns": int(active),
+        "total_spend": round(spend, 2),
+        "total_impressions": int(totals.impressions),
+        "total_clicks": int(totals.clicks),
+        "total_leads": int(totals.leads),
+        "total_store_visits": int(totals.store_visits),
+        "total_sales": int(totals.sales),
+        "total_revenue": round(revenue, 2),
+        "roas": round(revenue / spend if spend > 0 else 0, 2)
+    }
+
+
+def campaign_summary(
+    db: Session,
+    campaign_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
+    totals = _in_range(db.query(*_totals_columns()).filter(A.campaign_id == campaign_id), start_date, end_date).one()
+    spend, revenue = float(totals.spend), float(totals.revenue)
+    ratios = _ratios(spend, int(totals.impressions), int(totals.clicks), revenue)
+    return {
+        "total_spend": round(spend, 2),
+        "total_impressions": int(totals.impressions),
+        "total_clicks": int(totals.clicks),
+        "total_leads": int(totals.leads),
+        "total_sales": int(totals.sales),
+        "total_revenue": round(revenue, 2),
+        "avg_ctr": ratios["ctr"],
+        "avg_cpc": ratios["cpc"],
+        "roas": ratios["roas"]
+    }
+
+
+def campaign_series(
+    db: Session,
+    campaign_id: int,
+    bucket: str = "day",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[Dict]:
+    """One row per day / week / month with activity, newest first"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    period = _bucket_expression(db, bucket).label("period")
+    rows = _in_range(
+        db.query(period, *_totals_columns()).filter(A.campaign_id == campaign_id), start_date, end_date
+    ).group_by(period).order_by(period.desc()).all()
+    series = []
+    for row in rows:
+        spend, revenue = float(row.spend), float(row.revenue)
+        series.append({
+            "date": _as_date(row.period),
+            "spend": round(spend, 2),
+            "impressions": int(row.impressions),
+            "clicks": int(row.clicks),
+            "reach": int(row.reach),
+            "leads": int(row.leads),
+            "store_visits": int(row.store_visits),
+            "sales_attributed": int(row.sales),
+            "revenue_attributed": round(revenue, 2),
+            **_ratios(spend, int(row.impressions), int(row.clicks), revenue),
+        })
+    return series
@@ -0,0 +1,139 @@
+"""
+Ad Sandbox Service
+Mock campaigns and daily analytics for sandbox (demo / load test) ad connections
+
+Every random figure is drawn for all campaign-days at once with NumPy and the
+rows go in with bulk INSERTs inside the caller's transaction, so years of
+history for many campaigns take seconds rather than one commit per row.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+INSERT_CHUNK_SIZE = 5000
+
+META_TEMPLATES = [
+    {"name": "Summer Sale Extravaganza", "obj": "OUTCOME_SALES", "status": "ACTIVE", "roas": 4.5, "template": "offer_festival"},
+    {"name": "New Collection Launch", "obj": "OUTCOME_AWARENESS", "status": "ACTIVE", "roas": 2.1, "template": "product_catalog"},
+    {"name": "Retargeting - Cart Abandoners", "obj": "OUTCOME_SALES", "status": "PAUSED", "roas": 6.8, "template": "store_visit"},
+    {"name": "Brand Awareness Video", "obj": "OUTCOME_TRAFFIC", "status": "ACTIVE", "roas": 1.5, "template": "lead_form"},
+]
+GOOGLE_TEMPLATES = [
+    {"name": "Local Store Search", "obj": "LEADS", "status": "ACTIVE", "roas": 5.2, "template": "local_search_ads"},
+    {"name": "YouTube Brand Reach", "obj": "AWARENESS", "status": "ACTIVE", "roas": 1.8, "template": "youtube_local_awareness"},
+    {"name": "Performance Max Retail", "obj": "SALES", "status": "PAUSED", "roas": 7.5, "template": "performance_max"},
+]
+
+
+def _campaign_rows(
+    user: models.User,
+    connection: models.AdAccountConnection,
+    count: int,
+    start_date: datetime,
+    rng: np.random.Generator
+) -> List[Dict]:
+    """`count` campaigns cycling through the platform's templates (numbered from the second round on)"""
+    templates = GOOGLE_TEMPLATES if connection.platform == "google" else META_TEMPLATES
+    budgets = rng.integers(500, 5001, size=count)
+    rows = []
+    for i in range(count):
+        t = templates[i % len(templates)]
+        rounds = i // len(templates)
+        rows.append({
+            "store_id": user.store_id,
+            "ad_account_id": connection.id,
+            "campaign_name": t["name"] if rounds == 0 else f"{t['name']} #{rounds + 1}",
+            "campaign_template": models.AdCampaignTemplate(t["template"]),
+            "platform": models.AdPlatform(connection.platform),
+            "objective": t["obj"],
+            "budget_daily": float(budgets[i]),
+            "status": models.AdCampaignStatus.ACTIVE if t["status"] == "ACTIVE" else models.AdCampaignStatus.PAUSED,
+            "created_by": user.id,
+            "start_date": start_date,
+        })
+    return rows
+
+
+def _analytics_columns(target_roas: np.ndarray, days: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Daily metrics for every (campaign, day) cell, shape (campaigns, days).
+    Same distributions as the original per-row generator: 1-3% CTR, CPC 5-15,
+    revenue within 10% of the campaign's target ROAS.
+    """
+    shape = (len(target_roas), days)
+    volatility = rng.uniform(0.8, 1.2, shape)
+    impressions = (rng.integers(1000, 5001, shape) * volatility).astype(np.int64)
+    clicks = (impressions * rng.uniform(0.01, 0.03, shape)).astype(np.int64)
+    spend = clicks * rng.uniform(5, 15, shape)
+    revenue = spend * (target_roas[:, None] * rng.uniform(0.9, 1.1, shape))
+    sales_count = (revenue / rng.integers(500, 2001, shape)).astype(np.int64)
+    leads = (clicks * rng.uniform(0.05, 0.15, shape)).astype(np.int64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = np.where(impressions > 0, np.round(clicks / impressions * 100, 2), 0.0)
+        cpc = np.where(clicks > 0, np.round(spend / clicks, 2), 0.0)
+        roas = np.where(spend > 0, np.round(revenue / spend, 2), 0.0)
+    return {
+        "impressions": impressions,
+        "clicks": clicks,
+        "spend": np.round(spend, 2),
+        "reach": (impressions * 0.8).astype(np.int64),
+        "leads": leads,
+        "sales_attributed": sales_count,
+        "revenue_attributed": np.round(revenue, 2),
+        "ctr": ctr,
+        "cpc": cpc,
+        "roas": roas,
+    }
+
+
+def seed_sandbox_campaigns(
+    db: Session,
+    user: models.User,
+    connection: models.AdAccountConnection,
+    campaigns: Optional[int] = None,
+    days: Optional[int] = None,
+    seed: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Create `campaigns` mock campaigns (default SANDBOX_AD_CAMPAIGNS, 0 = one per
+    template) with `days` days of analytics up to today (default
+    SANDBOX_AD_HISTORY_DAYS). Runs in the caller's transaction; does not commit.
+    """
+    templates = GOOGLE_TEMPLATES if connection.platform == "google" else META_TEMPLATES
+    campaigns = campaigns or settings.SANDBOX_AD_CAMPAIGNS or len(templates)
+    days = days or settings.SANDBOX_AD_HISTORY_DAYS
+    rng = np.random.default_rng(seed)
+
+    end_date = datetime.utcnow()
+    dates = [end_date - timedelta(days=offset) for offset in range(days, -1, -1)]  # Both ends included
+
+    rows = _campaign_rows(user, connection, campaigns, dates[0], rng)
+    campaign_ids = list(db.scalars(
+        insert(models.AdCampaignCreation).returning(models.AdCampaignCreation.id, sort_by_parameter_order=True),
+        rows
+    ))
+
+    target_roas = np.array([templates[i % len(templates)]["roas"] for i in range(campaigns)])
+    columns = {name: values.tolist() for name, values in _analytics_columns(target_roas, len(dates), rng).items()}
+    names = list(columns)
+    analytics = []
+    for c, campaign_id in enumerate(campaign_ids):
+        per_campaign = [columns[name][c] for name in names]
+        for d, day in enumerate(dates):
+            row = {name: values[d] for name, values in zip(names, per_campaign)}
+            row["campaign_id"] = campaign_id
+            row["date"] = day
+            analytics.append(row)
+            if len(analytics) >= INSERT_CHUNK_SIZE:
+                db.execute(insert(models.AdCampaignAnalytics), analytics)
+                analytics = []
+    if analytics:
+        db.execute(insert(models.AdCampaignAnalytics), analytics)
+
+    return {"campaigns": len(campaign_ids), "analytics_rows": len(campaign_ids) * len(dates)}
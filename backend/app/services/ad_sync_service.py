@@ -0,0 +1,231 @@
+"""
+Ad Sync Service
+Campaign performance pulled from the ad platforms for marketing integrations
+
+Every integration is fetched concurrently on one event loop (at most
+AD_SYNC_CONCURRENCY requests in flight, AD_SYNC_TIMEOUT_SECONDS each) through
+the configured AdPlatformClient, so a cycle takes about as long as the slowest
+account rather than the sum of all of them. The campaigns are then written
+with INSERT ... ON CONFLICT over the (integration_id, external_campaign_id)
+unique index, AD_SYNC_BATCH_SIZE rows per statement: new campaigns are added
+and existing ones get their latest metrics, without a lookup per campaign.
+
+The fake client stands in for the Google Ads and Meta Marketing APIs in
+development and load tests; real clients register themselves with
+register_client().
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.upsert import upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLATFORMS = ("google_ads", "meta_ads")
+METRIC_COLUMNS = ["campaign_name", "status", "impressions", "clicks", "conversions", "spend", "ctr", "cpc", "roas", "last_synced_at"]
+
+
+class AdSyncError(Exception):
+    """The platform could not return an integration's campaigns"""
+
+
+@dataclass
+class IntegrationAccount:
+    """What a client needs to fetch one integration (detached from the session)"""
+    id: int
+    store_id: int
+    platform: str
+    account_id: Optional[str]
+    access_token: Optional[str]
+
+
+class AdPlatformClient:
+    """Source of campaign performance for ad accounts"""
+
+    name = "base"
+    simulated = False
+
+    async def fetch_campaigns(self, account: IntegrationAccount) -> List[Dict]:
+        """
+        Lifetime totals of the account's campaigns: dicts with
+        external_campaign_id, campaign_name, status, impressions, clicks,
+        conversions, spend and roas. Raises AdSyncError.
+        """
+        raise NotImplementedError
+
+
+class FakeAdPlatformClient(AdPlatformClient):
+    """
+    Generated campaigns per account (AD_SYNC_FAKE_CAMPAIGNS each, stable ids)
+    whose totals grow on every fetch, after AD_SYNC_FAKE_LATENCY_MS of
+    simulated network time.
+    """
+
+    name = "fake"
+    simulated = True
+
+    NAMES = {
+        "google_ads": ["Summer Sale Search", "Brand Awareness Display", "Local Store Search", "Performance Max Retail"],
+        "meta_ads": ["Instagram Story Retargeting", "Facebook Feed Prospection", "Reels Product Showcase", "Lookalike Buyers"],
+    }
+    PREFIXES = {"google_ads": "GOOG", "meta_ads": "META"}
+
+    def __init__(self, campaigns: Optional[int] = None, latency_ms: Optional[int] = None):
+        self.campaigns = campaigns if campaigns is not None else settings.AD_SYNC_FAKE_CAMPAIGNS
+        self.latency = (latency_ms if latency_ms is not None else settings.AD_SYNC_FAKE_LATENCY_MS) / 1000
+        self._totals: Dict[tuple, Dict] = {}
+
+    async def fetch_campaigns(self, account: IntegrationAccount) -> List[Dict]:
+        if account.platform not in PLATFORMS:
+            raise AdSyncError(f"Platform '{account.platform}' is not supported")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        names = self.NAMES[account.platform]
+        rng = random.Random()
+        campaigns = []
+        for n in range(1, self.campaigns + 1):
+            key = (account.id, n)
+            if key not in self._totals:
+                seeded = random.Random(f"{account.id}:{n}")
+                self._totals[key] = {
+                    "impressions": 0, "clicks": 0, "conversions": 0, "spend": 0.0,
+                    "roas": round(seeded.uniform(1.2, 6.0), 2),
+                    "status": "paused" if seeded.random() < 0.2 else "active",
+                }
+            totals = self._totals[key]
+            if totals["status"] == "active":
+                impressions = rng.randint(1000, 50000)
+                clicks = int(impressions * rng.uniform(0.005, 0.04))
+                totals["impressions"] += impressions
+                totals["clicks"] += clicks
+                totals["conversions"] += int(clicks * rng.uniform(0.02, 0.12))
+                totals["spend"] = round(totals["spend"] + clicks * rng.uniform(0.3, 1.5), 2)
+
+            name = names[(n - 1) % len(names)]
+            campaigns.append({
+                "external_campaign_id": f"{self.PREFIXES[account.platform]}-{account.id}-{n}",
+                "campaign_name": name if n <= len(names) else f"{name} #{(n - 1) // len(names) + 1}",
+                **totals,
+            })
+        return campaigns
+
+
+CLIENTS: Dict[str, Callable[[], AdPlatformClient]] = {
+    "fake": FakeAdPlatformClient,
+}
+_instances: Dict[str, AdPlatformClient] = {}
+
+
+def register_client(name: str, factory: Callable[[], AdPlatformClient]) -> None:
+    CLIENTS[name] = factory
+    _instances.pop(name, None)
+
+
+def get_client() -> AdPlatformClient:
+    """The configured client (AD_SYNC_CLIENT), created once per process"""
+    name = settings.AD_SYNC_CLIENT
+    if name not in CLIENTS:
+        raise AdSyncError(f"Unknown ad sync client '{name}'. Available: {', '.join(sorted(CLIENTS))}")
+    if name not in _instances:
+        _instances[name] = CLIENTS[name]()
+    return _instances[name]
+
+
+async def _fetch_all(client: AdPlatformClient, accounts: Sequence[IntegrationAccount]) -> List:
+    """Campaign lists (or the exception raised) per account, in order"""
+    semaphore = asyncio.Semaphore(max(1, settings.AD_SYNC_CONCURRENCY))
+
+    async def fetch(account: IntegrationAccount):
+        async with semaphore:
+            return await asyncio.wait_for(client.fetch_campaigns(account), settings.AD_SYNC_TIMEOUT_SECONDS)
+
+    return await asyncio.gather(*(fetch(account) for account in accounts), return_exceptions=True)
+
+
+def _campaign_row(account: IntegrationAccount, campaign: Dict, synced_at: datetime) -> Dict:
+    impressions = int(campaign.get("impressions") or 0)
+    clicks = int(campaign.get("clicks") or 0)
+    spend = float(campaign.get("spend") or 0)
+    return {
+        "integration_id": account.id,
+        "external_campaign_id": str(campaign["external_campaign_id"]),
+        "campaign_name": campaign.get("campaign_name") or str(campaign["external_campaign_id"]),
+        "platform": account.platform,
+        "status": campaign.get("status"),
+        "impressions": impressions,
+        "clicks": clicks,
+        "conversions": int(campaign.get("conversions") or 0),
+        "spend": round(spend, 2),
+        "ctr": round(clicks / impressions * 100, 2) if impressions > 0 else 0.0,
+        "cpc": round(spend / clicks, 2) if clicks > 0 else 0.0,
+        "roas": float(campaign.get("roas") or 0),
+        "last_synced_at": synced_at,
+    }
+
+
+def sync_integrations(
+    db: Session,
+    integration_ids: Optional[Sequence[int]] = None,
+    store_id: Optional[int] = None,
+    client: Optional[AdPlatformClient] = None
+) -> Dict:
+    """
+    Fetch the campaigns of the active Google / Meta Ads integrations (all of
+    them, or the given ids / store) concurrently and upsert them in batches.
+    An integration that fails keeps its previous rows and last_sync_at.
+    Runs as a scheduler job (AD_SYNC_INTERVAL_SECONDS).
+    """
+    client = client or get_client()
+    I = models.MarketingIntegration
+    query = db.query(I.id, I.store_id, I.platform, I.account_id, I.access_token).filter(
+        I.is_active == True,
+        I.platform.in_(PLATFORMS)
+    )
+    if integration_ids is not None:
+        query = query.filter(I.id.in_(list(integration_ids)))
+    if store_id is not None:
+        query = query.filter(I.store_id == store_id)
+    accounts = [IntegrationAccount(*row) for row in query.order_by(I.id)]
+    result = {"integrations": 0, "failed": 0, "campaigns": 0, "errors": {}}
+    if not accounts:
+        return result
+
+    fetched = asyncio.run(_fetch_all(client, accounts))
+
+    synced_at = datetime.utcnow()
+    batch_size = settings.AD_SYNC_BATCH_SIZE
+    rows, synced_ids = [], []
+    for account, campaigns in zip(accounts, fetched):
+        if isinstance(campaigns, BaseException):
+            result["failed"] += 1
+            result["errors"][account.id] = str(campaigns) or type(campaigns).__name__
+            logger.warning(f"Ad sync failed for integration {account.id}: {result['errors'][account.id]}")
+            continue
+        synced_ids.append(account.id)
+        # Last one wins if the platform repeats a campaign, as a single upsert may not touch a row twice
+        unique = {str(c["external_campaign_id"]): c for c in campaigns}
+        rows.extend(_campaign_row(account, campaign, synced_at) for campaign in unique.values())
+
+    for i in range(0, len(rows), batch_size):
+        upsert(
+            db, models.MarketingCampaignSync, rows[i:i + batch_size],
+            conflict_columns=["integration_id", "external_campaign_id"],
+            update_columns=METRIC_COLUMNS
+        )
+        db.commit()
+    if synced_ids:
+        db.query(I).filter(I.id.in_(synced_ids)).update({I.last_sync_at: synced_at}, synchronize_session=False)
+        db.commit()
+
+    result["integrations"] = len(synced_ids)
+    result["campaigns"] = len(rows)
+    logger.info(f"Ad sync: {result['integrations']} integrations, {result['campaigns']} campaigns, {result['failed']} failed")
+    return result
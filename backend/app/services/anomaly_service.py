@@ -0,0 +1,322 @@
+"""
+Anomaly Detection Service
+Rolling per-store metric baselines and z-score alerts, refreshed on a schedule
+"""
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+from app.db.upsert import upsert
+from app.services.forecast_service import _as_date
+from app.services.rollup_service import WEEKDAY_NAMES
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS = ["revenue", "transactions", "discount", "expenses"]
+SALES_METRICS = ["revenue", "transactions", "discount"]  # Come from the hourly rollup
+
+BASELINE_WEEKS = 8
+MIN_SAMPLES = 3  # Weekday occurrences needed before a metric is scored
+MIN_DAY_FRACTION = 0.25  # Don't alert on today before a quarter of a typical day's sales are in
+WARNING_Z = 2.0
+CRITICAL_Z = 3.0
+STDDEV_FLOOR_RATIO = 0.1  # Sigma is at least this share of the typical day, so near-constant series don't produce huge z-scores
+
+# Which side of the baseline is worth alerting on
+ALERT_DIRECTIONS = {
+    "revenue": ("low", "high"),
+    "transactions": ("low", "high"),
+    "discount": ("high",),
+    "expenses": ("high",),
+}
+
+
+# ==================== BASELINE REFRESH ====================
+def _load_hourly_metrics(db: Session, store_ids: List[int], start: date, end: date) -> Dict[int, np.ndarray]:
+    """(metric x day x hour) arrays from the hourly rollup over [start, end)"""
+    n_days = (end - start).days
+    cubes = {store_id: np.zeros((len(SALES_METRICS), n_days, 24)) for store_id in store_ids}
+    rows = db.query(
+        models.SalesHourlyRollup.store_id,
+        models.SalesHourlyRollup.date,
+        models.SalesHourlyRollup.hour,
+        models.SalesHourlyRollup.revenue,
+        models.SalesHourlyRollup.transactions,
+        models.SalesHourlyRollup.discount
+    ).filter(
+        models.SalesHourlyRollup.store_id.in_(store_ids),
+        models.SalesHourlyRollup.date >= start,
+        models.SalesHourlyRollup.date < end
+    )
+    for row in rows:
+        offset = (row.date - start).days
+        cubes[row.store_id][:, offset, row.hour] = (row.revenue or 0, row.transactions or 0, row.discount or 0)
+    return cubes
+
+
+def _load_daily_expenses(db: Session, store_ids: List[int], start: date, end: date) -> Dict[int, np.ndarray]:
+    n_days = (end - start).days
+    series = {store_id: np.zeros(n_days) for store_id in store_ids}
+    rows = db.query(
+        models.Expense.store_id,
+        func.date(models.Expense.expense_date).label("day"),
+        func.sum(models.Expense.amount).label("amount")
+    ).filter(
+        models.Expense.store_id.in_(store_ids),
+        models.Expense.expense_date >= datetime.combine(start, datetime.min.time()),
+        models.Expense.expense_date < datetime.combine(end, datetime.min.time())
+    ).group_by(models.Expense.store_id, func.date(models.Expense.expense_date))
+    for row in rows:
+        offset = (_as_date(row.day) - start).days
+        if 0 <= offset < n_days:
+            series[row.store_id][offset] = float(row.amount or 0)
+    return series
+
+
+def _score(observed: float, expected: float, stddev: float, floor: float) -> float:
+    sigma = max(stddev, floor)
+    if sigma <= 0:
+        # No history of the metric at all: any amount is one sigma per unit
+        sigma = 1.0
+    return (observed - expected) / sigma
+
+
+def _severity(metric: str, z_score: float) -> Optional[str]:
+    direction = "high" if z_score > 0 else "low"
+    if abs(z_score) < WARNING_Z or direction not in ALERT_DIRECTIONS[metric]:
+        return None
+    if direction == "high" and metric in ("revenue", "transactions"):
+        return "success"
+    return "critical" if abs(z_score) >= CRITICAL_Z else "warning"
+
+
+def refresh_baselines(db: Session, store_id: Optional[int] = None, now: Optional[datetime] = None) -> Dict:
+    """
+    Recompute every store's weekday baselines over the last BASELINE_WEEKS full
+    weeks (today excluded), then score today-so-far against them. Yesterday is
+    scored against the BASELINE_WEEKS weeks before it, so it is never part of
+    its own baseline (that would cap its |z| at (n-1)/sqrt(n), below CRITICAL_Z).
+    """
+    started = time.perf_counter()
+    now = now or datetime.now()
+    today = now.date()
+    start = today - timedelta(weeks=BASELINE_WEEKS)
+    n_days = (today - start).days
+
+    store_query = db.query(models.Store.id).filter(models.Store.is_active == True)
+    if store_id is not None:
+        store_query = store_query.filter(models.Store.id == store_id)
+    store_ids = [s.id for s in store_query]
+    if not store_ids:
+        return {"success": True, "stores": 0, "anomalies": 0}
+
+    # The day before the window, the window and today in one read
+    load_start = start - timedelta(days=1)
+    cubes = _load_hourly_metrics(db, store_ids, load_start, today + timedelta(days=1))
+    expenses = _load_daily_expenses(db, store_ids, load_start, today + timedelta(days=1))
+    weekdays = (start.weekday() + np.arange(n_days)) % 7
+    # Yesterday's window [load_start, today - 1 day) holds only its own weekday's earlier samples
+    yesterday_mask = (load_start.weekday() + np.arange(n_days)) % 7 == (today - timedelta(days=1)).weekday()
+    hour_progress = (now.hour + now.minute / 60.0) / 24.0
+
+    baseline_rows = []
+    anomaly_rows = []
+    for sid in store_ids:
+        loaded = np.vstack([cubes[sid].sum(axis=2), expenses[sid][None, :]])  # metric x (n_days + 2)
+        hourly = cubes[sid][:, 1:]
+        daily = loaded[:, 1:]  # metric x (n_days + 1); the last column is the current day
+        history = daily[:, :n_days]
+
+        means = np.zeros((len(METRICS), 7))
+        stds = np.zeros((len(METRICS), 7))
+        counts = np.zeros(7, dtype=int)
+        profiles = np.zeros((len(SALES_METRICS), 7, 24))
+        for day in range(7):
+            mask = weekdays == day
+            counts[day] = int(mask.sum())
+            if not counts[day]:
+                continue
+            means[:, day] = history[:, mask].mean(axis=1)
+            if counts[day] > 1:
+                stds[:, day] = history[:, mask].std(axis=1, ddof=1)
+            # Cumulative share of the day's total reached by the end of each hour
+            by_hour = hourly[:, :n_days][:, mask].sum(axis=1)
+            totals = by_hour.sum(axis=1, keepdims=True)
+            profiles[:, day] = np.where(totals > 0, np.cumsum(by_hour, axis=1) / np.where(totals > 0, totals, 1), 0)
+
+        overall = means.mean(axis=1, keepdims=True)
+        seasonal = np.where(overall > 0, means / np.where(overall > 0, overall, 1), 1.0)
+
+        for m, metric in enumerate(METRICS):
+            for day in range(7):
+                baseline_rows.append({
+                    "store_id": sid,
+                    "metric": metric,
+                    "day_of_week": day,
+                    "mean": round(float(means[m, day]), 4),
+                    "stddev": round(float(stds[m, day]), 4),
+                    "samples": int(counts[day]),
+                    "seasonal_index": round(float(seasonal[m, day]), 4),
+                    "intraday_profile": (
+                        [round(float(v), 4) for v in profiles[m, day]] if metric in SALES_METRICS else None
+                    ),
+                    "window_start": start,
+                    "window_end": today,
+                    "updated_at": now,
+                })
+
+        prior = loaded[:, :n_days][:, yesterday_mask]
+        yesterday_means = prior.mean(axis=1) if prior.shape[1] else np.zeros(len(METRICS))
+        yesterday_stds = prior.std(axis=1, ddof=1) if prior.shape[1] > 1 else np.zeros(len(METRICS))
+
+        # Score yesterday as a complete day and today pro-rated to the current hour
+        for offset, day_date in ((n_days - 1, today - timedelta(days=1)), (n_days, today)):
+            day = day_date.weekday()
+            if day_date == today:
+                day_means, day_stds, samples = means[:, day], stds[:, day], counts[day]
+            else:
+                day_means, day_stds, samples = yesterday_means, yesterday_stds, prior.shape[1]
+            for m, metric in enumerate(METRICS):
+                fraction = 1.0
+                if day_date == today and metric in SALES_METRICS:
+                    # Share of a typical day's total done by now, interpolated within the hour
+                    profile = profiles[m, day]
+                    before = profile[now.hour - 1] if now.hour else 0.0
+                    fraction = float(before + (profile[now.hour] - before) * (now.minute / 60.0))
+                    if not profile[-1]:
+                        fraction = hour_progress
+                # A partial day is a sum of fewer hourly draws: the mean scales with the
+                # fraction of the day done, its spread with the square root of it
+                spread = np.sqrt(fraction)
+                expected = float(day_means[m]) * fraction
+                stddev = float(day_stds[m]) * spread
+                typical = float(day_means[m]) or float(overall[m, 0])
+                observed = float(daily[m, offset])
+                z_score = _score(observed, expected, stddev, STDDEV_FLOOR_RATIO * typical * spread)
+
+                severity = None
+                # A weekday that normally has none of this metric can still spike, never drop
+                if samples >= MIN_SAMPLES and (day_means[m] > 0 or observed > 0):
+                    severity = _severity(metric, z_score)
+                    if fraction < MIN_DAY_FRACTION:
+                        severity = None
+                anomaly_rows.append({
+                    "store_id": sid,
+                    "metric": metric,
+                    "date": day_date,
+                    "observed": round(observed, 2),
+                    "expected": round(expected, 2),
+                    "stddev": round(stddev, 2),
+                    "z_score": round(z_score, 2),
+                    "day_fraction": round(fraction, 4),
+                    "is_anomaly": severity is not None,
+                    "severity": severity,
+                    "evaluated_at": now,
+                })
+
+    upsert(
+        db, models.StoreMetricBaseline, baseline_rows,
+        conflict_columns=["store_id", "metric", "day_of_week"],
+        update_columns=["mean", "stddev", "samples", "seasonal_index", "intraday_profile",
+                        "window_start", "window_end", "updated_at"]
+    )
+    upsert(
+        db, models.MetricAnomaly, anomaly_rows,
+        conflict_columns=["store_id", "metric", "date"],
+        update_columns=["observed", "expected", "stddev", "z_score", "day_fraction",
+                        "is_anomaly", "severity", "evaluated_at"]
+    )
+    db.commit()
+
+    flagged = sum(1 for row in anomaly_rows if row["is_anomaly"])
+    elapsed = time.perf_counter() - started
+    logger.info(f"Metric baselines refreshed for {len(store_ids)} stores, {flagged} anomalies in {elapsed:.2f}s")
+    return {
+        "success": True,
+        "stores": len(store_ids),
+        "anomalies": flagged,
+        "window_start": start.isoformat(),
+        "window_end": today.isoformat(),
+        "runtime_seconds": round(elapsed, 3),
+    }
+
+
+# ==================== READS ====================
+ALERT_TEXT = {
+    ("revenue", "high"): ("High Sales Velocity!", "Revenue is running {pct:.0f}% above a typical {day} (₹{observed:,.0f} vs ₹{expected:,.0f} expected)."),
+    ("revenue", "low"): ("Low Daily Sales", "Revenue is {pct:.0f}% below a typical {day} (₹{observed:,.0f} vs ₹{expected:,.0f} expected). Check store operations."),
+    ("transactions", "high"): ("Unusually Busy", "{observed:,.0f} transactions so far, {pct:.0f}% above a typical {day}."),
+    ("transactions", "low"): ("Low Footfall", "Only {observed:,.0f} transactions against {expected:,.0f} expected for a {day}."),
+    ("discount", "high"): ("Unusual Discounting", "Discounts of ₹{observed:,.0f} are {pct:.0f}% above a typical {day}. Review billing overrides."),
+    ("expenses", "high"): ("Expense Spike", "Expenses of ₹{observed:,.0f} are {pct:.0f}% above a typical {day}."),
+}
+
+ALERT_ACTIONS = {"revenue": "view_report", "transactions": "view_report", "discount": "review_discounts", "expenses": "review_expenses"}
+
+
+def format_alert(anomaly: models.MetricAnomaly) -> Dict:
+    direction = "high" if anomaly.z_score > 0 else "low"
+    title, template = ALERT_TEXT[(anomaly.metric, direction)]
+    pct = abs(anomaly.observed - anomaly.expected) / anomaly.expected * 100 if anomaly.expected else 0
+    when = "Today" if anomaly.date == date.today() else anomaly.date.isoformat()
+    day = WEEKDAY_NAMES[anomaly.date.weekday()]
+    if anomaly.expected:
+        message = template.format(pct=pct, observed=anomaly.observed, expected=anomaly.expected, day=day)
+    elif anomaly.day_fraction is not None and anomaly.day_fraction < 1:
+        message = f"{anomaly.observed:,.0f} in {anomaly.metric} where a typical {day} has none by this time."
+    else:
+        message = f"{anomaly.observed:,.0f} in {anomaly.metric} where a typical {day} has none."
+    return {
+        "severity": anomaly.severity,
+        "title": title,
+        "message": f"{when}: {message}",
+        "action": ALERT_ACTIONS[anomaly.metric],
+        "metric": anomaly.metric,
+        "store_id": anomaly.store_id,
+        "date": anomaly.date.isoformat(),
+        "z_score": anomaly.z_score,
+        "observed": anomaly.observed,
+        "expected": anomaly.expected,
+    }
+
+
+def get_active_anomalies(db: Session, store_id: Optional[int], since: Optional[date] = None) -> List[models.MetricAnomaly]:
+    """Flagged evaluations from the last refresh, strongest first"""
+    since = since or date.today() - timedelta(days=1)
+    query = db.query(models.MetricAnomaly).filter(
+        models.MetricAnomaly.date >= since,
+        models.MetricAnomaly.is_anomaly == True
+    )
+    if store_id is not None:
+        query = query.filter(models.MetricAnomaly.store_id == store_id)
+    anomalies = query.all()
+    anomalies.sort(key=lambda a: (a.date, abs(a.z_score)), reverse=True)
+    return anomalies
+
+
+def get_baselines(db: Session, store_id: Optional[int]) -> List[Dict]:
+    query = db.query(models.StoreMetricBaseline)
+    if store_id is not None:
+        query = query.filter(models.StoreMetricBaseline.store_id == store_id)
+    return [
+        {
+            "store_id": b.store_id,
+            "metric": b.metric,
+            "day_of_week": WEEKDAY_NAMES[b.day_of_week],
+            "mean": b.mean,
+            "stddev": b.stddev,
+            "samples": b.samples,
+            "seasonal_index": b.seasonal_index,
+            "updated_at": b.updated_at.isoformat() if b.updated_at else None,
+        }
+        for b in query.order_by(
+            models.StoreMetricBaseline.store_id,
+            models.StoreMetricBaseline.metric,
+            models.StoreMetricBaseline.day_of_week
+        )
+    ]
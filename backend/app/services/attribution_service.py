@@ -0,0 +1,256 @@
+"""
+Attribution Service
+Offline conversion attribution: links in-store sales to the ad touchpoints
+(clicks, leads, store visits, calls in conversion_tracking) of the same customer
+
+Sales are processed in id order from a watermark, ATTRIBUTION_BATCH_SIZE at a
+time, once they are ATTRIBUTION_SETTLE_HOURS old: the watermark never moves
+back, so the delay is what lets touchpoints uploaded late (offline click
+imports, backdated store visits) still be credited. Each batch loads only the touchpoints of its customers inside the
+lookback window and range-joins them to the sales with a sorted merge:
+touchpoints are sorted on (customer, time) and every sale's window
+[sale - ATTRIBUTION_LOOKBACK_DAYS, sale] is found with two binary searches.
+
+Both models are stored in sale_attributions:
+    last_click - all revenue to the campaign of the latest touchpoint
+    linear     - revenue split evenly over every touchpoint in the window
+The ATTRIBUTION_MODEL figures are added to the campaigns' daily analytics
+(sales_attributed counts the sales a campaign got any credit for). A batch's
+attributions, analytics updates and watermark commit together, so every sale
+is credited exactly once.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.upsert import upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTION_MARK = "sale_attribution"
+MODELS = ("last_click", "linear")
+TOUCH_TYPES = ("click", "lead", "store_visit", "call")
+ID_CHUNK_SIZE = 900
+KEY_STRIDE = 10 ** 10  # Seconds per customer in the merge key; exceeds any epoch timestamp
+
+
+def as_utc(value: datetime) -> datetime:
+    """Naive UTC, the form sale dates are written in (func.now()); aware values are converted first"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _epoch_seconds(values: Sequence[datetime]) -> np.ndarray:
+    return np.array(
+        [int((as_utc(v) - datetime(1970, 1, 1)).total_seconds()) for v in values],
+        dtype=np.int64
+    )
+
+
+def _load_touchpoints(db: Session, customer_ids: List[int], start: datetime, end: datetime) -> List[Tuple]:
+    T = models.ConversionTracking
+    rows = []
+    for i in range(0, len(customer_ids), ID_CHUNK_SIZE):
+        rows.extend(db.query(T.customer_id, T.conversion_date, T.campaign_id).filter(
+            T.customer_id.in_(customer_ids[i:i + ID_CHUNK_SIZE]),
+            T.campaign_id.isnot(None),
+            T.conversion_type.in_(TOUCH_TYPES),
+            T.conversion_date >= start,
+            T.conversion_date <= end
+        ).all())
+    return rows
+
+
+def attribute_sales(
+    sales: Sequence[Tuple[int, int, datetime, float]],
+    touches: Sequence[Tuple[int, datetime, int]],
+    lookback_days: int
+) -> Dict[str, List[Dict]]:
+    """
+    Credit (sale_id, customer_id, sale_date, amount) sales to the campaigns of
+    (customer_id, touch_date, campaign_id) touchpoints in the lookback window.
+    Returns per-model rows of sale_id, campaign_id, credit and revenue.
+    """
+    results = {model: [] for model in MODELS}
+    if not sales or not touches:
+        return results
+
+    touch_keys = np.array([t[0] for t in touches], dtype=np.int64) * KEY_STRIDE + _epoch_seconds([t[1] for t in touches])
+    order = np.argsort(touch_keys, kind="stable")
+    touch_keys = touch_keys[order]
+    touch_campaigns = np.array([t[2] for t in touches], dtype=np.int64)[order]
+
+    sale_ids = np.array([s[0] for s in sales], dtype=np.int64)
+    sale_keys = np.array([s[1] for s in sales], dtype=np.int64) * KEY_STRIDE + _epoch_seconds([s[2] for s in sales])
+    amounts = np.array([float(s[3] or 0) for s in sales])
+    lo = np.searchsorted(touch_keys, sale_keys - lookback_days * 86400, side="left")
+    hi = np.searchsorted(touch_keys, sale_keys, side="right")
+    counts = hi - lo
+    matched = counts > 0
+
+    # Last click: the touchpoint just before the sale
+    for sale_id, campaign_id, amount in zip(
+        sale_ids[matched].tolist(), touch_campaigns[hi[matched] - 1].tolist(), amounts[matched].tolist()
+    ):
+        results["last_click"].append({"sale_id": sale_id, "campaign_id": campaign_id, "credit": 1.0, "revenue": amount})
+
+    # Linear: one row per (sale, touchpoint), then summed per campaign
+    sale_index = np.repeat(np.arange(len(sales)), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    touch_index = np.repeat(lo, counts) + np.arange(int(counts.sum())) - starts
+    share = 1.0 / np.repeat(counts[counts > 0], counts[counts > 0])
+    linear = defaultdict(float)
+    for s, campaign_id, credit in zip(sale_index.tolist(), touch_campaigns[touch_index].tolist(), share.tolist()):
+        linear[(s, campaign_id)] += credit
+    for (s, campaign_id), credit in linear.items():
+        results["linear"].append({
+            "sale_id": int(sale_ids[s]), "campaign_id": campaign_id,
+            "credit": round(credit, 6), "revenue": round(float(amounts[s]) * credit, 2)
+        })
+    return results
+
+
+def _add_to_daily_analytics(db: Session, credited: List[Dict], sale_dates: Dict[int, datetime]) -> int:
+    """Add credited revenue to each campaign's analytics row for the sale's day (bulk update / insert)"""
+    A = models.AdCampaignAnalytics
+    totals: Dict[Tuple[int, datetime], List] = defaultdict(lambda: [0.0, set()])
+    for row in credited:
+        day = sale_dates[row["sale_id"]].replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        totals[(row["campaign_id"], day)][0] += row["revenue"]
+        totals[(row["campaign_id"], day)][1].add(row["sale_id"])
+    if not totals:
+        return 0
+
+    campaign_ids = sorted({campaign_id for campaign_id, _ in totals})
+    first_day = min(day for _, day in totals)
+    last_day = max(day for _, day in totals) + timedelta(days=1)
+    existing = {}
+    for i in range(0, len(campaign_ids), ID_CHUNK_SIZE):
+        for row in db.query(A.id, A.campaign_id, A.date, A.spend, A.sales_attributed, A.revenue_attributed).filter(
+            A.campaign_id.in_(campaign_ids[i:i + ID_CHUNK_SIZE]), A.date >= first_day, A.date < last_day
+        ).order_by(A.id):
+            key = (row.campaign_id, row.date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+            existing.setdefault(key, row)  # Oldest row of the day when there are several
+
+    updates, inserts = [], []
+    for (campaign_id, day), (revenue, sale_ids) in totals.items():
+        row = existing.get((campaign_id, day))
+        if row is None:
+            inserts.append({
+                "campaign_id": campaign_id, "date": day, "sales_attributed": len(sale_ids),
+                "revenue_attributed": round(revenue, 2), "roas": 0.0
+            })
+            continue
+        new_revenue = round((row.revenue_attributed or 0) + revenue, 2)
+        updates.append({
+            "id": row.id,
+            "sales_attributed": (row.sales_attributed or 0) + len(sale_ids),
+            "revenue_attributed": new_revenue,
+            "roas": round(new_revenue / row.spend, 2) if row.spend else 0.0,
+        })
+    if updates:
+        db.execute(update(A), updates)
+    if inserts:
+        db.execute(insert(A), inserts)
+    return len(totals)
+
+
+def run_attribution(db: Session, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """
+    Attribute settled sales past the watermark, one committed batch at a time.
+    Stops at the first sale younger than ATTRIBUTION_SETTLE_HOURS, so the
+    watermark only ever covers settled sales. Run periodically by the
+    scheduler (ATTRIBUTION_INTERVAL_SECONDS).
+    """
+    batch_size = batch_size or settings.ATTRIBUTION_BATCH_SIZE
+    settled_before = datetime.utcnow() - timedelta(hours=settings.ATTRIBUTION_SETTLE_HOURS)
+    lookback = timedelta(days=settings.ATTRIBUTION_LOOKBACK_DAYS)
+    analytics_model = settings.ATTRIBUTION_MODEL if settings.ATTRIBUTION_MODEL in MODELS else "last_click"
+    position = db.query(models.Watermark.position).filter(models.Watermark.name == ATTRIBUTION_MARK).scalar() or 0
+    totals = {"sales": 0, "attributed_sales": 0, "analytics_days": 0, "batches": 0}
+
+    while max_batches is None or totals["batches"] < max_batches:
+        sales = db.query(models.Sale.id, models.Sale.customer_id, models.Sale.sale_date, models.Sale.total_amount).filter(
+            models.Sale.id > position
+        ).order_by(models.Sale.id).limit(batch_size).all()
+        fetched = len(sales)
+        settled = 0
+        while settled < fetched and (sales[settled].sale_date is None or as_utc(sales[settled].sale_date) <= settled_before):
+            settled += 1
+        sales = sales[:settled]
+        if not sales:
+            break
+        with_customer = [s for s in sales if s.customer_id is not None and s.sale_date is not None]
+        touches = []
+        if with_customer:
+            touches = _load_touchpoints(
+                db, sorted({s.customer_id for s in with_customer}),
+                min(s.sale_date for s in with_customer) - lookback, max(s.sale_date for s in with_customer)
+            )
+        results = attribute_sales(with_customer, touches, settings.ATTRIBUTION_LOOKBACK_DAYS)
+        sale_dates = {s.id: s.sale_date for s in with_customer}
+
+        rows = [
+            {**row, "model": model, "sale_date": sale_dates[row["sale_id"]]}
+            for model, model_rows in results.items() for row in model_rows
+        ]
+        if rows:
+            upsert(
+                db, models.SaleAttribution, rows,
+                conflict_columns=["model", "sale_id", "campaign_id"],
+                update_columns=["credit", "revenue", "sale_date"]
+            )
+        totals["analytics_days"] += _add_to_daily_analytics(db, results[analytics_model], sale_dates)
+
+        position = sales[-1].id
+        upsert(
+            db, models.Watermark, [{"name": ATTRIBUTION_MARK, "position": position, "position_at": datetime.now()}],
+            conflict_columns=["name"], update_columns=["position", "position_at"]
+        )
+        db.commit()
+        totals["sales"] += len(sales)
+        totals["attributed_sales"] += len(results["last_click"])
+        totals["batches"] += 1
+        if settled < fetched or fetched < batch_size:
+            break
+
+    if totals["sales"]:
+        logger.info(f"Attribution: {totals}")
+    return totals
+
+
+def attribution_report(
+    db: Session,
+    store_id: int,
+    model: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[Dict]:
+    """Attributed sales and revenue per campaign of a store under one model"""
+    S = models.SaleAttribution
+    C = models.AdCampaignCreation
+    query = db.query(
+        C.id, C.campaign_name, C.platform,
+        func.count(S.sale_id), func.coalesce(func.sum(S.credit), 0), func.coalesce(func.sum(S.revenue), 0)
+    ).join(S, S.campaign_id == C.id).filter(C.store_id == store_id, S.model == model)
+    if start_date:
+        query = query.filter(S.sale_date >= start_date)
+    if end_date:
+        query = query.filter(S.sale_date <= end_date)
+    rows = query.group_by(C.id, C.campaign_name, C.platform).order_by(func.sum(S.revenue).desc()).all()
+    return [
+        {
+            "campaign_id": campaign_id,
+            "campaign_name": name,
+            "platform": getattr(platform, "value", platform),
+            "sales_touched": int(sales),
+            "sales_credited": round(float(credit), 2),
+            "revenue": round(float(revenue), 2),
+        }
+        for campaign_id, name, platform, sales, credit, revenue in rows
+    ]
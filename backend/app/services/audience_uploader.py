@@ -0,0 +1,108 @@
+"""
+Audience Uploaders
+Where audience membership changes are pushed: one class per destination,
+picked by name with AUDIENCE_UPLOADER
+
+Uploaders receive hashed chunks (customer_id, email, phone, fn, ln) from
+audience_service and must be idempotent, because a chunk that fails part-way
+is sent again on the next sync. The local uploader stands in for the ad
+platforms in development and load tests; real platform clients register
+themselves with register_uploader().
+"""
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict
+
+import pandas as pd
+from app.core.config import settings
+from app.db import models
+
+HASHED_COLUMNS = ["email", "phone", "fn", "ln"]
+
+
+class AudienceUploadError(Exception):
+    """The destination rejected or could not take a batch; the batch stays pending"""
+
+
+class AudienceUploader:
+    """Destination for audience membership changes"""
+
+    name = "base"
+
+    def create_audience(self, audience: models.Audience) -> str:
+        """Create the audience at the destination and return its external id"""
+        raise NotImplementedError
+
+    def add_members(self, audience: models.Audience, hashed: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def remove_members(self, audience: models.Audience, hashed: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+
+class LocalAudienceUploader(AudienceUploader):
+    """
+    Writes each batch as a hashed CSV under AUDIENCE_UPLOAD_DIR/audience_<id>/
+    (the same columns a manual platform upload takes) and counts what it got.
+    Only the latest AUDIENCE_UPLOAD_KEEP_FILES batches of an audience are kept,
+    so hashed customer data does not pile up on disk.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str = None):
+        self.directory = Path(directory or settings.AUDIENCE_UPLOAD_DIR)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.stats = {"batches": 0, "added": 0, "removed": 0}
+
+    def _write(self, audience: models.Audience, action: str, hashed: pd.DataFrame):
+        folder = self.directory / f"audience_{audience.id}"
+        os.makedirs(folder, exist_ok=True)
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self.stats["batches"] += 1
+            self.stats[action] += len(hashed)
+        path = folder / f"{datetime.now():%Y%m%d%H%M%S}_{sequence:06d}_{action}.csv"
+        hashed[HASHED_COLUMNS].to_csv(path, index=False)
+        self._prune(folder)
+
+    def _prune(self, folder: Path):
+        """Delete all but the newest AUDIENCE_UPLOAD_KEEP_FILES batches (names sort by time)"""
+        with self._lock:
+            batches = sorted(folder.glob("*.csv"))
+            for old in batches[:max(0, len(batches) - settings.AUDIENCE_UPLOAD_KEEP_FILES)]:
+                old.unlink(missing_ok=True)
+
+    def create_audience(self, audience: models.Audience) -> str:
+        return f"local_{audience.id}"
+
+    def add_members(self, audience: models.Audience, hashed: pd.DataFrame) -> None:
+        self._write(audience, "added", hashed)
+
+    def remove_members(self, audience: models.Audience, hashed: pd.DataFrame) -> None:
+        self._write(audience, "removed", hashed)
+
+
+UPLOADERS: Dict[str, Callable[[], AudienceUploader]] = {
+    "local": LocalAudienceUploader,
+}
+_instances: Dict[str, AudienceUploader] = {}
+
+
+def register_uploader(name: str, factory: Callable[[], AudienceUploader]) -> None:
+    UPLOADERS[name] = factory
+    _instances.pop(name, None)
+
+
+def get_uploader() -> AudienceUploader:
+    """The configured uploader (AUDIENCE_UPLOADER), created once per process"""
+    name = settings.AUDIENCE_UPLOADER
+    if name not in UPLOADERS:
+        raise AudienceUploadError(f"Unknown audience uploader '{name}'. Available: {', '.join(sorted(UPLOADERS))}")
+    if name not in _instances:
+        _instances[name] = UPLOADERS[name]()
+    return _instances[name]
@@ -0,0 +1,294 @@
+"""
+Campaign Dispatch Service
+Concurrent message delivery with per-provider rate limits, pooled HTTP connections and retries
+"""
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+
+def _load_http_backend() -> None:
+    """
+    httpx loads its async backend lazily on first use; with several worker
+    threads starting dispatchers at once that import races. Opening and closing
+    one client loads it up front, on a thread of its own since this module may
+    be imported while an event loop is already running.
+    """
+    async def open_and_close():
+        async with httpx.AsyncClient():
+            pass
+
+    thread = threading.Thread(target=asyncio.run, args=(open_and_close(),), daemon=True)
+    thread.start()
+    thread.join()
+
+
+_load_http_backend()
+
+
+@dataclass
+class OutboundMessage:
+    customer_id: int
+    channel: str  # SMS, WhatsApp, Email, Notification
+    to: Optional[str]
+    body: str
+    subject: Optional[str] = None
+    html: Optional[str] = None
+
+
+@dataclass
+class DeliveryResult:
+    customer_id: int
+    channel: str
+    success: bool
+    body: str
+    error: Optional[str] = None
+    provider_message_id: Optional[str] = None
+    attempts: int = 0
+    demo_mode: bool = False
+
+
+class ProviderError(Exception):
+    def __init__(self, message: str, retryable: bool, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def normalize_phone(phone: str) -> str:
+    """E.164 with the +91 default used across the app"""
+    if phone.startswith('+'):
+        return phone
+    return '+91' + phone.replace('+91', '').replace(' ', '').replace('-', '')
+
+
+def _check_response(response: httpx.Response):
+    if response.status_code < 300:
+        return
+    retryable = response.status_code == 429 or response.status_code >= 500
+    retry_after = response.headers.get("Retry-After")
+    try:
+        retry_after = float(retry_after) if retry_after else None
+    except ValueError:
+        retry_after = None
+    raise ProviderError(
+        f"HTTP {response.status_code}: {response.text[:200]}",
+        retryable=retryable,
+        retry_after=retry_after
+    )
+
+
+# ==================== PROVIDERS ====================
+class TwilioProvider:
+    """Twilio Messages API over a shared client (SMS and WhatsApp)"""
+
+    def __init__(self, client: httpx.AsyncClient, credentials: Dict[str, str]):
+        self.client = client
+        self.account_sid = credentials.get("TWILIO_ACCOUNT_SID")
+        self.auth_token = credentials.get("TWILIO_AUTH_TOKEN")
+        self.from_number = credentials.get("TWILIO_PHONE_NUMBER")
+        self.whatsapp_number = credentials.get("TWILIO_WHATSAPP_NUMBER") or "whatsapp:+14155238886"
+        self.url = f"{settings.TWILIO_API_BASE.rstrip('/')}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.account_sid and self.auth_token)
+
+    async def send(self, message: OutboundMessage) -> Optional[str]:
+        to_phone = normalize_phone(message.to)
+        from_number = self.from_number
+        if message.channel == "WhatsApp":
+            to_phone = to_phone if to_phone.startswith("whatsapp:") else "whatsapp:" + to_phone
+            from_number = self.whatsapp_number
+
+        data = {"To": to_phone, "From": from_number, "Body": message.body}
+        if settings.DELIVERY_STATUS_CALLBACK_URL:
+            data["StatusCallback"] = settings.DELIVERY_STATUS_CALLBACK_URL
+        response = await self.client.post(self.url, data=data, auth=(self.account_sid, self.auth_token))
+        _check_response(response)
+        return response.json().get("sid")
+
+
+class SendGridProvider:
+    """SendGrid v3 mail/send over a shared client"""
+
+    def __init__(self, client: httpx.AsyncClient, credentials: Dict[str, str]):
+        self.client = client
+        self.api_key = credentials.get("SENDGRID_API_KEY")
+        self.from_email = credentials.get("SENDGRID_FROM_EMAIL") or "noreply@skope-erp.com"
+        self.from_name = credentials.get("SENDGRID_FROM_NAME") or "SKOPE ERP"
+        self.url = f"{settings.SENDGRID_API_BASE.rstrip('/')}/v3/mail/send"
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    async def send(self, message: OutboundMessage) -> Optional[str]:
+        content = [{"type": "text/plain", "value": message.body}]
+        if message.html:
+            content.append({"type": "text/html", "value": message.html})
+        response = await self.client.post(
+            self.url,
+            json={
+                "personalizations": [{"to": [{"email": message.to}]}],
+                "from": {"email": self.from_email, "name": self.from_name},
+                "subject": message.subject or "",
+                "content": content
+            },
+            headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+        _check_response(response)
+        return response.headers.get("X-Message-Id")
+
+
+# channel -> (provider, rate limit setting, missing-recipient error)
+CHANNELS: Dict[str, Tuple[str, str, str]] = {
+    "SMS": ("twilio", "SMS_RATE_PER_SECOND", "No phone number"),
+    "WhatsApp": ("twilio", "WHATSAPP_RATE_PER_SECOND", "No phone number"),
+    "Email": ("sendgrid", "EMAIL_RATE_PER_SECOND", "No email address"),
+}
+NOT_CONFIGURED = {"twilio": "Twilio not configured", "sendgrid": "SendGrid not configured"}
+
+
+class TokenBucket:
+    """Async token bucket - `rate` sends per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ==================== DISPATCHER ====================
+class CampaignDispatcher:
+    """
+    Delivers batches of messages from a fixed pool of worker coroutines sharing
+    one pooled HTTP client. Each channel is throttled by its own token bucket;
+    throttling (429) and server errors are retried with exponential backoff.
+
+        async with CampaignDispatcher(credentials) as dispatcher:
+            results = await dispatcher.send_batch(messages)
+    """
+
+    def __init__(
+        self,
+        credentials: Dict[str, str],
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        rates: Optional[Dict[str, float]] = None
+    ):
+        self.credentials = credentials
+        self.concurrency = concurrency or settings.CAMPAIGN_DISPATCH_CONCURRENCY
+        self.max_retries = settings.CAMPAIGN_DISPATCH_MAX_RETRIES if max_retries is None else max_retries
+        self.rates = rates or {
+            channel: getattr(settings, rate_setting)
+            for channel, (_, rate_setting, _) in CHANNELS.items()
+        }
+        self.client: Optional[httpx.AsyncClient] = None
+        self.providers = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def __aenter__(self) -> "CampaignDispatcher":
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency
+            )
+        )
+        self.providers = {
+            "twilio": TwilioProvider(self.client, self.credentials),
+            "sendgrid": SendGridProvider(self.client, self.credentials),
+        }
+        self.buckets = {channel: TokenBucket(rate) for channel, rate in self.rates.items()}
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        self.client = None
+
+    async def send_batch(self, messages: Iterable[OutboundMessage]) -> List[DeliveryResult]:
+        pending = iter(messages)
+        results: List[DeliveryResult] = []
+
+        async def worker():
+            for message in pending:
+                results.append(await self.deliver(message))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return results
+
+    async def deliver(self, message: OutboundMessage) -> DeliveryResult:
+        if message.channel == "Notification":
+            # In-app notification (just log for now)
+            logger.info(f"In-app notification for customer {message.customer_id}: {message.body}")
+            return DeliveryResult(message.customer_id, message.channel, True, message.body, attempts=1)
+
+        provider_name, _, missing_error = CHANNELS[message.channel]
+        if not message.to:
+            return DeliveryResult(message.customer_id, message.channel, False, message.body, error=missing_error)
+        provider = self.providers[provider_name]
+        if not provider.configured:
+            return DeliveryResult(
+                message.customer_id, message.channel, False, message.body,
+                error=NOT_CONFIGURED[provider_name], demo_mode=True
+            )
+
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.buckets[message.channel].acquire()
+            retry_after = None
+            try:
+                provider_id = await provider.send(message)
+                return DeliveryResult(
+                    message.customer_id, message.channel, True, message.body,
+                    provider_message_id=provider_id, attempts=attempt
+                )
+            except ProviderError as e:
+                error, retryable, retry_after = str(e), e.retryable, e.retry_after
+            except httpx.TransportError as e:
+                error, retryable = f"{type(e).__name__}: {e}", True
+            except Exception as e:
+                error, retryable = str(e), False
+
+            if not retryable or attempt > self.max_retries:
+                return DeliveryResult(
+                    message.customer_id, message.channel, False, message.body,
+                    error=error, attempts=attempt
+                )
+            backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            await asyncio.sleep(retry_after or backoff * random.uniform(0.5, 1.0))
+
+
+def dispatch_messages(messages: List[OutboundMessage], credentials: Dict[str, str], **kwargs) -> List[DeliveryResult]:
+    """Synchronous entry point - must not be called from a running event loop"""
+    async def run():
+        async with CampaignDispatcher(credentials, **kwargs) as dispatcher:
+            return await dispatcher.send_batch(messages)
+    return asyncio.run(run())
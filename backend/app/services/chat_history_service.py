@@ -0,0 +1,174 @@
+"""
+Chat History Service
+Stored assistant conversations with a bounded prompt window
+
+A prompt carries the conversation summary plus every message not folded into
+it yet, so nothing said is ever in neither. Once 2 x CHAT_HISTORY_WINDOW
+messages are waiting past the summary, everything but the last window is folded
+into it (by the LLM when it is up, extractively otherwise), which keeps the
+prompt near 2 x CHAT_HISTORY_WINDOW messages whatever the conversation's
+length. Each message is summarized exactly once, after the response has been sent.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+from app.services.ollama_service import ollama, OllamaUnavailable
+import logging
+
+logger = logging.getLogger(__name__)
+
+TITLE_CHARS = 60
+PREVIEW_CHARS = 120
+PROMPT_MESSAGE_CHARS = 2000  # A single long message cannot blow up later prompts
+EXTRACT_CHARS = 160  # Per message in the extractive fallback summary
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def get_conversation(db: Session, user_id: int, chat_id: int) -> Optional[models.ChatConversation]:
+    return db.query(models.ChatConversation).filter(
+        models.ChatConversation.id == chat_id,
+        models.ChatConversation.user_id == user_id
+    ).first()
+
+
+def start_conversation(db: Session, user_id: int, first_message: str) -> models.ChatConversation:
+    conversation = models.ChatConversation(
+        user_id=user_id,
+        title=_clip(first_message, TITLE_CHARS) or "New Conversation",
+        summary_through_id=0,
+        message_count=0,
+        updated_at=datetime.now()
+    )
+    db.add(conversation)
+    db.flush()
+    return conversation
+
+
+def prompt_history(db: Session, conversation: models.ChatConversation) -> List[Dict]:
+    """Summary (as a system message) plus every message past it (fewer than about 2 x CHAT_HISTORY_WINDOW)"""
+    rows = db.query(models.ChatMessage.role, models.ChatMessage.content).filter(
+        models.ChatMessage.conversation_id == conversation.id,
+        models.ChatMessage.id > conversation.summary_through_id
+    ).order_by(models.ChatMessage.id).all()
+    history = []
+    if conversation.summary:
+        history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{conversation.summary}"})
+    history.extend({"role": role, "content": content[:PROMPT_MESSAGE_CHARS]} for role, content in rows)
+    return history
+
+
+def record_exchange(db: Session, conversation_id: int, question: str, answer: str, mode: str) -> models.ChatMessage:
+    """Store one question/answer pair and refresh the conversation's list fields; commits"""
+    conversation = db.get(models.ChatConversation, conversation_id)
+    db.add(models.ChatMessage(conversation_id=conversation_id, role="user", content=question))
+    reply = models.ChatMessage(conversation_id=conversation_id, role="assistant", content=answer, mode=mode)
+    db.add(reply)
+    conversation.message_count = (conversation.message_count or 0) + 2
+    conversation.preview = _clip(answer, PREVIEW_CHARS)
+    conversation.updated_at = datetime.now()
+    db.commit()
+    db.refresh(reply)
+    return reply
+
+
+# ==================== SUMMARIZATION ====================
+def _pending_fold(db: Session, conversation_id: int) -> Optional[Tuple[Optional[str], int, List[models.ChatMessage]]]:
+    """(summary, summary_through_id, messages to fold) once enough messages wait past the summary"""
+    conversation = db.get(models.ChatConversation, conversation_id)
+    if conversation is None:
+        return None
+    window = settings.CHAT_HISTORY_WINDOW
+    pending = db.query(models.ChatMessage).filter(
+        models.ChatMessage.conversation_id == conversation_id,
+        models.ChatMessage.id > conversation.summary_through_id
+    ).order_by(models.ChatMessage.id).all()
+    if len(pending) < 2 * window:
+        return None
+    return conversation.summary, conversation.summary_through_id, pending[:len(pending) - window]
+
+
+def _extractive_summary(messages: List[models.ChatMessage]) -> str:
+    lines = []
+    for message in messages:
+        speaker = "User" if message.role == "user" else "Assistant"
+        lines.append(f"- {speaker}: {_clip(message.content, EXTRACT_CHARS)}")
+    return "\n".join(lines)
+
+
+def _bounded(summary: str) -> str:
+    """Keep the most recent part of a summary within CHAT_SUMMARY_MAX_CHARS, cut at a line break"""
+    limit = settings.CHAT_SUMMARY_MAX_CHARS
+    if len(summary) <= limit:
+        return summary
+    tail = summary[-limit:]
+    return tail[tail.find("\n") + 1:] if "\n" in tail else tail
+
+
+async def _summarize(previous: Optional[str], messages: List[models.ChatMessage]) -> str:
+    transcript = "\n".join(f"{m.role}: {m.content[:PROMPT_MESSAGE_CHARS]}" for m in messages)
+    if await ollama.available():
+        prompt = (
+            "Update the running summary of a conversation between a store manager and the SKOPE ERP "
+            "assistant. Keep figures, product and customer names and open questions; at most 8 short "
+            "bullet points, no preamble.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        try:
+            summary = await ollama.chat([{"role": "user", "content": prompt}])
+            if summary.strip():
+                return _bounded(summary.strip())
+        except OllamaUnavailable as e:
+            logger.warning(f"Chat summary via LLM failed, using extractive summary: {e}")
+    combined = "\n".join(part for part in (previous, _extractive_summary(messages)) if part)
+    return _bounded(combined)
+
+
+def _save_summary(conversation_id: int, expected_through_id: int, summary: str, through_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        # Conditional on the old position, so a concurrent fold of the same messages is discarded
+        updated = db.query(models.ChatConversation).filter(
+            models.ChatConversation.id == conversation_id,
+            models.ChatConversation.summary_through_id == expected_through_id
+        ).update({
+            models.ChatConversation.summary: summary,
+            models.ChatConversation.summary_through_id: through_id
+        }, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+    finally:
+        db.close()
+
+
+def _load_pending_fold(conversation_id: int):
+    db = SessionLocal()
+    try:
+        pending = _pending_fold(db, conversation_id)
+        if pending is not None:
+            db.expunge_all()  # Messages are read after the session closes
+        return pending
+    finally:
+        db.close()
+
+
+async def summarize_conversation(conversation_id: int) -> bool:
+    """Fold messages older than the prompt window into the summary; run as a background task"""
+    try:
+        pending = await run_in_threadpool(_load_pending_fold, conversation_id)
+        if pending is None:
+            return False
+        previous, through_id, messages = pending
+        summary = await _summarize(previous, messages)
+        return await run_in_threadpool(_save_summary, conversation_id, through_id, summary, messages[-1].id)
+    except Exception as e:
+        logger.error(f"Summarizing chat {conversation_id} failed: {e}")
+        return False
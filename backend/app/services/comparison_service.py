@@ -0,0 +1,108 @@
+"""
+Comparison Service
+Per-store daily revenue / transactions / expenses for the comparison endpoints
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+from app.services import olap_service
+from app.services.forecast_service import _as_date
+
+
+def load_daily_totals(db: Session, store_ids: Optional[List[int]], start: date, end: date) -> List[Dict]:
+    """
+    Rows of {store_id, day, revenue, transactions, expenses} over [start, end),
+    for the given stores (all stores when None). Sales come from the hourly
+    rollup (or the analytics mirror when enabled), expenses from one grouped query.
+    """
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end, datetime.min.time())
+
+    mirrored = olap_service.daily_totals(store_ids, start_dt, end_dt)
+    if mirrored is not None:
+        return mirrored
+
+    totals = defaultdict(lambda: {"revenue": 0.0, "transactions": 0, "expenses": 0.0})
+
+    sales_query = db.query(
+        models.SalesHourlyRollup.store_id,
+        models.SalesHourlyRollup.date,
+        func.sum(models.SalesHourlyRollup.revenue).label("revenue"),
+        func.sum(models.SalesHourlyRollup.transactions).label("transactions")
+    ).filter(
+        models.SalesHourlyRollup.date >= start,
+        models.SalesHourlyRollup.date < end
+    )
+    if store_ids is not None:
+        sales_query = sales_query.filter(models.SalesHourlyRollup.store_id.in_(store_ids))
+    for row in sales_query.group_by(models.SalesHourlyRollup.store_id, models.SalesHourlyRollup.date):
+        bucket = totals[(row.store_id, row.date)]
+        bucket["revenue"] = float(row.revenue or 0)
+        bucket["transactions"] = int(row.transactions or 0)
+
+    expense_day = func.date(models.Expense.expense_date)
+    expense_query = db.query(
+        models.Expense.store_id,
+        expense_day.label("day"),
+        func.sum(models.Expense.amount).label("expenses")
+    ).filter(
+        models.Expense.expense_date >= start_dt,
+        models.Expense.expense_date < end_dt
+    )
+    if store_ids is not None:
+        expense_query = expense_query.filter(models.Expense.store_id.in_(store_ids))
+    for row in expense_query.group_by(models.Expense.store_id, expense_day):
+        totals[(row.store_id, _as_date(row.day))]["expenses"] = float(row.expenses or 0)
+
+    return [
+        {"store_id": store_id, "day": day, **values}
+        for (store_id, day), values in totals.items()
+    ]
+
+
+def bucket_totals(
+    rows: List[Dict],
+    keys: List[Hashable],
+    key_of: Callable[[date], Hashable],
+    label_of: Callable[[Hashable], Dict],
+    store_ids: Optional[List[int]] = None
+) -> Dict[Optional[int], List[Dict]]:
+    """
+    Roll daily rows up into the requested buckets, once per store and once
+    for all stores combined (under the None key). Every bucket in `keys` is
+    present, zero-filled, in `keys` order - also for stores in `store_ids`
+    that had no activity.
+    """
+    series = defaultdict(lambda: {
+        key: {**label_of(key), "revenue": 0, "expenses": 0, "profit": 0, "transactions": 0}
+        for key in keys
+    })
+    for store_key in [None] + list(store_ids or []):
+        series[store_key]
+    for row in rows:
+        key = key_of(row["day"])
+        for store_key in (row["store_id"], None):
+            entry = series[store_key].get(key)
+            if entry is None:
+                continue
+            entry["revenue"] += float(row["revenue"])
+            entry["transactions"] += int(row["transactions"])
+            entry["expenses"] += float(row["expenses"])
+
+    result = {}
+    for store_key, buckets in series.items():
+        for entry in buckets.values():
+            entry["profit"] = entry["revenue"] - entry["expenses"]
+        result[store_key] = list(buckets.values())
+    return result
+
+
+def store_names(db: Session, store_ids: List[int]) -> Dict[int, str]:
+    return {
+        s.id: s.name
+        for s in db.query(models.Store.id, models.Store.name).filter(models.Store.id.in_(store_ids))
+    }
@@ -0,0 +1,226 @@
+"""
+Delivery Event Service
+Provider status webhooks staged in delivery_events and applied to campaign_logs in bulk
+
+Webhooks only normalize and insert events, so providers get a fast answer even
+for large batches. apply_delivery_events (run by the scheduler) drains the table
+in batches: one indexed lookup of the logs by provider message id, one bulk
+UPDATE by primary key and one counter increment per campaign.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.services.marketing_service import increment_campaign_counters
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK_SIZE = 900  # Keeps IN (...) lists under SQLite's bound-parameter limit
+RETRY_SECONDS = 30  # Delay for events whose message is not logged yet
+
+# Provider status -> normalized event; anything else (queued, sent, processed, deferred...) is ignored
+TWILIO_EVENTS = {
+    "delivered": "delivered",
+    "read": "opened",  # WhatsApp read receipt
+    "undelivered": "failed",
+    "failed": "failed",
+}
+SENDGRID_EVENTS = {
+    "delivered": "delivered",
+    "open": "opened",
+    "click": "clicked",
+    "bounce": "failed",
+    "dropped": "failed",
+}
+
+# Log statuses only move forward. Delivery evidence outranks a failure whichever
+# arrives first, and timestamps keep the earliest value, so the result does not
+# depend on the order events are received or batched in.
+STATUS_RANK = {"failed": 0, "sent": 1, "delivered": 2, "opened": 3, "clicked": 4}
+
+# Log timestamps an event implies, with the campaign counter each one feeds
+EVENT_FIELDS = {
+    "delivered": [("delivered_at", None)],
+    "opened": [("delivered_at", None), ("opened_at", "opened")],
+    "clicked": [("delivered_at", None), ("opened_at", "opened"), ("clicked_at", "clicked")],
+}
+
+
+# ==================== INGESTION ====================
+def _event_row(provider: str, message_id: str, event: str, occurred_at: datetime, detail: Optional[str], now: datetime) -> Dict:
+    return {
+        "provider": provider,
+        "provider_message_id": message_id,
+        "event": event,
+        "detail": detail[:500] if detail else None,
+        "occurred_at": occurred_at,
+        "received_at": now,
+        "available_at": now,
+        "attempts": 0,
+    }
+
+
+def record_twilio_status(db: Session, form: Dict[str, str]) -> int:
+    """Stage one Twilio status callback; returns the number of events kept (0 or 1)"""
+    event = TWILIO_EVENTS.get((form.get("MessageStatus") or form.get("SmsStatus") or "").lower())
+    message_id = form.get("MessageSid") or form.get("SmsSid")
+    if not event or not message_id:
+        return 0
+    now = datetime.now()
+    db.execute(insert(models.DeliveryEvent), [
+        _event_row("twilio", message_id, event, now, form.get("ErrorCode"), now)
+    ])
+    db.commit()
+    return 1
+
+
+def record_sendgrid_events(db: Session, events: Iterable[Dict]) -> int:
+    """Stage a SendGrid event webhook batch with one multi-row INSERT; returns events kept"""
+    now = datetime.now()
+    rows = []
+    for payload in events:
+        event = SENDGRID_EVENTS.get(payload.get("event"))
+        message_id = payload.get("sg_message_id")
+        if not event or not message_id:
+            continue
+        # sg_message_id is the X-Message-Id returned at send time plus a ".filter..." suffix
+        message_id = message_id.split(".", 1)[0]
+        try:
+            occurred_at = datetime.fromtimestamp(int(payload["timestamp"]))
+        except (KeyError, TypeError, ValueError):
+            occurred_at = now
+        rows.append(_event_row("sendgrid", message_id, event, occurred_at, payload.get("reason"), now))
+    if rows:
+        db.execute(insert(models.DeliveryEvent), rows)
+        db.commit()
+    return len(rows)
+
+
+# ==================== APPLY ====================
+def _naive(value: datetime) -> datetime:
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def _apply_event(log: Dict, event: models.DeliveryEvent, deltas: Dict[str, int]) -> bool:
+    """Fold one event into a log's state and the campaign's counter deltas; returns True when something changed"""
+    if event.event == "failed":
+        if log["status"] != "sent":
+            return False  # Already failed, or delivery was confirmed
+        log["status"] = "failed"
+        log["error_message"] = event.detail or "Delivery failed"
+        deltas["sent"] -= 1
+        deltas["failed"] += 1
+        return True
+
+    at = event.occurred_at
+    changed = False
+    if log["status"] == "failed":
+        log["error_message"] = None
+        deltas["sent"] += 1
+        deltas["failed"] -= 1
+    for field, counter in EVENT_FIELDS[event.event]:
+        if log[field] is None:
+            if counter:
+                deltas[counter] += 1
+            log[field] = at
+            changed = True
+        elif _naive(log[field]) > at:
+            log[field] = at
+            changed = True
+    if STATUS_RANK[event.event] > STATUS_RANK.get(log["status"], 0):
+        log["status"] = event.event
+        changed = True
+    return changed
+
+
+def _apply_batch(db: Session, events: List[models.DeliveryEvent], now: datetime) -> Tuple[int, int, int]:
+    """Apply one batch; returns (applied, retried, dropped)"""
+    message_ids = list({event.provider_message_id for event in events})
+    logs: Dict[str, Dict] = {}
+    for i in range(0, len(message_ids), LOOKUP_CHUNK_SIZE):
+        rows = db.query(
+            models.CampaignLog.id,
+            models.CampaignLog.campaign_id,
+            models.CampaignLog.provider_message_id,
+            models.CampaignLog.status,
+            models.CampaignLog.error_message,
+            models.CampaignLog.delivered_at,
+            models.CampaignLog.opened_at,
+            models.CampaignLog.clicked_at,
+        ).filter(models.CampaignLog.provider_message_id.in_(message_ids[i:i + LOOKUP_CHUNK_SIZE]))
+        for row in rows:
+            logs[row.provider_message_id] = dict(row._mapping)
+
+    changed: Dict[int, Dict] = {}
+    deltas: Dict[int, Dict[str, int]] = {}
+    done_ids, retry_ids, drop_ids = [], [], []
+    max_age = now - timedelta(seconds=settings.DELIVERY_EVENT_MAX_AGE_SECONDS)
+    for event in sorted(events, key=lambda e: (e.occurred_at, e.id)):
+        log = logs.get(event.provider_message_id)
+        if log is None:
+            # Callbacks can beat the log's commit; keep the event around for a while
+            (drop_ids if event.received_at < max_age else retry_ids).append(event.id)
+            continue
+        campaign_deltas = deltas.setdefault(log["campaign_id"], {"sent": 0, "failed": 0, "opened": 0, "clicked": 0})
+        if _apply_event(log, event, campaign_deltas):
+            changed[log["id"]] = log
+        done_ids.append(event.id)
+
+    if changed:
+        db.execute(update(models.CampaignLog), [
+            {
+                "id": log["id"],
+                "status": log["status"],
+                "error_message": log["error_message"],
+                "delivered_at": log["delivered_at"],
+                "opened_at": log["opened_at"],
+                "clicked_at": log["clicked_at"],
+            }
+            for log in changed.values()
+        ])
+    for campaign_id, campaign_deltas in deltas.items():
+        increment_campaign_counters(db, campaign_id, **campaign_deltas)
+
+    finished = done_ids + drop_ids
+    for i in range(0, len(finished), LOOKUP_CHUNK_SIZE):
+        db.query(models.DeliveryEvent).filter(
+            models.DeliveryEvent.id.in_(finished[i:i + LOOKUP_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    for i in range(0, len(retry_ids), LOOKUP_CHUNK_SIZE):
+        db.query(models.DeliveryEvent).filter(
+            models.DeliveryEvent.id.in_(retry_ids[i:i + LOOKUP_CHUNK_SIZE])
+        ).update({
+            models.DeliveryEvent.available_at: now + timedelta(seconds=RETRY_SECONDS),
+            models.DeliveryEvent.attempts: models.DeliveryEvent.attempts + 1,
+        }, synchronize_session=False)
+    db.commit()
+    return len(done_ids), len(retry_ids), len(drop_ids)
+
+
+def apply_delivery_events(db: Session, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Drain every available event, one committed batch at a time"""
+    batch_size = batch_size or settings.DELIVERY_EVENT_BATCH_SIZE
+    totals = {"applied": 0, "retried": 0, "dropped": 0, "batches": 0}
+    last_id = 0
+    while True:
+        now = datetime.now()
+        # Walk by id so events pushed back for retry are not picked up again in this pass
+        events = db.query(models.DeliveryEvent).filter(
+            models.DeliveryEvent.available_at <= now,
+            models.DeliveryEvent.id > last_id
+        ).order_by(models.DeliveryEvent.id).limit(batch_size).all()
+        if not events:
+            break
+        last_id = events[-1].id
+        applied, retried, dropped = _apply_batch(db, events, now)
+        totals["applied"] += applied
+        totals["retried"] += retried
+        totals["dropped"] += dropped
+        totals["batches"] += 1
+    if totals["batches"]:
+        logger.info(f"Delivery events: {totals}")
+    return totals
@@ -1,216 +1,181 @@
 """
 Marketing Automation Service
-Handles real WhatsApp, SMS, and Email sending for campaigns
+Handles real WhatsApp, SMS, and Email sending for campaigns; every message goes
+out through campaign_dispatch_service (CampaignDispatcher / dispatch_messages)
 """
-import os
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import asyncio
+from typing import Iterable, List, Dict, Optional, Sequence
+from datetime import datetime
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.db import models
+from app.db.upsert import upsert
+from app.services.campaign_dispatch_service import (
+    CampaignDispatcher,
+    DeliveryResult,
+    OutboundMessage,
+    dispatch_messages
+)
+from app.services.queue_service import enqueue, extend_lease, group_progress, register_handler
+from app.services.segment_service import audience_query, iter_audience_ids
+from app.services.settings_service import settings_cache
+from app.services.template_service import CampaignRenderer, campaign_values, compile_template, customer_values
 import logging
 
 logger = logging.getLogger(__name__)
 
 # ==================== CONFIGURATION HELPER ====================
 def get_system_setting(db: Session, key: str, default: str = "") -> str:
-    """Get system setting from DB, fallback to env var, then default"""
-    if not db:
-        return os.getenv(key, default)
-        
-    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == key).first()
-    if setting:
-        return setting.value
-    
-    return os.getenv(key, default)
+    """Get system setting from DB (via the shared settings cache), fallback to env var, then default"""
+    return settings_cache.get(db, key, default)
 
-# ==================== TWILIO SMS/WhatsApp ====================
-def send_sms(to_phone: str, message: str, db: Session = None) -> Dict:
+# ==================== MESSAGE TEMPLATE PROCESSOR ====================
+def process_template(template: str, customer: models.Customer, campaign: models.Campaign = None, **kwargs) -> str:
     """
-    Send SMS using Twilio
+    Process message template with customer data.
+    For many customers use CampaignRenderer, which resolves the campaign once.
     """
-    try:
-        account_sid = get_system_setting(db, "TWILIO_ACCOUNT_SID")
-        auth_token = get_system_setting(db, "TWILIO_AUTH_TOKEN")
-        from_number = get_system_setting(db, "TWILIO_PHONE_NUMBER")
-        
-        if not account_sid or not auth_token:
-            logger.warning("Twilio credentials not configured. SMS not sent.")
-            return {
-                "success": False,
-                "error": "Twilio not configured",
-                "demo_mode": True,
-                "message": "Demo: SMS would be sent to " + to_phone
-            }
-        
-        from twilio.rest import Client
-        client = Client(account_sid, auth_token)
-        
-        # Ensure phone number has country code
-        if not to_phone.startswith('+'):
-            to_phone = '+91' + to_phone.replace('+91', '').replace(' ', '').replace('-', '')
-        
-        message_obj = client.messages.create(
-            body=message,
-            from_=from_number,
-            to=to_phone
-        )
-        
-        logger.info(f"SMS sent successfully to {to_phone}. SID: {message_obj.sid}")
-        return {
-            "success": True,
-            "sid": message_obj.sid,
-            "status": message_obj.status,
-            "to": to_phone
-        }
-    
-    except Exception as e:
-        logger.error(f"Failed to send SMS to {to_phone}: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "to": to_phone
-        }
+    values = campaign_values(campaign)
+    values.update(customer_values(customer))
+    values.update({key: str(value) for key, value in kwargs.items()})
+    return compile_template(template).render(values)
 
 
-def send_whatsapp(to_phone: str, message: str, db: Session = None) -> Dict:
-    """
-    Send WhatsApp message using Twilio
-    """
-    try:
-        account_sid = get_system_setting(db, "TWILIO_ACCOUNT_SID")
-        auth_token = get_system_setting(db, "TWILIO_AUTH_TOKEN")
-        whatsapp_number = get_system_setting(db, "TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
-        
-        if not account_sid or not auth_token:
-            logger.warning("Twilio credentials not configured. WhatsApp not sent.")
-            return {
-                "success": False,
-                "error": "Twilio not configured",
-                "demo_mode": True,
-                "message": "Demo: WhatsApp would be sent to " + to_phone
-            }
-        
-        from twilio.rest import Client
-        client = Client(account_sid, auth_token)
-        
-        # Ensure phone number has country code and whatsapp: prefix
-        if not to_phone.startswith('+'):
-            to_phone = '+91' + to_phone.replace('+91', '').replace(' ', '').replace('-', '')
-        
-        if not to_phone.startswith('whatsapp:'):
-            to_phone = 'whatsapp:' + to_phone
-        
-        message_obj = client.messages.create(
-            body=message,
-            from_=whatsapp_number,
-            to=to_phone
-        )
-        
-        logger.info(f"WhatsApp sent successfully to {to_phone}. SID: {message_obj.sid}")
-        return {
-            "success": True,
-            "sid": message_obj.sid,
-            "status": message_obj.status,
-            "to": to_phone
-        }
-    
-    except Exception as e:
-        logger.error(f"Failed to send WhatsApp to {to_phone}: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "to": to_phone
-        }
+# ==================== CAMPAIGN EXECUTION ====================
+PROVIDER_SETTINGS = [
+    "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER", "TWILIO_WHATSAPP_NUMBER",
+    "SENDGRID_API_KEY", "SENDGRID_FROM_EMAIL", "SENDGRID_FROM_NAME",
+]
+CHANNEL_NAMES = {
+    models.CampaignType.SMS: "SMS",
+    models.CampaignType.WHATSAPP: "WhatsApp",
+    models.CampaignType.EMAIL: "Email",
+    models.CampaignType.NOTIFICATION: "Notification",
+}
+
+
+def load_provider_credentials(db: Session) -> Dict[str, str]:
+    """Provider settings resolved once per run rather than once per message"""
+    return {key: get_system_setting(db, key) for key in PROVIDER_SETTINGS}
+
+
+def build_campaign_messages(
+    campaign: models.Campaign,
+    customers: Iterable[models.Customer],
+    renderer: Optional[CampaignRenderer] = None
+) -> List[OutboundMessage]:
+    """Render the campaign for a chunk of customers and address each on the campaign's channel"""
+    renderer = renderer or CampaignRenderer(campaign)
+    channel = CHANNEL_NAMES[campaign.campaign_type]
+    rendered = renderer.render_batch(customers)
+
+    if channel == "Email":
+        return [
+            OutboundMessage(customer.id, channel, customer.email, message,
+                            subject=campaign.name, html=renderer.email_html(message))
+            for customer, message in rendered
+        ]
+    if channel == "Notification":
+        return [OutboundMessage(customer.id, channel, None, message) for customer, message in rendered]
+    return [OutboundMessage(customer.id, channel, customer.phone, message) for customer, message in rendered]
+
+
+def _campaign_log_row(campaign_id: int, result: DeliveryResult, sent_at: datetime) -> Dict:
+    return {
+        "campaign_id": campaign_id,
+        "customer_id": result.customer_id,
+        "message_sent": result.body,
+        "status": "sent" if result.success else "failed",
+        "channel": result.channel,
+        "error_message": None if result.success else result.error,
+        "provider_message_id": result.provider_message_id,
+        "attempts": result.attempts,
+        "sent_at": sent_at,
+    }
+
+
+# Counter name -> Campaign column, for atomic increments
+CAMPAIGN_COUNTERS = {
+    "sent": models.Campaign.total_sent,
+    "failed": models.Campaign.total_failed,
+    "opened": models.Campaign.total_opened,
+    "clicked": models.Campaign.total_clicked,
+    "converted": models.Campaign.total_converted,
+}
 
 
-# ==================== SENDGRID EMAIL ====================
-def send_email(to_email: str, subject: str, html_content: str, text_content: str = None, db: Session = None) -> Dict:
+def increment_campaign_counters(db: Session, campaign_id: int, **deltas: int) -> None:
     """
-    Send Email using SendGrid
+    Add to the campaign's materialized counters in one UPDATE, e.g.
+    increment_campaign_counters(db, 7, sent=180, failed=20). Does not commit.
     """
-    try:
-        api_key = get_system_setting(db, "SENDGRID_API_KEY")
-        from_email = get_system_setting(db, "SENDGRID_FROM_EMAIL", "noreply@skope-erp.com")
-        from_name = get_system_setting(db, "SENDGRID_FROM_NAME", "SKOPE ERP")
-        
-        if not api_key:
-            logger.warning("SendGrid API key not configured. Email not sent.")
-            return {
-                "success": False,
-                "error": "SendGrid not configured",
-                "demo_mode": True,
-                "message": "Demo: Email would be sent to " + to_email
-            }
-        
-        from sendgrid import SendGridAPIClient
-        from sendgrid.helpers.mail import Mail, Email, To, Content
-        
-        message = Mail(
-            from_email=Email(from_email, from_name),
-            to_emails=To(to_email),
-            subject=subject,
-            html_content=Content("text/html", html_content)
+    values = {
+        CAMPAIGN_COUNTERS[name]: func.coalesce(CAMPAIGN_COUNTERS[name], 0) + delta
+        for name, delta in deltas.items() if delta
+    }
+    if values:
+        db.query(models.Campaign).filter(models.Campaign.id == campaign_id).update(
+            values, synchronize_session=False
         )
-        
-        if text_content:
-            message.add_content(Content("text/plain", text_content))
-        
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(message)
-        
-        logger.info(f"Email sent successfully to {to_email}. Status: {response.status_code}")
-        return {
-            "success": True,
-            "status_code": response.status_code,
-            "to": to_email
-        }
-    
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "to": to_email
-        }
 
 
-# ==================== MESSAGE TEMPLATE PROCESSOR ====================
-def process_template(template: str, customer: models.Customer, campaign: models.Campaign = None, **kwargs) -> str:
+class CampaignLogBuffer:
     """
-    Process message template with customer data
+    Collects delivery results for one campaign (and optionally one run) and
+    writes them in chunks: a multi-row INSERT into campaign_logs, a single
+    counter UPDATE and a campaign_contacts upsert per chunk, instead of an ORM
+    object and a Python-side increment per message. Flushing does not commit.
     """
-    replacements = {
-        '{customer_name}': customer.name or 'Valued Customer',
-        '{name}': customer.name or 'Valued Customer',
-        '{email}': customer.email or '',
-        '{phone}': customer.phone or '',
-        '{loyalty_points}': str(customer.loyalty_points or 0),
-    }
-    
-    if campaign:
-        replacements['{campaign_name}'] = campaign.name or ''
-        replacements['{discount_code}'] = campaign.discount_code or ''
-        # Use getattr safely and handle None
-        discount_percentage = getattr(campaign, 'discount_percentage', 0)
-        replacements['{discount}'] = str(discount_percentage) + '%'
-        
-        if campaign.end_date:
-            replacements['{end_date}'] = campaign.end_date.strftime('%d %B %Y')
-        if campaign.start_date:
-            replacements['{start_date}'] = campaign.start_date.strftime('%d %B %Y')
-    
-    # Add any additional kwargs
-    for key, value in kwargs.items():
-        replacements[f'{{{key}}}'] = str(value)
-    
-    message = template
-    for placeholder, value in replacements.items():
-        message = message.replace(placeholder, value)
-    
-    return message
+
+    def __init__(self, db: Session, campaign_id: int, run_id: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.db = db
+        self.campaign_id = campaign_id
+        self.run_id = run_id
+        self.chunk_size = chunk_size or settings.CAMPAIGN_DISPATCH_BATCH_SIZE
+        self.rows: List[Dict] = []
+
+    def add(self, results: Iterable[DeliveryResult]) -> None:
+        sent_at = datetime.now()
+        for result in results:
+            row = _campaign_log_row(self.campaign_id, result, sent_at)
+            row["run_id"] = self.run_id
+            self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        while self.rows:
+            chunk, self.rows = self.rows[:self.chunk_size], self.rows[self.chunk_size:]
+            self.db.execute(insert(models.CampaignLog), chunk)
+            sent = sum(1 for row in chunk if row["status"] == "sent")
+            failed = len(chunk) - sent
+            increment_campaign_counters(self.db, self.campaign_id, sent=sent, failed=failed)
+            if self.run_id is not None:
+                self.db.query(models.CampaignRun).filter(models.CampaignRun.id == self.run_id).update({
+                    models.CampaignRun.sent: models.CampaignRun.sent + sent,
+                    models.CampaignRun.failed: models.CampaignRun.failed + failed
+                }, synchronize_session=False)
+            # Latest send per customer for the automated triggers' frequency caps
+            contacts = {
+                row["customer_id"]: {
+                    "campaign_id": self.campaign_id,
+                    "customer_id": row["customer_id"],
+                    "last_sent_at": row["sent_at"],
+                    "sends": 1,
+                }
+                for row in chunk if row["status"] == "sent"
+            }
+            upsert(
+                self.db,
+                models.CampaignContact,
+                list(contacts.values()),
+                conflict_columns=["campaign_id", "customer_id"],
+                update_columns=["last_sent_at"],
+                increment_columns=["sends"]
+            )
 
 
-# ==================== CAMPAIGN EXECUTION ====================
 def send_campaign_message(
     campaign: models.Campaign,
     customer: models.Customer,
@@ -220,82 +185,24 @@ def send_campaign_message(
     Send a single campaign message to a customer
     """
     try:
-        # Process the message template
-        message = process_template(
-            campaign.message_template,
-            customer,
-            campaign
-        )
-        
-        result = {"success": False, "channel": campaign.campaign_type.value}
-        
-        # Send based on campaign type
-        if campaign.campaign_type == models.CampaignType.SMS:
-            if customer.phone:
-                result = send_sms(customer.phone, message, db)
-                result["channel"] = "SMS"
-            else:
-                result = {"success": False, "error": "No phone number", "channel": "SMS"}
-        
-        elif campaign.campaign_type == models.CampaignType.WHATSAPP:
-            if customer.phone:
-                result = send_whatsapp(customer.phone, message, db)
-                result["channel"] = "WhatsApp"
-            else:
-                result = {"success": False, "error": "No phone number", "channel": "WhatsApp"}
-        
-        elif campaign.campaign_type == models.CampaignType.EMAIL:
-            if customer.email:
-                # Create HTML email from message
-                html_content = f"""
-                <html>
-                <body style="font-family: Arial, sans-serif; padding: 20px;">
-                    <div style="max-width: 600px; margin: 0 auto;">
-                        <h2 style="color: #333;">{campaign.name}</h2>
-                        <div style="white-space: pre-wrap; line-height: 1.6;">
-                            {message.replace(chr(10), '<br>')}
-                        </div>
-                        <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
-                        <p style="color: #666; font-size: 12px;">
-                            You received this email because you are a valued customer of SKOPE ERP.
-                        </p>
-                    </div>
-                </body>
-                </html>
-                """
-                result = send_email(
-                    customer.email,
-                    campaign.name,
-                    html_content,
-                    message,
-                    db
-                )
-                result["channel"] = "Email"
-            else:
-                result = {"success": False, "error": "No email address", "channel": "Email"}
-        
-        elif campaign.campaign_type == models.CampaignType.NOTIFICATION:
-            # In-app notification (just log for now)
-            logger.info(f"In-app notification for customer {customer.id}: {message}")
-            result = {
-                "success": True,
-                "channel": "Notification",
-                "message": "In-app notification logged"
-            }
-        
-        # Log the campaign message
-        campaign_log = models.CampaignLog(
-            campaign_id=campaign.id,
-            customer_id=customer.id,
-            message_sent=message,
-            status="sent" if result.get("success") else "failed",
-            channel=result.get("channel", campaign.campaign_type.value),
-            error_message=result.get("error") if not result.get("success") else None,
-            sent_at=datetime.now()
-        )
-        db.add(campaign_log)
-        
-        return result
+        result = dispatch_messages(
+            build_campaign_messages(campaign, [customer]),
+            load_provider_credentials(db),
+            concurrency=1
+        )[0]
+
+        # Log the campaign message and bump the counters (committed by the caller)
+        logs = CampaignLogBuffer(db, campaign.id)
+        logs.add([result])
+        logs.flush()
+
+        return {
+            "success": result.success,
+            "channel": result.channel,
+            "error": result.error,
+            "sid": result.provider_message_id,
+            "demo_mode": result.demo_mode,
+        }
     
     except Exception as e:
         logger.error(f"Error sending campaign message: {str(e)}")
@@ -306,130 +213,202 @@ def send_campaign_message(
         }
 
 
-def execute_campaign(campaign_id: int, db: Session, customer_ids: List[int] = None) -> Dict:
+# ==================== QUEUED DELIVERY ====================
+CAMPAIGN_QUEUE = "campaigns"
+
+
+def _run_group(run_id: int) -> str:
+    return f"campaign_run:{run_id}"
+
+
+def enqueue_campaign_run(
+    db: Session,
+    campaign: models.Campaign,
+    customer_ids: Optional[List[int]] = None,
+    requested_by: Optional[int] = None,
+    conditions: Sequence = (),
+    skip_empty: bool = False,
+    commit: bool = True
+) -> Optional[models.CampaignRun]:
     """
-    Execute a campaign - send messages to all eligible customers
+    Split the campaign's audience into jobs of CAMPAIGN_JOB_SIZE recipients and
+    queue them for the workers. Untargeted jobs cover customer id ranges, so
+    enqueueing a million-recipient run writes about a thousand rows. Campaigns
+    with target_customers criteria or extra `conditions` (automated triggers)
+    snapshot the matching ids, streamed from the compiled segment query, into
+    the job payloads. With `skip_empty`, nothing is written for an empty
+    audience and None is returned. Invalid criteria raise SegmentError before
+    the run is created. With commit=False the run and its jobs are only
+    flushed, so the caller can commit them together with its own writes.
     """
-    try:
-        campaign = db.query(models.Campaign).filter(models.Campaign.id == campaign_id).first()
-        if not campaign:
-            return {"success": False, "error": "Campaign not found"}
-        
-        # Get customers to send to
-        if customer_ids:
-            customers = db.query(models.Customer).filter(
-                models.Customer.id.in_(customer_ids),
-                models.Customer.store_id == campaign.store_id
-            ).all()
-        else:
-            # Get all active customers for the store
-            customers = db.query(models.Customer).filter(
-                models.Customer.store_id == campaign.store_id
-            ).limit(1000).all()  # Limit to prevent overwhelming
-        
-        if not customers:
-            return {"success": False, "error": "No customers found"}
-        
-        # Send messages
-        results = {
-            "total": len(customers),
-            "sent": 0,
-            "failed": 0,
-            "errors": []
-        }
-        
-        for customer in customers:
-            result = send_campaign_message(campaign, customer, db)
-            
-            if result.get("success"):
-                results["sent"] += 1
-                campaign.total_sent = (campaign.total_sent or 0) + 1
-            else:
-                results["failed"] += 1
-                results["errors"].append({
-                    "customer_id": customer.id,
-                    "customer_name": customer.name,
-                    "error": result.get("error", "Unknown error")
-                })
-        
-        # Update campaign stats
-        campaign.last_run_at = datetime.now()
-        if campaign.status == models.CampaignStatus.SCHEDULED:
-            campaign.status = models.CampaignStatus.ACTIVE
-        
+    job_size = settings.CAMPAIGN_JOB_SIZE
+    audience = audience_query(db, campaign.store_id, campaign.target_customers, extra_conditions=conditions)
+    run = models.CampaignRun(campaign_id=campaign.id, status="queued", requested_by=requested_by)
+    db.add(run)
+    db.flush()
+
+    if customer_ids:
+        ids = sorted(row.id for row in audience.filter(models.Customer.id.in_(customer_ids)))
+        payloads = [
+            {"run_id": run.id, "campaign_id": campaign.id, "customer_ids": ids[i:i + job_size]}
+            for i in range(0, len(ids), job_size)
+        ]
+        total = len(ids)
+    elif campaign.target_customers or conditions:
+        payloads = [
+            {"run_id": run.id, "campaign_id": campaign.id, "customer_ids": ids}
+            for ids in iter_audience_ids(
+                db, campaign.store_id, campaign.target_customers, job_size, extra_conditions=conditions
+            )
+        ]
+        total = sum(len(payload["customer_ids"]) for payload in payloads)
+    else:
+        # Every job_size-th customer id starts a new job
+        numbered = audience.add_columns(
+            func.row_number().over(order_by=models.Customer.id).label("position")
+        ).subquery()
+        starts = [
+            row.id for row in db.query(numbered.c.id).filter(
+                (numbered.c.position - 1) % job_size == 0
+            ).order_by(numbered.c.id)
+        ]
+        total = audience.count()
+        last_id = db.query(func.max(models.Customer.id)).filter(
+            models.Customer.store_id == campaign.store_id
+        ).scalar()
+        payloads = [
+            {
+                "run_id": run.id,
+                "campaign_id": campaign.id,
+                "first_id": first_id,
+                "last_id": starts[i + 1] - 1 if i + 1 < len(starts) else last_id
+            }
+            for i, first_id in enumerate(starts)
+        ]
+
+    if skip_empty and not payloads:
+        db.delete(run)
+        db.flush()
+        return None
+    run.total_recipients = total
+    run.total_jobs = len(payloads)
+    if not payloads:
+        run.status = "completed"
+        run.finished_at = datetime.now()
+    enqueue(db, "campaign_batch", payloads, queue=CAMPAIGN_QUEUE, group_key=_run_group(run.id))
+    if commit:
         db.commit()
-        
-        logger.info(f"Campaign {campaign_id} executed: {results['sent']} sent, {results['failed']} failed")
-        return {
-            "success": True,
-            "campaign_id": campaign_id,
-            "campaign_name": campaign.name,
-            **results
-        }
-    
-    except Exception as e:
-        logger.error(f"Error executing campaign {campaign_id}: {str(e)}")
-        db.rollback()
-        return {
-            "success": False,
-            "error": str(e)
-        }
+        db.refresh(run)
+    else:
+        db.flush()
+    return run
+
 
+def _settle_campaign_run(db: Session, job: models.QueueJob) -> None:
+    """Close the run once none of its jobs are pending or leased"""
+    run_id = job.payload["run_id"]
+    progress = group_progress(db, _run_group(run_id))
+    if progress.get("pending") or progress.get("leased"):
+        return
+    run = db.query(models.CampaignRun).filter(models.CampaignRun.id == run_id).first()
+    if run is None:
+        return
+    now = datetime.now()
+    run.status = "failed" if progress.get("dead") else "completed"
+    run.finished_at = now
+    campaign = run.campaign
+    campaign.last_run_at = now
+    if campaign.status == models.CampaignStatus.SCHEDULED:
+        campaign.status = models.CampaignStatus.ACTIVE
 
-# ==================== AUTOMATED TRIGGERS ====================
-def check_and_trigger_automated_campaigns(db: Session):
+
+@register_handler("campaign_batch", on_settled=_settle_campaign_run)
+def deliver_campaign_batch(db: Session, job: models.QueueJob) -> None:
     """
-    Check for automated campaign triggers and execute them
-    This should be run periodically (e.g., every hour via cron job)
+    Queue handler: deliver one job's recipients in sub-batches. Each sub-batch's
+    logs and counters are committed as soon as it is sent, before the lease is
+    extended, and recipients already logged for the run are skipped, so a job
+    picked up again after a crash or a lost lease resumes instead of re-sending.
     """
-    try:
-        now = datetime.now()
-        
-        # Get all active automated campaigns
-        campaigns = db.query(models.Campaign).filter(
-            models.Campaign.status == models.CampaignStatus.ACTIVE,
-            models.Campaign.trigger_type != models.CampaignTrigger.MANUAL
-        ).all()
-        
-        for campaign in campaigns:
-            # Birthday campaigns
-            if campaign.trigger_type == models.CampaignTrigger.BIRTHDAY:
-                # Find customers with birthdays today
-                # Note: This assumes you have a birthday field in Customer model
-                # If not, skip this trigger
-                pass
-            
-            # Warranty expiry campaigns
-            elif campaign.trigger_type == models.CampaignTrigger.WARRANTY_EXPIRY:
-                days_before = campaign.days_before_trigger or 30
-                # Find products with warranties expiring soon
-                # This would require tracking purchase dates and warranty periods
-                pass
-            
-            # No purchase in 30 days
-            elif campaign.trigger_type == models.CampaignTrigger.NO_PURCHASE_30_DAYS:
-                cutoff_date = now - timedelta(days=30)
-                # Find customers who haven't purchased in 30 days
-                customers = db.query(models.Customer).filter(
-                    models.Customer.store_id == campaign.store_id,
-                    models.Customer.last_purchase_date < cutoff_date
-                ).limit(100).all()
-                
-                if customers:
-                    customer_ids = [c.id for c in customers]
-                    execute_campaign(campaign.id, db, customer_ids)
-            
-            # Festival campaigns (check if today is within campaign date range)
-            elif campaign.trigger_type == models.CampaignTrigger.FESTIVAL:
-                if campaign.start_date and campaign.end_date:
-                    if campaign.start_date <= now <= campaign.end_date:
-                        # Only send once per day
-                        # Check last run date if available (or add column)
-                        execute_campaign(campaign.id, db)
-        
-        logger.info("Automated campaign check completed")
-        return {"success": True, "message": "Automated campaigns checked"}
-    
-    except Exception as e:
-        logger.error(f"Error checking automated campaigns: {str(e)}")
-        return {"success": False, "error": str(e)}
+    payload = job.payload
+    run_id = payload["run_id"]
+    campaign = db.query(models.Campaign).filter(models.Campaign.id == payload["campaign_id"]).first()
+    if campaign is None:
+        return
+
+    db.query(models.CampaignRun).filter(
+        models.CampaignRun.id == run_id,
+        models.CampaignRun.status == "queued"
+    ).update({
+        models.CampaignRun.status: "running",
+        models.CampaignRun.started_at: datetime.now()
+    }, synchronize_session=False)
+    db.commit()
+
+    recipients = db.query(models.Customer).filter(models.Customer.store_id == campaign.store_id)
+    logged = db.query(models.CampaignLog.customer_id).filter(models.CampaignLog.run_id == run_id)
+    if "customer_ids" in payload:
+        recipients = recipients.filter(models.Customer.id.in_(payload["customer_ids"]))
+        logged = logged.filter(models.CampaignLog.customer_id.in_(payload["customer_ids"]))
+    else:
+        recipients = recipients.filter(models.Customer.id.between(payload["first_id"], payload["last_id"]))
+        logged = logged.filter(models.CampaignLog.customer_id.between(payload["first_id"], payload["last_id"]))
+    already_sent = {row.customer_id for row in logged}
+
+    asyncio.run(_deliver_recipients(db, job, campaign, run_id, recipients, already_sent))
+
+
+async def _deliver_recipients(db, job, campaign, run_id, recipients, already_sent) -> None:
+    batch_size = settings.CAMPAIGN_DISPATCH_BATCH_SIZE
+    renderer = CampaignRenderer(campaign)
+    last_id = 0
+
+    logs = CampaignLogBuffer(db, campaign.id, run_id=run_id, chunk_size=batch_size)
+
+    async with CampaignDispatcher(load_provider_credentials(db)) as dispatcher:
+        while True:
+            customers = recipients.filter(
+                models.Customer.id > last_id
+            ).order_by(models.Customer.id).limit(batch_size).all()
+            if not customers:
+                break
+            last_id = customers[-1].id
+            pending = [c for c in customers if c.id not in already_sent]
+            if not pending:
+                continue
+
+            logs.add(await dispatcher.send_batch(build_campaign_messages(campaign, pending, renderer)))
+            # Committed before the lease check: these were sent, so even if another worker has
+            # taken the job over it must see them (a lost lease only stops this worker)
+            logs.flush()
+            db.commit()
+            extend_lease(db, job)
+            db.commit()
+
+
+def get_campaign_run_progress(db: Session, run: models.CampaignRun) -> Dict:
+    jobs = group_progress(db, _run_group(run.id))
+    processed = (run.sent or 0) + (run.failed or 0)
+    status = run.status
+    if status in ("completed", "failed") and (jobs.get("pending") or jobs.get("leased")):
+        status = "running"  # Dead-lettered jobs were requeued
+    return {
+        "run_id": run.id,
+        "campaign_id": run.campaign_id,
+        "status": status,
+        "total_recipients": run.total_recipients,
+        "processed": processed,
+        "sent": run.sent,
+        "failed": run.failed,
+        "percent_complete": round(processed / run.total_recipients * 100, 1) if run.total_recipients else 100.0,
+        "jobs": {
+            "total": run.total_jobs,
+            "pending": jobs.get("pending", 0),
+            "in_progress": jobs.get("leased", 0),
+            "done": jobs.get("done", 0),
+            "dead": jobs.get("dead", 0),
+        },
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+    }
@@ -0,0 +1,534 @@
+"""
+Analytics Mirror Service
+Optional columnar copy of the sales tables (Parquet files queried with DuckDB)
+so heavy analytical reads stay off the OLTP database
+"""
+import enum
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+import logging
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+SYNC_CHUNK_ROWS = 500000
+COMPACT_AFTER_FILES = 32  # Merge a fact table's part files once it has this many
+LOCK_STALE_SECONDS = 3600
+GAP_LOOKBACK_KEYS = 1000  # Re-check this many keys below the watermark for rows that committed late
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+# Append-only tables, synced by watermark
+FACT_TABLES: Dict[str, Tuple[object, List[Tuple[str, str]]]] = {
+    "sales": (models.Sale, [
+        ("id", "BIGINT"), ("store_id", "INTEGER"), ("customer_id", "INTEGER"),
+        ("sale_date", "TIMESTAMP"), ("subtotal", "DOUBLE"), ("gst_amount", "DOUBLE"),
+        ("discount", "DOUBLE"), ("total_amount", "DOUBLE"), ("payment_mode", "VARCHAR"),
+        ("created_by", "INTEGER"),
+    ]),
+    "sale_items": (models.SaleItem, [
+        ("id", "BIGINT"), ("sale_id", "BIGINT"), ("product_id", "INTEGER"),
+        ("quantity", "INTEGER"), ("unit_price", "DOUBLE"), ("gst_amount", "DOUBLE"),
+        ("total_price", "DOUBLE"),
+    ]),
+}
+
+# Watermark column per fact table; items follow their sale so a sale's lines land together
+FACT_KEYS = {"sales": "id", "sale_items": "sale_id"}
+
+# Mutable tables, re-snapshotted when their change signature moves
+DIMENSION_TABLES: Dict[str, Tuple[object, List[Tuple[str, str]]]] = {
+    "products": (models.Product, [
+        ("id", "INTEGER"), ("store_id", "INTEGER"), ("sku", "VARCHAR"), ("name", "VARCHAR"),
+        ("category", "VARCHAR"), ("brand", "VARCHAR"), ("unit_price", "DOUBLE"),
+        ("cost_price", "DOUBLE"), ("current_stock", "INTEGER"), ("is_active", "BOOLEAN"),
+    ]),
+    "customers": (models.Customer, [
+        ("id", "INTEGER"), ("store_id", "INTEGER"), ("name", "VARCHAR"), ("phone", "VARCHAR"),
+        ("total_purchases", "DOUBLE"), ("created_at", "TIMESTAMP"),
+    ]),
+    "expenses": (models.Expense, [
+        ("id", "BIGINT"), ("store_id", "INTEGER"), ("category", "VARCHAR"), ("amount", "DOUBLE"),
+        ("payment_mode", "VARCHAR"), ("expense_date", "TIMESTAMP"),
+    ]),
+}
+
+
+def _signature(db: Session, model) -> str:
+    """Cheap change detector for a dimension table"""
+    columns = [func.count(model.id), func.max(model.id)]
+    if hasattr(model, "updated_at"):
+        columns.append(func.max(model.updated_at))
+    if model is models.Expense:
+        # No updated_at on expenses; edits almost always touch the amount or the date
+        columns += [func.sum(model.amount), func.max(model.expense_date)]
+    return json.dumps([str(v) for v in db.query(*columns).one()])
+
+
+def _frame(rows: Sequence, columns: List[Tuple[str, str]]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(rows, columns=[name for name, _ in columns])
+    for name, _ in columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            df[name] = series.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+        elif series.dtype == object:
+            sample = series.dropna()
+            if len(sample) and isinstance(sample.iloc[0], enum.Enum):
+                df[name] = series.map(lambda v: v.value if isinstance(v, enum.Enum) else v)
+            elif len(sample) and isinstance(sample.iloc[0], datetime) and sample.iloc[0].tzinfo is not None:
+                df[name] = pd.to_datetime(series, utc=True).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    return df
+
+
+def _typed_select(columns: List[Tuple[str, str]], source: str) -> str:
+    return "SELECT " + ", ".join(f"CAST({name} AS {sql_type}) AS {name}" for name, sql_type in columns) + f" FROM {source}"
+
+
+class AnalyticsMirror:
+    """
+    Parquet mirror of sales, sale_items, products, customers and expenses.
+
+    A manifest (manifest.json) lists the live files of every table and is
+    swapped atomically after each sync, so any number of API workers can read
+    while one process syncs.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._manifest_mtime = None
+        self.manifest: Dict = {}
+
+    # ---------- state ----------
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    @property
+    def available(self) -> bool:
+        return duckdb is not None and self.manifest_path.exists()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether analytical endpoints should read from the mirror"""
+        return settings.OLAP_ENABLED and self.available
+
+    def _read_manifest(self) -> Dict:
+        if not self.manifest_path.exists():
+            return {"version": 0, "tables": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict):
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _acquire_sync_lock(self) -> bool:
+        lock_path = self.root / "sync.lock"
+        try:
+            if lock_path.exists() and time.time() - lock_path.stat().st_mtime > LOCK_STALE_SECONDS:
+                lock_path.unlink()
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        except FileExistsError:
+            return False
+
+    def _release_sync_lock(self):
+        try:
+            (self.root / "sync.lock").unlink()
+        except FileNotFoundError:
+            pass
+
+    # ---------- sync ----------
+    def _write_parquet(self, con, df: pd.DataFrame, columns: List[Tuple[str, str]], relative: str):
+        target = self.root / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".parquet.tmp")
+        con.register("batch_df", df)
+        try:
+            con.execute(f"COPY ({_typed_select(columns, 'batch_df')}) TO '{tmp.as_posix()}' (FORMAT PARQUET)")
+        finally:
+            con.unregister("batch_df")
+        os.replace(tmp, target)
+
+    def _write_rows(self, con, result, name: str, columns, state: Dict, prefix: str) -> int:
+        """Stream a result set into part files of at most SYNC_CHUNK_ROWS rows"""
+        key_index = [c for c, _ in columns].index(FACT_KEYS[name])
+        written = 0
+        while True:
+            rows = result.fetchmany(SYNC_CHUNK_ROWS)
+            if not rows:
+                break
+            first_key, last_key = rows[0][key_index], rows[-1][key_index]
+            relative = f"{name}/{prefix}-{first_key:012d}-{last_key:012d}-{len(state['files']):05d}.parquet"
+            self._write_parquet(con, _frame(rows, columns), columns, relative)
+            state["files"].append(relative)
+            written += len(rows)
+        state["rows"] = state.get("rows", 0) + written
+        return written
+
+    def _sync_fact(self, db: Session, con, name: str, model, columns, state: Dict, high: int) -> int:
+        """
+        Append rows whose key is in (watermark, high]. Rows just below the old
+        watermark that committed after the previous sync are picked up too.
+        """
+        key = getattr(model, FACT_KEYS[name])
+        watermark = state.get("watermark", 0)
+        state.setdefault("files", [])
+        selected = [getattr(model, c) for c, _ in columns]
+        connection = db.connection().execution_options(stream_results=True)
+
+        synced = 0
+        if state["files"] and watermark:
+            low = max(watermark - GAP_LOOKBACK_KEYS, 0)
+            sources = ", ".join(f"'{(self.root / f).as_posix()}'" for f in state["files"])
+            mirrored = {row[0] for row in con.execute(
+                f"SELECT DISTINCT {FACT_KEYS[name]} FROM read_parquet([{sources}]) "
+                f"WHERE {FACT_KEYS[name]} > ? AND {FACT_KEYS[name]} <= ?", [low, watermark]
+            ).fetchall()}
+            current = {row[0] for row in connection.execute(
+                select(key).where(key > low, key <= watermark).distinct()
+            )}
+            late = sorted(current - mirrored)
+            for i in range(0, len(late), 900):
+                result = connection.execute(
+                    select(*selected).where(key.in_(late[i:i + 900])).order_by(key, model.id)
+                )
+                synced += self._write_rows(con, result, name, columns, state, "late")
+
+        result = connection.execute(
+            select(*selected).where(key > watermark, key <= high).order_by(key, model.id)
+        )
+        synced += self._write_rows(con, result, name, columns, state, "part")
+        state["watermark"] = max(watermark, high)
+
+        if len(state["files"]) >= COMPACT_AFTER_FILES:
+            self._compact(con, name, columns, state)
+        return synced
+
+    def _compact(self, con, name: str, columns, state: Dict):
+        old_files = list(state["files"])
+        sources = ", ".join(f"'{(self.root / f).as_posix()}'" for f in old_files)
+        relative = f"{name}/compact-{state['watermark']:012d}-{int(time.time() * 1000)}.parquet"
+        target = self.root / relative
+        tmp = target.with_suffix(".parquet.tmp")
+        con.execute(
+            f"COPY ({_typed_select(columns, f'read_parquet([{sources}])')} ORDER BY {FACT_KEYS[name]}, id) "
+            f"TO '{tmp.as_posix()}' (FORMAT PARQUET)"
+        )
+        os.replace(tmp, target)
+        state["files"] = [relative]
+        logger.info(f"Analytics mirror compacted {len(old_files)} {name} files")
+
+    def _sync_dimension(self, db: Session, con, name: str, model, columns, state: Dict) -> int:
+        signature = _signature(db, model)
+        if state.get("files") and state.get("signature") == signature:
+            return 0
+        rows = db.connection().execute(
+            select(*[getattr(model, c) for c, _ in columns]).order_by(model.id)
+        ).fetchall()
+        relative = f"{name}/snapshot-{int(time.time() * 1000)}.parquet"
+        self._write_parquet(con, _frame(rows, columns), columns, relative)
+        state.update({"files": [relative], "signature": signature, "rows": len(rows)})
+        return len(rows)
+
+    def _remove_unreferenced(self, manifest: Dict):
+        live = {f for table in manifest["tables"].values() for f in table.get("files", [])}
+        for name in list(FACT_TABLES) + list(DIMENSION_TABLES):
+            directory = self.root / name
+            if not directory.exists():
+                continue
+            for path in directory.glob("*.parquet"):
+                if f"{name}/{path.name}" not in live:
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass  # Still open by a reader (Windows); next sync retries
+
+    def sync(self, db: Session) -> Dict:
+        """Copy new fact rows and changed dimension tables into the mirror"""
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed - pip install duckdb to use the analytics mirror")
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self._acquire_sync_lock():
+            return {"success": False, "message": "Another sync is in progress"}
+
+        started = time.perf_counter()
+        try:
+            manifest = self._read_manifest()
+            con = duckdb.connect()
+            synced = {}
+            try:
+                # One upper bound for both fact tables so items never run ahead of their sales
+                high = db.query(func.max(models.Sale.id)).scalar() or 0
+                for name, (model, columns) in FACT_TABLES.items():
+                    state = manifest["tables"].setdefault(name, {})
+                    synced[name] = self._sync_fact(db, con, name, model, columns, state, high)
+                for name, (model, columns) in DIMENSION_TABLES.items():
+                    state = manifest["tables"].setdefault(name, {})
+                    synced[name] = self._sync_dimension(db, con, name, model, columns, state)
+            finally:
+                con.close()
+                db.rollback()  # Release the read transaction
+
+            manifest["version"] = manifest.get("version", 0) + 1
+            manifest["synced_at"] = datetime.now().isoformat()
+            self._write_manifest(manifest)
+            self._remove_unreferenced(manifest)
+        finally:
+            self._release_sync_lock()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Analytics mirror synced in {elapsed:.2f}s: {synced}")
+        return {
+            "success": True,
+            "version": manifest["version"],
+            "rows_synced": synced,
+            "sync_seconds": round(elapsed, 3),
+        }
+
+    def status(self) -> Dict:
+        manifest = self._read_manifest()
+        return {
+            "enabled": self.enabled,
+            "duckdb_installed": duckdb is not None,
+            "path": str(self.root),
+            "version": manifest.get("version", 0),
+            "synced_at": manifest.get("synced_at"),
+            "tables": {
+                name: {"rows": state.get("rows", 0), "files": len(state.get("files", [])), "watermark": state.get("watermark")}
+                for name, state in manifest.get("tables", {}).items()
+            },
+        }
+
+    # ---------- query ----------
+    def _connection(self):
+        mtime = self.manifest_path.stat().st_mtime
+        if self._conn is not None and mtime == self._manifest_mtime:
+            return self._conn
+        with self._lock:
+            if self._conn is not None and mtime == self._manifest_mtime:
+                return self._conn
+            manifest = self._read_manifest()
+            con = self._conn or duckdb.connect()
+            for name, (_, columns) in {**FACT_TABLES, **DIMENSION_TABLES}.items():
+                files = manifest["tables"].get(name, {}).get("files", [])
+                if files:
+                    sources = ", ".join(f"'{(self.root / f).as_posix()}'" for f in files)
+                    source = f"SELECT * FROM read_parquet([{sources}])"
+                else:
+                    source = _typed_select(columns, "(SELECT 1) AS empty") + " WHERE false"
+                con.execute(f"CREATE OR REPLACE VIEW {name} AS {source}")
+            self._conn = con
+            self._manifest_mtime = mtime
+            self.manifest = manifest
+        return self._conn
+
+    def query(self, sql: str, params: Optional[list] = None) -> List[Dict]:
+        cursor = self._connection().cursor()
+        try:
+            result = cursor.execute(sql, params or [])
+            names = [d[0] for d in result.description]
+            return [dict(zip(names, row)) for row in result.fetchall()]
+        finally:
+            cursor.close()
+
+    def try_query(self, sql: str, params: Optional[list] = None) -> Optional[List[Dict]]:
+        """Rows from the mirror, or None when it is disabled or the query fails (callers then use the OLTP path)"""
+        if not self.enabled:
+            return None
+        try:
+            return self.query(sql, params)
+        except Exception as e:
+            logger.warning(f"Analytics mirror query failed, falling back to the database: {e}")
+            return None
+
+
+analytics_mirror = AnalyticsMirror(settings.OLAP_MIRROR_DIR)
+
+
+def sync_analytics_mirror(db: Session) -> Dict:
+    """Scheduler entry point"""
+    return analytics_mirror.sync(db)
+
+
+# ==================== MIRROR QUERIES ====================
+def _store_clause(column: str, store_id: Optional[int], params: list) -> str:
+    if store_id is None:
+        return ""
+    params.append(store_id)
+    return f" AND {column} = ?"
+
+
+def _stores_clause(column: str, store_ids: Optional[List[int]], params: list) -> str:
+    if store_ids is None:
+        return ""
+    params.extend(store_ids)
+    return f" AND {column} IN ({', '.join('?' for _ in store_ids)})"
+
+
+def daily_totals(store_ids: Optional[List[int]], start: datetime, end: datetime) -> Optional[List[Dict]]:
+    """Revenue, transactions and expenses per store per calendar day over [start, end)"""
+    params = [start, end]
+    sales_filter = _stores_clause("store_id", store_ids, params)
+    params += [start, end]
+    expense_filter = _stores_clause("store_id", store_ids, params)
+    return analytics_mirror.try_query(f"""
+        WITH s AS (
+            SELECT store_id, CAST(sale_date AS DATE) AS day, SUM(total_amount) AS revenue, COUNT(*) AS transactions
+            FROM sales WHERE sale_date >= ? AND sale_date < ?{sales_filter}
+            GROUP BY 1, 2
+        ), e AS (
+            SELECT store_id, CAST(expense_date AS DATE) AS day, SUM(amount) AS expenses
+            FROM expenses WHERE expense_date >= ? AND expense_date < ?{expense_filter}
+            GROUP BY 1, 2
+        )
+        SELECT COALESCE(s.store_id, e.store_id) AS store_id,
+               COALESCE(s.day, e.day) AS day,
+               COALESCE(s.revenue, 0) AS revenue,
+               COALESCE(s.transactions, 0) AS transactions,
+               COALESCE(e.expenses, 0) AS expenses
+        FROM s FULL OUTER JOIN e ON s.store_id = e.store_id AND s.day = e.day
+    """, params)
+
+
+def item_wise_margin(store_id: Optional[int], start: datetime, end: datetime) -> Optional[List[Dict]]:
+    params = [start, end]
+    store_filter = _store_clause("p.store_id", store_id, params)
+    return analytics_mirror.try_query(f"""
+        SELECT p.name, p.sku, p.cost_price,
+               AVG(si.unit_price) AS avg_selling_price,
+               SUM(si.quantity) AS quantity_sold,
+               SUM(s.discount * si.total_price / NULLIF(s.total_amount, 0)) AS total_discount,
+               SUM(si.total_price - p.cost_price * si.quantity) AS total_margin
+        FROM sale_items si
+        JOIN sales s ON si.sale_id = s.id
+        JOIN products p ON si.product_id = p.id
+        WHERE s.sale_date >= ? AND s.sale_date <= ?{store_filter}
+        GROUP BY p.id, p.name, p.sku, p.cost_price
+    """, params)
+
+
+def brand_profitability(store_id: Optional[int], start: datetime, end: datetime) -> Optional[List[Dict]]:
+    params = [start, end]
+    store_filter = _store_clause("p.store_id", store_id, params)
+    return analytics_mirror.try_query(f"""
+        SELECT p.brand,
+               SUM(si.total_price) AS revenue,
+               SUM(si.total_price - p.cost_price * si.quantity) AS gross_profit
+        FROM sale_items si
+        JOIN sales s ON si.sale_id = s.id
+        JOIN products p ON si.product_id = p.id
+        WHERE s.sale_date >= ? AND s.sale_date <= ?{store_filter}
+        GROUP BY p.brand
+    """, params)
+
+
+def discount_totals(store_id: Optional[int], start: datetime, end: datetime) -> Optional[Dict]:
+    params = [start, end]
+    store_filter = _store_clause("store_id", store_id, params)
+    rows = analytics_mirror.try_query(f"""
+        SELECT COALESCE(SUM(discount), 0) AS total_discount,
+               COALESCE(SUM(total_amount), 0) AS total_amount
+        FROM sales WHERE sale_date >= ? AND sale_date <= ?{store_filter}
+    """, params)
+    return rows[0] if rows else None
+
+
+def customer_rfm(store_id: Optional[int]) -> Optional[List[Dict]]:
+    """Recency inputs, order count and spend per customer (customers filtered by their home store)"""
+    params = []
+    store_filter = _store_clause("c.store_id", store_id, params)
+    return analytics_mirror.try_query(f"""
+        SELECT c.id AS customer_id, MAX(s.sale_date) AS last_purchase,
+               COUNT(*) AS frequency, SUM(s.total_amount) AS monetary
+        FROM customers c JOIN sales s ON s.customer_id = c.id
+        WHERE true{store_filter}
+        GROUP BY c.id
+    """, params)
+
+
+def churn_inputs(store_id: Optional[int]) -> Optional[List[Dict]]:
+    """Per-customer recency, order count and average of the newest / oldest three orders"""
+    params = []
+    store_filter = _store_clause("c.store_id", store_id, params)
+    return analytics_mirror.try_query(f"""
+        WITH ranked AS (
+            SELECT s.customer_id, s.sale_date, s.total_amount,
+                   ROW_NUMBER() OVER (PARTITION BY s.customer_id ORDER BY s.sale_date DESC) AS newest,
+                   ROW_NUMBER() OVER (PARTITION BY s.customer_id ORDER BY s.sale_date ASC) AS oldest
+            FROM sales s WHERE s.customer_id IS NOT NULL
+        )
+        SELECT c.id AS customer_id, c.name, c.phone, c.total_purchases,
+               MAX(r.sale_date) AS last_purchase,
+               COUNT(*) AS frequency,
+               AVG(CASE WHEN r.newest <= 3 THEN r.total_amount END) AS recent_3_avg,
+               AVG(CASE WHEN r.oldest <= 3 THEN r.total_amount END) AS older_3_avg
+        FROM customers c JOIN ranked r ON r.customer_id = c.id
+        WHERE true{store_filter}
+        GROUP BY c.id, c.name, c.phone, c.total_purchases
+    """, params)
+
+
+def cohort_retention(store_id: Optional[int], start: datetime, periods: int = 6) -> Optional[List[Dict]]:
+    """
+    Customers grouped by the month of their first purchase since `start`, with
+    the share active in each following 30-day window.
+    """
+    params = [start]
+    store_filter = _store_clause("store_id", store_id, params)
+    params.append(periods)
+    return analytics_mirror.try_query(f"""
+        WITH firsts AS (
+            SELECT customer_id, date_trunc('month', MIN(sale_date)) AS cohort
+            FROM sales WHERE sale_date >= ?{store_filter}
+            GROUP BY customer_id
+        ), sizes AS (
+            SELECT cohort, COUNT(*) AS size FROM firsts GROUP BY cohort
+        ), windows AS (
+            SELECT DISTINCT f.cohort, f.customer_id,
+                   CAST(floor(date_diff('day', f.cohort, s.sale_date) / 30) AS INTEGER) AS period
+            FROM firsts f JOIN sales s ON s.customer_id = f.customer_id
+            WHERE s.sale_date >= f.cohort
+        )
+        SELECT strftime(z.cohort, '%Y-%m') AS cohort, z.size, w.period, COUNT(w.customer_id) AS active
+        FROM sizes z LEFT JOIN windows w ON w.cohort = z.cohort AND w.period < ?
+        GROUP BY z.cohort, z.size, w.period
+        ORDER BY z.cohort, w.period
+    """, params)
+
+
+def product_affinity(product_id: int, limit: int) -> Optional[Dict]:
+    rows = analytics_mirror.try_query("""
+        WITH baskets AS (SELECT DISTINCT sale_id FROM sale_items WHERE product_id = ?)
+        SELECT p.id, p.name, COUNT(si.id) AS frequency, (SELECT COUNT(*) FROM baskets) AS total_sales
+        FROM sale_items si
+        JOIN baskets b ON si.sale_id = b.sale_id
+        JOIN products p ON p.id = si.product_id
+        WHERE p.id <> ?
+        GROUP BY p.id, p.name
+        ORDER BY frequency DESC, p.id
+        LIMIT ?
+    """, [product_id, product_id, limit])
+    if rows is None:
+        return None
+    return {"rows": rows, "total_sales": rows[0]["total_sales"] if rows else 0}
@@ -0,0 +1,128 @@
+"""
+Ollama Service
+One pooled HTTP client per process for the local LLM, with cached model availability and token streaming
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+import logging
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailable(Exception):
+    """The LLM could not be reached or returned an error"""
+
+
+class OllamaClient:
+    """
+    Keeps a single httpx.AsyncClient for the app's lifetime, so chat requests
+    reuse warm keep-alive connections. Whether the model is installed is checked
+    against /api/tags at most once per OLLAMA_STATUS_TTL_SECONDS (and again after
+    a failed call) instead of before every message.
+    """
+
+    def __init__(self, base_url: str, model: str):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._status: Optional[Dict] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(settings.OLLAMA_TIMEOUT_SECONDS, connect=3.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def status(self) -> Dict:
+        """{"online": bool, "model_available": bool}, cached for OLLAMA_STATUS_TTL_SECONDS"""
+        if httpx is None:
+            return {"online": False, "model_available": False}
+        if self._status is not None and time.monotonic() - self._checked_at < settings.OLLAMA_STATUS_TTL_SECONDS:
+            return self._status
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Concurrent callers wait for one probe instead of each sending their own
+            if self._status is not None and time.monotonic() - self._checked_at < settings.OLLAMA_STATUS_TTL_SECONDS:
+                return self._status
+            status = {"online": False, "model_available": False}
+            try:
+                response = await self.client.get("/api/tags", timeout=3.0)
+                if response.status_code == 200:
+                    names = [m.get("name", "") for m in response.json().get("models", [])]
+                    status = {"online": True, "model_available": any(self.model in name for name in names)}
+            except (httpx.HTTPError, ValueError):
+                pass
+            self._status = status
+            self._checked_at = time.monotonic()
+            return status
+
+    async def available(self) -> bool:
+        return (await self.status())["model_available"]
+
+    def mark_unavailable(self):
+        """Skip the LLM until the next availability check"""
+        self._status = {"online": False, "model_available": False}
+        self._checked_at = time.monotonic()
+
+    def _payload(self, messages: List[Dict], stream: bool) -> Dict:
+        return {"model": self.model, "messages": messages, "stream": stream, "options": {"temperature": 0.7}}
+
+    async def chat(self, messages: List[Dict]) -> str:
+        """Full completion in one response"""
+        try:
+            response = await self.client.post("/api/chat", json=self._payload(messages, stream=False))
+            if response.status_code != 200:
+                self.mark_unavailable()
+                raise OllamaUnavailable(f"HTTP {response.status_code}: {response.text[:200]}")
+            return response.json().get("message", {}).get("content", "")
+        except (httpx.HTTPError, ValueError) as e:
+            self.mark_unavailable()
+            raise OllamaUnavailable(str(e)) from e
+
+    async def stream_chat(self, messages: List[Dict]) -> AsyncIterator[str]:
+        """Content chunks as Ollama produces them (its stream is one JSON object per line)"""
+        try:
+            async with self.client.stream("POST", "/api/chat", json=self._payload(messages, stream=True)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    self.mark_unavailable()
+                    raise OllamaUnavailable(f"HTTP {response.status_code}: {response.text[:200]}")
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        self.mark_unavailable()
+                        raise OllamaUnavailable(chunk["error"])
+                    content = chunk.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if chunk.get("done"):
+                        break
+        except (httpx.HTTPError, ValueError) as e:
+            self.mark_unavailable()
+            raise OllamaUnavailable(str(e)) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+ollama = OllamaClient(settings.OLLAMA_BASE_URL, settings.OLLAMA_MODEL)
@@ -0,0 +1,315 @@
+"""
+Queue Service
+Durable database-backed job queue: leased work items, visibility timeouts and dead-lettering.
+
+Jobs are rows in queue_jobs. A worker leases a job for QUEUE_VISIBILITY_TIMEOUT_SECONDS;
+if it dies the lease expires and another worker picks the job up. Failed jobs are
+retried with backoff and dead-lettered after max_attempts.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# kind -> (handler(db, job), on_settled(db, job) or None)
+HANDLERS: Dict[str, Tuple[Callable, Optional[Callable]]] = {}
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and was taken over by another worker"""
+
+
+def register_handler(kind: str, on_settled: Optional[Callable] = None):
+    """
+    Register the function that processes jobs of `kind` (called with a session
+    and the job). `on_settled` runs once a job is done or dead-lettered.
+    """
+    def decorator(func):
+        HANDLERS[kind] = (func, on_settled)
+        return func
+    return decorator
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+# ==================== PRODUCER ====================
+def enqueue(
+    db: Session,
+    kind: str,
+    payloads: List[Dict],
+    queue: str = "default",
+    group_key: Optional[str] = None,
+    max_attempts: Optional[int] = None,
+    available_at: Optional[datetime] = None
+) -> int:
+    """Insert one job per payload. Runs in the caller's transaction."""
+    if not payloads:
+        return 0
+    available_at = available_at or datetime.now()
+    db.execute(insert(models.QueueJob), [
+        {
+            "queue": queue,
+            "kind": kind,
+            "payload": payload,
+            "group_key": group_key,
+            "status": "pending",
+            "attempts": 0,
+            "max_attempts": max_attempts or settings.QUEUE_MAX_ATTEMPTS,
+            "available_at": available_at,
+        }
+        for payload in payloads
+    ])
+    return len(payloads)
+
+
+# ==================== LEASING ====================
+def _claimable(now: datetime):
+    return or_(
+        and_(models.QueueJob.status == "pending", models.QueueJob.available_at <= now),
+        and_(models.QueueJob.status == "leased", models.QueueJob.lease_expires_at < now)
+    )
+
+
+def claim(db: Session, worker_id: str, queues: Optional[List[str]] = None, limit: int = 1) -> List[models.QueueJob]:
+    """
+    Lease up to `limit` jobs. Each claim is a conditional UPDATE, so concurrent
+    workers never lease the same job; PostgreSQL also skips rows locked by them.
+    """
+    now = datetime.now()
+    candidates = db.query(models.QueueJob.id).filter(_claimable(now))
+    if queues:
+        candidates = candidates.filter(models.QueueJob.queue.in_(queues))
+    candidates = candidates.order_by(models.QueueJob.available_at, models.QueueJob.id)
+    if db.bind.dialect.name == "postgresql":
+        candidates = candidates.limit(limit).with_for_update(skip_locked=True)
+    else:
+        candidates = candidates.limit(limit * 4)
+    candidate_ids = [row.id for row in candidates]
+
+    claimed = []
+    for job_id in candidate_ids:
+        if len(claimed) >= limit:
+            break
+        updated = db.query(models.QueueJob).filter(
+            models.QueueJob.id == job_id,
+            _claimable(now)
+        ).update({
+            models.QueueJob.status: "leased",
+            models.QueueJob.leased_by: worker_id,
+            models.QueueJob.lease_expires_at: now + timedelta(seconds=settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS),
+            models.QueueJob.attempts: models.QueueJob.attempts + 1,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(job_id)
+    db.commit()
+
+    jobs = db.query(models.QueueJob).filter(models.QueueJob.id.in_(claimed)).all() if claimed else []
+    leased = []
+    for job in jobs:
+        if job.attempts > job.max_attempts:
+            # Lease expired on the final attempt - the worker most likely crashed on it
+            _dead_letter(db, job, job.last_error or "Lease expired on final attempt")
+        else:
+            # Remembered on the instance: leased_by is reloaded from the row after each commit
+            job.lease_owner = worker_id
+            leased.append(job)
+    return leased
+
+
+def extend_lease(db: Session, job: models.QueueJob) -> None:
+    """
+    Heartbeat for long jobs; raises LeaseLost when another worker has taken
+    over. Commit the work already done before calling it: process_job rolls
+    back whatever is pending when the lease is lost.
+    """
+    updated = db.query(models.QueueJob).filter(
+        models.QueueJob.id == job.id,
+        models.QueueJob.status == "leased",
+        models.QueueJob.leased_by == job.lease_owner
+    ).update({
+        models.QueueJob.lease_expires_at: datetime.now() + timedelta(seconds=settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS)
+    }, synchronize_session=False)
+    if not updated:
+        raise LeaseLost(f"Lease on job {job.id} lost")
+
+
+def complete(db: Session, job: models.QueueJob) -> None:
+    db.query(models.QueueJob).filter(
+        models.QueueJob.id == job.id,
+        models.QueueJob.leased_by == job.lease_owner
+    ).update({
+        models.QueueJob.status: "done",
+        models.QueueJob.completed_at: datetime.now(),
+        models.QueueJob.lease_expires_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    _settled(db, job)
+
+
+def fail(db: Session, job: models.QueueJob, error: str) -> None:
+    """Schedule a retry with exponential backoff, or dead-letter after max_attempts"""
+    if job.attempts >= job.max_attempts:
+        _dead_letter(db, job, error)
+        return
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+    db.query(models.QueueJob).filter(
+        models.QueueJob.id == job.id,
+        models.QueueJob.leased_by == job.lease_owner
+    ).update({
+        models.QueueJob.status: "pending",
+        models.QueueJob.available_at: datetime.now() + timedelta(seconds=delay),
+        models.QueueJob.leased_by: None,
+        models.QueueJob.lease_expires_at: None,
+        models.QueueJob.last_error: error[:2000],
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _dead_letter(db: Session, job: models.QueueJob, error: str) -> None:
+    job.status = "dead"
+    job.last_error = error[:2000]
+    job.lease_expires_at = None
+    job.completed_at = datetime.now()
+    db.commit()
+    logger.error(f"Queue job {job.id} ({job.kind}) dead-lettered after {job.attempts} attempts: {error}")
+    _settled(db, job)
+
+
+def _settled(db: Session, job: models.QueueJob) -> None:
+    _, on_settled = HANDLERS.get(job.kind, (None, None))
+    if on_settled is None:
+        return
+    try:
+        on_settled(db, job)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"on_settled hook for queue job {job.id} failed: {e}")
+
+
+def requeue(db: Session, job_id: int) -> bool:
+    """Send a dead-lettered job back to the queue with a fresh attempt budget"""
+    updated = db.query(models.QueueJob).filter(
+        models.QueueJob.id == job_id,
+        models.QueueJob.status == "dead"
+    ).update({
+        models.QueueJob.status: "pending",
+        models.QueueJob.attempts: 0,
+        models.QueueJob.available_at: datetime.now(),
+        models.QueueJob.leased_by: None,
+        models.QueueJob.completed_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+
+def group_progress(db: Session, group_key: str) -> Dict[str, int]:
+    """Job counts per status for one group"""
+    rows = db.query(
+        models.QueueJob.status,
+        func.count(models.QueueJob.id)
+    ).filter(models.QueueJob.group_key == group_key).group_by(models.QueueJob.status)
+    return {status: count for status, count in rows}
+
+
+def queue_stats(db: Session) -> Dict[str, Dict[str, int]]:
+    """Job counts per queue and status"""
+    stats: Dict[str, Dict[str, int]] = {}
+    rows = db.query(
+        models.QueueJob.queue,
+        models.QueueJob.status,
+        func.count(models.QueueJob.id)
+    ).group_by(models.QueueJob.queue, models.QueueJob.status)
+    for queue, status, count in rows:
+        stats.setdefault(queue, {})[status] = count
+    return stats
+
+
+# ==================== WORKER ====================
+def process_job(db: Session, job: models.QueueJob) -> bool:
+    """Run one leased job through its handler. Returns True on success."""
+    handler, _ = HANDLERS.get(job.kind, (None, None))
+    if handler is None:
+        _dead_letter(db, job, f"No handler registered for '{job.kind}'")
+        return False
+    try:
+        handler(db, job)
+        complete(db, job)
+        return True
+    except LeaseLost as e:
+        db.rollback()
+        logger.warning(str(e))
+        return False
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Queue job {job.id} ({job.kind}) failed on attempt {job.attempts}: {e}")
+        fail(db, job, str(e))
+        return False
+
+
+class QueueWorker:
+    """Polls for jobs and processes them one at a time, each claim with a fresh session"""
+
+    def __init__(self, queues: Optional[List[str]] = None, worker_id: Optional[str] = None, poll_seconds: Optional[float] = None):
+        self.queues = queues
+        self.worker_id = worker_id
+        self.poll_seconds = poll_seconds or settings.QUEUE_POLL_SECONDS
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        """Claim and process one job; returns how many were processed"""
+        db = SessionLocal()
+        try:
+            jobs = claim(db, self.worker_id or default_worker_id(), self.queues)
+            for job in jobs:
+                process_job(db, job)
+            return len(jobs)
+        finally:
+            db.close()
+
+    def run(self):
+        logger.info(f"Queue worker {self.worker_id or default_worker_id()} started")
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"Queue worker error: {e}")
+                processed = 0
+            if not processed:
+                self._stop.wait(self.poll_seconds)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="skope-queue-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self, timeout: Optional[float] = 5):
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
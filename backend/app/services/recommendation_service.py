@@ -0,0 +1,284 @@
+"""
+Recommendation Service
+Offline item-item similarity index and in-memory recommendation serving
+"""
+import heapq
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.db import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 20
+POPULAR_PRODUCTS_PER_STORE = 50
+INDEX_REFRESH_SECONDS = 300  # How often a worker checks for a newer index build
+QUERY_CHUNK_SIZE = 900  # Keeps IN (...) lists under SQLite's bound-parameter limit
+INSERT_CHUNK_SIZE = 5000
+
+
+def _chunks(values: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+# ==================== OFFLINE INDEX BUILD ====================
+def build_similarity_index(db: Session, top_k: int = DEFAULT_TOP_K) -> Dict:
+    """
+    Build the item-item cosine similarity index from the customer x product
+    purchase matrix and persist the top-K neighbours of every product.
+    """
+    started = time.perf_counter()
+    built_at = datetime.now()
+
+    pairs = db.query(models.Sale.customer_id, models.SaleItem.product_id).join(
+        models.SaleItem, models.SaleItem.sale_id == models.Sale.id
+    ).filter(
+        models.Sale.customer_id.isnot(None)
+    ).distinct().all()
+
+    db.query(models.ProductSimilarity).delete(synchronize_session=False)
+
+    rows = []
+    product_count = 0
+    customer_count = 0
+    if pairs:
+        purchases = np.array(pairs, dtype=np.int64)
+        customer_ids, customer_idx = np.unique(purchases[:, 0], return_inverse=True)
+        product_ids, product_idx = np.unique(purchases[:, 1], return_inverse=True)
+        customer_count, product_count = len(customer_ids), len(product_ids)
+
+        # Binary purchase matrix: one row per customer, one column per product
+        matrix = sparse.csr_matrix(
+            (np.ones(len(purchases), dtype=np.float32), (customer_idx, product_idx)),
+            shape=(customer_count, product_count)
+        )
+
+        # Co-purchase counts; the diagonal holds each product's buyer count
+        co_purchases = (matrix.T @ matrix).tocsr()
+        inv_norms = sparse.diags(1.0 / np.sqrt(co_purchases.diagonal()))
+        co_purchases = co_purchases - sparse.diags(co_purchases.diagonal())
+        co_purchases.eliminate_zeros()
+        similarity = (inv_norms @ co_purchases @ inv_norms).tocsr()
+
+        for i in range(product_count):
+            start, end = similarity.indptr[i], similarity.indptr[i + 1]
+            if start == end:
+                continue
+            scores = similarity.data[start:end]
+            neighbours = similarity.indices[start:end]
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k)[:top_k]
+                scores, neighbours = scores[keep], neighbours[keep]
+            order = np.argsort(-scores, kind="stable")
+            product_id = int(product_ids[i])
+            for rank, k in enumerate(order, start=1):
+                rows.append({
+                    "product_id": product_id,
+                    "similar_product_id": int(product_ids[neighbours[k]]),
+                    "score": round(float(scores[k]), 6),
+                    "rank": rank,
+                    "built_at": built_at
+                })
+
+    for chunk in _chunks(rows, INSERT_CHUNK_SIZE):
+        db.bulk_insert_mappings(models.ProductSimilarity, chunk)
+    db.commit()
+
+    item_index.invalidate()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Recommendation index built: {product_count} products, {customer_count} customers, "
+        f"{len(rows)} neighbour rows in {elapsed:.2f}s"
+    )
+    return {
+        "success": True,
+        "built_at": built_at.isoformat(),
+        "products_indexed": product_count,
+        "customers_used": customer_count,
+        "neighbour_rows": len(rows),
+        "top_k": top_k,
+        "build_seconds": round(elapsed, 3)
+    }
+
+
+# ==================== IN-MEMORY INDEX ====================
+class ItemSimilarityIndex:
+    """
+    Process-local copy of the persisted neighbour lists.
+    Reloaded lazily when a newer build is found in the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.built_at: Optional[datetime] = None
+        self.neighbours: Dict[int, List[Tuple[int, float]]] = {}
+        self.products: Dict[int, Tuple[str, Optional[int]]] = {}  # id -> (name, store_id)
+        self.popular: Dict[Optional[int], List[int]] = {}  # store_id -> product ids
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def ensure_loaded(self, db: Session) -> "ItemSimilarityIndex":
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < INDEX_REFRESH_SECONDS:
+            return self
+
+        with self._lock:
+            if self._checked_at and now - self._checked_at < INDEX_REFRESH_SECONDS:
+                return self
+            latest = db.query(func.max(models.ProductSimilarity.built_at)).scalar()
+            if not self._checked_at or latest != self.built_at:
+                self._load(db, latest)
+            self._checked_at = time.monotonic()
+        return self
+
+    def _load(self, db: Session, built_at: Optional[datetime]):
+        neighbours = defaultdict(list)
+        rows = db.query(
+            models.ProductSimilarity.product_id,
+            models.ProductSimilarity.similar_product_id,
+            models.ProductSimilarity.score
+        ).order_by(
+            models.ProductSimilarity.product_id,
+            models.ProductSimilarity.rank
+        ).yield_per(10000)
+        for product_id, similar_id, score in rows:
+            neighbours[product_id].append((similar_id, score))
+
+        products = {
+            p.id: (p.name, p.store_id)
+            for p in db.query(
+                models.Product.id, models.Product.name, models.Product.store_id
+            ).filter(models.Product.is_active == True)
+        }
+
+        popularity = db.query(
+            models.SaleItem.product_id,
+            func.count(models.SaleItem.id).label("sales_count")
+        ).group_by(models.SaleItem.product_id).order_by(
+            func.count(models.SaleItem.id).desc()
+        ).all()
+        popular = defaultdict(list)
+        for row in popularity:
+            if row.product_id not in products:
+                continue
+            store_id = products[row.product_id][1]
+            if len(popular[store_id]) < POPULAR_PRODUCTS_PER_STORE:
+                popular[store_id].append(row.product_id)
+            if len(popular[None]) < POPULAR_PRODUCTS_PER_STORE:
+                popular[None].append(row.product_id)
+
+        self.neighbours = dict(neighbours)
+        self.products = products
+        self.popular = dict(popular)
+        self.built_at = built_at
+        logger.info(f"Recommendation index loaded: {len(self.neighbours)} products with neighbours")
+
+    def recommend(self, purchased: set, store_id: Optional[int] = None, limit: int = 5) -> List[Dict]:
+        """Merge the neighbour lists of the purchased products and rank the candidates"""
+        scores = defaultdict(float)
+        best_source: Dict[int, Tuple[int, float]] = {}
+
+        for product_id in purchased:
+            for similar_id, score in self.neighbours.get(product_id, ()):
+                if similar_id in purchased:
+                    continue
+                product = self.products.get(similar_id)
+                if product is None or (store_id is not None and product[1] != store_id):
+                    continue
+                scores[similar_id] += score
+                if score > best_source.get(similar_id, (None, 0.0))[1]:
+                    best_source[similar_id] = (product_id, score)
+
+        recommendations = []
+        for similar_id, score in heapq.nlargest(limit, scores.items(), key=lambda x: x[1]):
+            source_name = self.products.get(best_source[similar_id][0], ("a product you bought",))[0]
+            recommendations.append({
+                "product_id": similar_id,
+                "product_name": self.products[similar_id][0],
+                "confidence_score": round(min(0.99, score / len(purchased)), 2),
+                "reason": f"Customers who bought {source_name} also bought this"
+            })
+
+        if len(recommendations) < limit:
+            chosen = {r["product_id"] for r in recommendations}
+            for product_id in self.popular.get(store_id, []):
+                if len(recommendations) >= limit:
+                    break
+                if product_id in purchased or product_id in chosen:
+                    continue
+                recommendations.append({
+                    "product_id": product_id,
+                    "product_name": self.products[product_id][0],
+                    "confidence_score": 0.7,
+                    "reason": "Popular product - trending now"
+                })
+
+        return recommendations
+
+
+item_index = ItemSimilarityIndex()
+
+
+# ==================== SERVING ====================
+def recommend_for_customers(
+    db: Session,
+    customer_ids: List[int],
+    limit: int = 5,
+    store_id: Optional[int] = None
+) -> Dict[int, List[Dict]]:
+    """
+    Recommendations for many customers at once.
+    Customers outside `store_id` (when given) or unknown ids are left out of the result.
+    """
+    index = item_index.ensure_loaded(db)
+    unique_ids = list(dict.fromkeys(customer_ids))
+
+    customer_stores: Dict[int, Optional[int]] = {}
+    purchases: Dict[int, set] = defaultdict(set)
+    for chunk in _chunks(unique_ids, QUERY_CHUNK_SIZE):
+        customer_query = db.query(models.Customer.id, models.Customer.store_id).filter(
+            models.Customer.id.in_(chunk)
+        )
+        if store_id is not None:
+            customer_query = customer_query.filter(models.Customer.store_id == store_id)
+        customer_stores.update({c.id: c.store_id for c in customer_query})
+
+        purchase_rows = db.query(models.Sale.customer_id, models.SaleItem.product_id).join(
+            models.SaleItem, models.SaleItem.sale_id == models.Sale.id
+        ).filter(
+            models.Sale.customer_id.in_(chunk)
+        ).distinct()
+        for customer_id, product_id in purchase_rows:
+            purchases[customer_id].add(product_id)
+
+    return {
+        customer_id: index.recommend(purchases.get(customer_id, set()), customer_stores[customer_id], limit)
+        for customer_id in unique_ids
+        if customer_id in customer_stores
+    }
+
+
+def get_index_status(db: Session) -> Dict:
+    """Summary of the persisted index"""
+    built_at, rows, products = db.query(
+        func.max(models.ProductSimilarity.built_at),
+        func.count(models.ProductSimilarity.id),
+        func.count(func.distinct(models.ProductSimilarity.product_id))
+    ).one()
+    return {
+        "built_at": built_at.isoformat() if built_at else None,
+        "neighbour_rows": rows,
+        "products_indexed": products
+    }
@@ -0,0 +1,348 @@
+"""
+Retrieval Service
+Local BM25 index over products, customers, campaigns and monthly sales reports for the AI assistant
+
+Entities are rendered into short text documents in search_documents: right after
+API writes (index_entities) and by a periodic sweep for everything else
+(sync_search_documents). Each process keeps an in-memory inverted index that
+pulls changed documents by updated_at, so a chat prompt gets the top-k matching
+records in milliseconds without scanning any table. No network or extra
+dependency is needed, and the table works the same on SQLite and PostgreSQL.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.upsert import upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+SYNC_MARK = "search_documents"
+UPSERT_CHUNK_SIZE = 500
+ID_CHUNK_SIZE = 900
+REPORT_MONTHS = 13
+PULL_OVERLAP = timedelta(seconds=30)  # Re-read recent documents in case a slower writer committed late
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STORE_RE = re.compile(r"\bstore\s*(?:no\.?|number|#)?\s*(\d+)\b", re.IGNORECASE)
+# Question words and filler that would otherwise match almost every document
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "do", "does", "for", "from", "has", "have", "how", "i",
+    "in", "is", "it", "left", "many", "me", "much", "my", "of", "on", "or", "our", "show", "tell",
+    "the", "there", "to", "we", "what", "which", "who", "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms without stopwords; a plural 's' is dropped (tvs -> tv)"""
+    terms = []
+    for term in TOKEN_RE.findall((text or "").lower()):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 2 and term.endswith("s") and not term.endswith(("ss", "us", "is")):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def mentioned_store(text: str) -> Optional[int]:
+    """Store id named in a question ("... in store 3"), if any"""
+    match = STORE_RE.search(text or "")
+    return int(match.group(1)) if match else None
+
+
+# ==================== DOCUMENTS ====================
+def _money(value) -> str:
+    return f"₹{float(value or 0):,.2f}"
+
+
+def _store_names(db: Session) -> Dict[int, str]:
+    return dict(db.query(models.Store.id, models.Store.name).all())
+
+
+def _product_docs(db: Session, ids: Sequence[int], stores: Dict[int, str]) -> List[Dict]:
+    docs = []
+    for p in db.query(models.Product).filter(models.Product.id.in_(ids)):
+        store = stores.get(p.store_id, "")
+        docs.append({
+            "key": f"product:{p.id}", "entity_type": "product", "entity_id": p.id, "store_id": p.store_id,
+            "title": f"Product {p.name}",
+            "content": (
+                f"{p.name} by {p.brand or 'unknown brand'}, category {p.category or 'uncategorized'}, SKU {p.sku}, "
+                f"at {store} (store {p.store_id}). {p.current_stock or 0} units in stock, minimum {p.minimum_stock or 0}. "
+                f"Price {_money(p.unit_price)}, warranty {p.warranty_months or 0} months"
+                f"{'' if p.is_active is not False else ', discontinued'}. {(p.description or '')[:200]}"
+            ).strip(),
+        })
+    return docs
+
+
+def _customer_docs(db: Session, ids: Sequence[int], stores: Dict[int, str]) -> List[Dict]:
+    docs = []
+    for c in db.query(models.Customer).filter(models.Customer.id.in_(ids)):
+        last = c.last_purchase_date.strftime("%d %b %Y") if c.last_purchase_date else "never"
+        docs.append({
+            "key": f"customer:{c.id}", "entity_type": "customer", "entity_id": c.id, "store_id": c.store_id,
+            "title": f"Customer {c.name}",
+            "content": (
+                f"{c.name}, phone {c.phone}, email {c.email or 'none'}, customer of {stores.get(c.store_id, '')} "
+                f"(store {c.store_id}). Total purchases {_money(c.total_purchases)}, "
+                f"{c.loyalty_points or 0} loyalty points, last purchase {last}"
+            ),
+        })
+    return docs
+
+
+def _enum_value(value) -> str:
+    return getattr(value, "value", value) or ""
+
+
+def _campaign_docs(db: Session, ids: Sequence[int], stores: Dict[int, str]) -> List[Dict]:
+    docs = []
+    for c in db.query(models.Campaign).filter(models.Campaign.id.in_(ids)):
+        docs.append({
+            "key": f"campaign:{c.id}", "entity_type": "campaign", "entity_id": c.id, "store_id": c.store_id,
+            "title": f"Campaign {c.name}",
+            "content": (
+                f"{c.name}: {_enum_value(c.campaign_type)} campaign, status {_enum_value(c.status)}, "
+                f"trigger {_enum_value(c.trigger_type)}, at {stores.get(c.store_id, '')} (store {c.store_id}). "
+                f"Sent {c.total_sent or 0}, failed {c.total_failed or 0}, opened {c.total_opened or 0}, "
+                f"clicked {c.total_clicked or 0}, converted {c.total_converted or 0}, revenue {_money(c.revenue)}"
+                f"{f', discount code {c.discount_code}' if c.discount_code else ''}. {(c.description or '')[:200]}"
+            ).strip(),
+        })
+    return docs
+
+
+def _report_docs(db: Session, stores: Dict[int, str], months: int = REPORT_MONTHS) -> List[Dict]:
+    """One monthly sales summary per store, from the hourly rollup grouped by day"""
+    first = (date.today().replace(day=1) - timedelta(days=31 * (months - 1))).replace(day=1)
+    rows = db.query(
+        models.SalesHourlyRollup.store_id,
+        models.SalesHourlyRollup.date,
+        func.sum(models.SalesHourlyRollup.revenue),
+        func.sum(models.SalesHourlyRollup.transactions)
+    ).filter(models.SalesHourlyRollup.date >= first).group_by(
+        models.SalesHourlyRollup.store_id, models.SalesHourlyRollup.date
+    ).all()
+    totals = defaultdict(lambda: [0.0, 0])
+    for store_id, day, revenue, transactions in rows:
+        month = (store_id, day.year, day.month)
+        totals[month][0] += float(revenue or 0)
+        totals[month][1] += int(transactions or 0)
+    docs = []
+    for (store_id, year, month), (revenue, transactions) in totals.items():
+        label = date(year, month, 1).strftime("%B %Y")
+        docs.append({
+            "key": f"report:{store_id}:{year}-{month:02d}", "entity_type": "report", "entity_id": None,
+            "store_id": store_id,
+            "title": f"Sales report {label} for {stores.get(store_id, f'store {store_id}')}",
+            "content": (
+                f"Monthly sales report {label} ({year}-{month:02d}) for {stores.get(store_id, '')} (store {store_id}): "
+                f"revenue {_money(revenue)}, {transactions} transactions, "
+                f"average bill {_money(revenue / transactions if transactions else 0)}"
+            ),
+        })
+    return docs
+
+
+BUILDERS = {
+    "product": (models.Product, _product_docs),
+    "customer": (models.Customer, _customer_docs),
+    "campaign": (models.Campaign, _campaign_docs),
+}
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _write_documents(db: Session, docs: List[Dict], deleted_keys: Iterable[str] = ()):
+    now = datetime.now()
+    rows = [{**doc, "deleted": False, "updated_at": now} for doc in docs]
+    for chunk in _chunks(rows, UPSERT_CHUNK_SIZE):
+        upsert(
+            db, models.SearchDocument, list(chunk), conflict_columns=["key"],
+            update_columns=["entity_type", "entity_id", "store_id", "title", "content", "deleted", "updated_at"]
+        )
+    deleted_keys = list(deleted_keys)
+    for chunk in _chunks(deleted_keys, ID_CHUNK_SIZE):
+        db.query(models.SearchDocument).filter(models.SearchDocument.key.in_(chunk)).update(
+            {models.SearchDocument.deleted: True, models.SearchDocument.updated_at: now},
+            synchronize_session=False
+        )
+
+
+def index_entities(db: Session, entity_type: str, ids: Iterable[int]):
+    """Re-render documents for just-written entities (ids that no longer exist are tombstoned); commits"""
+    ids = sorted({i for i in ids if i is not None})
+    if not ids:
+        return
+    model, build = BUILDERS[entity_type]
+    stores = _store_names(db)
+    docs = []
+    for chunk in _chunks(ids, ID_CHUNK_SIZE):
+        docs.extend(build(db, chunk, stores))
+    found = {doc["entity_id"] for doc in docs}
+    _write_documents(db, docs, [f"{entity_type}:{i}" for i in ids if i not in found])
+    db.commit()
+    search_index.invalidate()
+
+
+def sync_search_documents(db: Session) -> Dict[str, int]:
+    """
+    Sweep for entities changed since the last sweep (covers seed scripts, imports
+    and other writers outside the API) and rebuild the monthly report documents.
+    Run periodically by the scheduler (SEARCH_INDEX_SYNC_SECONDS).
+    """
+    started = datetime.utcnow()  # Compared with created_at / updated_at, which func.now() writes in UTC
+    since = db.query(models.Watermark.position_at).filter(models.Watermark.name == SYNC_MARK).scalar()
+    stores = _store_names(db)
+    counts = {}
+    for entity_type, (model, build) in BUILDERS.items():
+        query = db.query(model.id)
+        if since is not None:
+            query = query.filter(func.coalesce(model.updated_at, model.created_at) > since - PULL_OVERLAP)
+        ids = [row.id for row in query]
+        for chunk in _chunks(ids, ID_CHUNK_SIZE):
+            _write_documents(db, build(db, chunk, stores))
+        counts[entity_type] = len(ids)
+        # Entities deleted outside the API
+        db.query(models.SearchDocument).filter(
+            models.SearchDocument.entity_type == entity_type,
+            models.SearchDocument.deleted == False,
+            ~models.SearchDocument.entity_id.in_(select(model.id))
+        ).update({
+            models.SearchDocument.deleted: True, models.SearchDocument.updated_at: datetime.now()
+        }, synchronize_session=False)
+    reports = _report_docs(db, stores)
+    _write_documents(db, reports)
+    counts["report"] = len(reports)
+    upsert(
+        db, models.Watermark, [{"name": SYNC_MARK, "position": None, "position_at": started}],
+        conflict_columns=["name"], update_columns=["position_at"]
+    )
+    db.commit()
+    search_index.invalidate()
+    return counts
+
+
+# ==================== IN-MEMORY INDEX ====================
+class SearchIndex:
+    """
+    Inverted index (term -> {document key: term frequency}) with BM25 scoring.
+    Documents changed since the last pull are applied one by one, replacing
+    their old postings, at most every SEARCH_INDEX_CHECK_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._pulled_until: Optional[datetime] = None
+        self.docs: Dict[str, Dict] = {}
+        self.terms: Dict[str, Counter] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def _remove(self, key: str):
+        terms = self.terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= sum(terms.values())
+        del self.docs[key]
+
+    def _add(self, doc: models.SearchDocument):
+        terms = Counter(tokenize(f"{doc.title} {doc.content}"))
+        self.docs[doc.key] = {
+            "key": doc.key, "entity_type": doc.entity_type, "entity_id": doc.entity_id,
+            "store_id": doc.store_id, "title": doc.title, "content": doc.content, "length": sum(terms.values()),
+        }
+        self.terms[doc.key] = terms
+        for term, count in terms.items():
+            self.postings[term][doc.key] = count
+        self.total_length += sum(terms.values())
+
+    def ensure_loaded(self, db: Session) -> "SearchIndex":
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < settings.SEARCH_INDEX_CHECK_SECONDS:
+            return self
+        with self._lock:
+            if self._checked_at and now - self._checked_at < settings.SEARCH_INDEX_CHECK_SECONDS:
+                return self
+            query = db.query(models.SearchDocument)
+            if self._pulled_until is not None:
+                query = query.filter(models.SearchDocument.updated_at >= self._pulled_until - PULL_OVERLAP)
+            latest = self._pulled_until
+            for doc in query.order_by(models.SearchDocument.updated_at).yield_per(1000):
+                self._remove(doc.key)
+                if not doc.deleted:
+                    self._add(doc)
+                if latest is None or doc.updated_at > latest:
+                    latest = doc.updated_at
+            self._pulled_until = latest
+            self._checked_at = time.monotonic()
+        return self
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        store_id: Optional[int] = None,
+        k: int = 5,
+        entity_types: Optional[Sequence[str]] = None
+    ) -> List[Dict]:
+        """Top-k documents for `query` (optionally one store's / some entity types'), best first"""
+        self.ensure_loaded(db)
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.docs)
+            if not terms or not n:
+                return []
+            average_length = self.total_length / n
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, tf in postings.items():
+                    length = self.docs[key]["length"]
+                    scores[key] += idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    )
+            candidates = (
+                (score, key) for key, score in scores.items()
+                if (store_id is None or self.docs[key]["store_id"] == store_id)
+                and (not entity_types or self.docs[key]["entity_type"] in entity_types)
+            )
+            top = heapq.nlargest(k, candidates)
+            return [
+                {**{f: self.docs[key][f] for f in ("key", "entity_type", "entity_id", "store_id", "title", "content")},
+                 "score": round(score, 4)}
+                for score, key in top
+            ]
+
+
+search_index = SearchIndex()
@@ -0,0 +1,188 @@
+"""
+Sales Rollup Service
+Hourly per-store sales rollup maintained at checkout, and the heatmap built from it
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import func, extract
+from sqlalchemy.orm import Session
+from app.db import models
+from app.db.upsert import upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+PERCENTILES = [25, 50, 75, 90]
+
+
+# ==================== MAINTENANCE ====================
+def record_sale(db: Session, sale: models.Sale) -> None:
+    """
+    Add a sale to its (store, date, hour) bucket. Runs in the caller's
+    transaction so the rollup commits or rolls back with the sale.
+    """
+    sale_date = sale.sale_date
+    upsert(
+        db,
+        models.SalesHourlyRollup,
+        [{
+            "store_id": sale.store_id,
+            "date": sale_date.date(),
+            "hour": sale_date.hour,
+            "day_of_week": sale_date.weekday(),
+            "transactions": 1,
+            "revenue": float(sale.total_amount or 0),
+            "discount": float(sale.discount or 0),
+        }],
+        conflict_columns=["store_id", "date", "hour"],
+        increment_columns=["transactions", "revenue", "discount"]
+    )
+
+
+def rebuild_hourly_rollup(db: Session, store_id: Optional[int] = None, since: Optional[date] = None) -> int:
+    """Recompute rollup rows from raw sales (backfill / repair). Returns the number of buckets written."""
+    delete_query = db.query(models.SalesHourlyRollup)
+    sales_query = db.query(
+        models.Sale.store_id,
+        func.date(models.Sale.sale_date).label("day"),
+        extract("hour", models.Sale.sale_date).label("hour"),
+        func.count(models.Sale.id).label("transactions"),
+        func.sum(models.Sale.total_amount).label("revenue"),
+        func.sum(models.Sale.discount).label("discount")
+    )
+    if store_id is not None:
+        delete_query = delete_query.filter(models.SalesHourlyRollup.store_id == store_id)
+        sales_query = sales_query.filter(models.Sale.store_id == store_id)
+    if since is not None:
+        delete_query = delete_query.filter(models.SalesHourlyRollup.date >= since)
+        sales_query = sales_query.filter(models.Sale.sale_date >= datetime.combine(since, datetime.min.time()))
+
+    delete_query.delete(synchronize_session=False)
+
+    rows = []
+    for row in sales_query.group_by(
+        models.Sale.store_id,
+        func.date(models.Sale.sale_date),
+        extract("hour", models.Sale.sale_date)
+    ):
+        day = row.day if isinstance(row.day, date) else datetime.strptime(str(row.day)[:10], "%Y-%m-%d").date()
+        rows.append({
+            "store_id": row.store_id,
+            "date": day,
+            "hour": int(row.hour),
+            "day_of_week": day.weekday(),
+            "transactions": int(row.transactions),
+            "revenue": float(row.revenue or 0),
+            "discount": float(row.discount or 0),
+        })
+
+    for i in range(0, len(rows), 5000):
+        db.bulk_insert_mappings(models.SalesHourlyRollup, rows[i:i + 5000])
+    db.commit()
+
+    logger.info(f"Hourly sales rollup rebuilt: {len(rows)} buckets")
+    return len(rows)
+
+
+def hourly_rollup_stale(db: Session) -> bool:
+    """
+    True when the rollup is missing sales: empty while sales exist, behind the
+    newest sale, or counting a different number of transactions (sales written
+    by seed scripts or imports bypass checkout).
+    """
+    sales, newest = db.query(func.count(models.Sale.id), func.max(models.Sale.sale_date)).one()
+    if not sales:
+        return False
+    transactions, latest = db.query(
+        func.coalesce(func.sum(models.SalesHourlyRollup.transactions), 0),
+        func.max(models.SalesHourlyRollup.date)
+    ).one()
+    if latest is None or int(transactions) != sales:
+        return True
+    if isinstance(latest, str):
+        latest = datetime.strptime(latest[:10], "%Y-%m-%d").date()
+    return newest is not None and latest < newest.date()
+
+
+def ensure_hourly_rollup(db: Session) -> Optional[int]:
+    """Rebuild the rollup if it is stale. Returns the buckets written, or None when it was current."""
+    if not hourly_rollup_stale(db):
+        return None
+    return rebuild_hourly_rollup(db)
+
+
+# ==================== READS ====================
+def hourly_matrix(db: Session, store_id: Optional[int], start: date, end: date):
+    """
+    Dense (days x 24) transaction and revenue matrices over [start, end),
+    summed across stores when store_id is None. Cost depends on the window, not sales volume.
+    """
+    n_days = (end - start).days
+    transactions = np.zeros((n_days, 24))
+    revenue = np.zeros((n_days, 24))
+
+    query = db.query(
+        models.SalesHourlyRollup.date,
+        models.SalesHourlyRollup.hour,
+        func.sum(models.SalesHourlyRollup.transactions).label("transactions"),
+        func.sum(models.SalesHourlyRollup.revenue).label("revenue")
+    ).filter(
+        models.SalesHourlyRollup.date >= start,
+        models.SalesHourlyRollup.date < end
+    )
+    if store_id is not None:
+        query = query.filter(models.SalesHourlyRollup.store_id == store_id)
+
+    for row in query.group_by(models.SalesHourlyRollup.date, models.SalesHourlyRollup.hour):
+        offset = (row.date - start).days
+        transactions[offset, row.hour] = row.transactions or 0
+        revenue[offset, row.hour] = row.revenue or 0
+    return transactions, revenue
+
+
+def build_sales_heatmap(db: Session, store_id: Optional[int], start: date, end: date) -> Dict:
+    """7 x 24 day-of-week by hour heatmap with per-cell percentile bands"""
+    transactions, revenue = hourly_matrix(db, store_id, start, end)
+    weekdays = (start.weekday() + np.arange((end - start).days)) % 7
+
+    cells = []
+    for day in range(7):
+        mask = weekdays == day
+        occurrences = int(mask.sum())
+        if not occurrences:
+            continue
+        day_tx = transactions[mask]
+        day_rev = revenue[mask]
+        rev_bands = np.percentile(day_rev, PERCENTILES, axis=0)
+        tx_bands = np.percentile(day_tx, PERCENTILES, axis=0)
+        for hour in range(24):
+            cells.append({
+                "day_of_week": WEEKDAY_NAMES[day],
+                "hour": hour,
+                "days_observed": occurrences,
+                "total_transactions": int(day_tx[:, hour].sum()),
+                "total_revenue": round(float(day_rev[:, hour].sum()), 2),
+                "avg_transactions": round(float(day_tx[:, hour].mean()), 2),
+                "avg_revenue": round(float(day_rev[:, hour].mean()), 2),
+                "revenue_percentiles": {
+                    f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, rev_bands[:, hour])
+                },
+                "transaction_percentiles": {
+                    f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, tx_bands[:, hour])
+                },
+            })
+
+    # Busiest slots by average transactions, for staff scheduling
+    busiest = sorted(cells, key=lambda c: c["avg_transactions"], reverse=True)[:10]
+    return {
+        "start_date": start.isoformat(),
+        "end_date": (end - timedelta(days=1)).isoformat(),
+        "heatmap": cells,
+        "busiest_slots": [
+            {"day_of_week": c["day_of_week"], "hour": f"{c['hour']:02d}:00", "avg_transactions": c["avg_transactions"]}
+            for c in busiest if c["avg_transactions"] > 0
+        ],
+    }
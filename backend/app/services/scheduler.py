@@ -0,0 +1,157 @@
+"""
+Background Scheduler
+Minimal in-process periodic job runner started with the API.
+
+Every API process may start a scheduler; they elect a leader through a lease
+row in scheduler_leases and only the leader runs jobs. If it dies, another
+process takes over once the lease expires (SCHEDULER_LEASE_SECONDS).
+"""
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.database import SessionLocal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def acquire_lease(db: Session, name: str, owner: str, ttl_seconds: int) -> bool:
+    """Take or renew the named lease; True while `owner` holds it"""
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    renewed = db.query(models.SchedulerLease).filter(
+        models.SchedulerLease.name == name,
+        or_(models.SchedulerLease.owner == owner, models.SchedulerLease.expires_at < now)
+    ).update({
+        models.SchedulerLease.owner: owner,
+        models.SchedulerLease.expires_at: expires_at,
+    }, synchronize_session=False)
+    if renewed:
+        db.commit()
+        return True
+    if db.query(models.SchedulerLease.name).filter(models.SchedulerLease.name == name).first():
+        db.rollback()
+        return False
+    try:
+        db.add(models.SchedulerLease(name=name, owner=owner, expires_at=expires_at, acquired_at=now))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()  # Another process created it first
+        return False
+
+
+def release_lease(db: Session, name: str, owner: str) -> None:
+    db.query(models.SchedulerLease).filter(
+        models.SchedulerLease.name == name,
+        models.SchedulerLease.owner == owner
+    ).update({models.SchedulerLease.expires_at: datetime.now()}, synchronize_session=False)
+    db.commit()
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable  # Called with a fresh Session
+    interval_seconds: int
+    next_run: float = 0.0
+    last_error: str = None
+
+
+class Scheduler:
+    """Runs registered jobs on a daemon thread, each with its own database session"""
+
+    def __init__(self, poll_seconds: int = 30, lease_name: str = "scheduler"):
+        self.poll_seconds = poll_seconds
+        self.lease_name = lease_name
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.jobs: List[ScheduledJob] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name: str, func: Callable, interval_seconds: int, run_at_start: bool = True):
+        next_run = time.monotonic() if run_at_start else time.monotonic() + interval_seconds
+        self.jobs = [job for job in self.jobs if job.name != name]
+        self.jobs.append(ScheduledJob(name, func, interval_seconds, next_run))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="skope-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        if self.is_leader:
+            # Hand over straight away instead of waiting for the lease to expire
+            db = SessionLocal()
+            try:
+                release_lease(db, self.lease_name, self.owner)
+            except Exception as e:
+                logger.warning(f"Could not release scheduler lease: {e}")
+            finally:
+                db.close()
+            self.is_leader = False
+
+    def _renew_leadership(self) -> bool:
+        db = SessionLocal()
+        try:
+            leader = acquire_lease(db, self.lease_name, self.owner, settings.SCHEDULER_LEASE_SECONDS)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Scheduler lease check failed: {e}")
+            leader = False
+        finally:
+            db.close()
+        if leader != self.is_leader:
+            logger.info(f"Scheduler {self.owner} {'is now' if leader else 'is no longer'} the leader")
+        self.is_leader = leader
+        return leader
+
+    def run_job(self, job: ScheduledJob):
+        db = SessionLocal()
+        try:
+            job.func(db)
+            job.last_error = None
+        except Exception as e:
+            db.rollback()
+            job.last_error = str(e)
+            logger.error(f"Scheduled job '{job.name}' failed: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            leader = self._renew_leadership()
+            for job in self.jobs:
+                if self._stop.is_set() or not leader:
+                    break
+                if time.monotonic() >= job.next_run:
+                    self.run_job(job)
+                    job.next_run = time.monotonic() + job.interval_seconds
+                    # Renewed after each job so a long one cannot outlive the lease unnoticed
+                    leader = self._renew_leadership()
+            self._stop.wait(self.poll_seconds)
+
+
+scheduler = Scheduler()
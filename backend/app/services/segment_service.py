@@ -0,0 +1,190 @@
+"""
+Segment Service
+Compiles Campaign.target_customers criteria into one SQL query over customers
+
+Criteria are a flat JSON object; every key is optional and all given keys must match:
+
+    {
+        "min_spend": 5000, "max_spend": 50000,   # lifetime spend (customers.total_purchases)
+        "spend_days": 90,                        # ...or spend from sales in the last N days instead
+        "purchased_within_days": 30,             # bought something in the last N days
+        "not_purchased_within_days": 90,         # nothing bought in the last N days
+        "categories": ["tv", "audio"],           # bought a product in any of these categories
+        "category_days": 180,                    # ...within the last N days
+        "birthday_within_days": 7,               # birthday today or in the next N days
+        "warranty_expiring_within_days": 30,     # a purchased item's warranty ends in the next N days
+        "min_loyalty_points": 100, "max_loyalty_points": 1000
+    }
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import and_, exists, extract, func, or_, select
+from sqlalchemy.orm import Query, Session
+from app.db import models
+
+DAY_KEYS = {
+    "spend_days", "purchased_within_days", "not_purchased_within_days",
+    "category_days", "birthday_within_days", "warranty_expiring_within_days",
+}
+AMOUNT_KEYS = {"min_spend", "max_spend"}
+POINTS_KEYS = {"min_loyalty_points", "max_loyalty_points"}
+CRITERIA_KEYS = DAY_KEYS | AMOUNT_KEYS | POINTS_KEYS | {"categories"}
+
+
+class SegmentError(ValueError):
+    """Criteria that cannot be compiled"""
+
+
+def validate_criteria(criteria: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Check criteria and return them without null entries; raises SegmentError"""
+    if not criteria:
+        return {}
+    if not isinstance(criteria, dict):
+        raise SegmentError("Targeting criteria must be an object")
+    criteria = {key: value for key, value in criteria.items() if value is not None}
+
+    unknown = sorted(set(criteria) - CRITERIA_KEYS)
+    if unknown:
+        raise SegmentError(
+            f"Unknown targeting criteria: {', '.join(unknown)}. Available: {', '.join(sorted(CRITERIA_KEYS))}"
+        )
+    for key in DAY_KEYS | POINTS_KEYS:
+        if key in criteria and (not isinstance(criteria[key], int) or isinstance(criteria[key], bool) or criteria[key] < 0):
+            raise SegmentError(f"'{key}' must be a non-negative integer")
+    for key in AMOUNT_KEYS:
+        if key in criteria and (not isinstance(criteria[key], (int, float)) or isinstance(criteria[key], bool) or criteria[key] < 0):
+            raise SegmentError(f"'{key}' must be a non-negative number")
+    if "categories" in criteria:
+        categories = criteria["categories"]
+        if not isinstance(categories, list) or not categories or not all(isinstance(c, str) for c in categories):
+            raise SegmentError("'categories' must be a non-empty list of category names")
+    if criteria.get("birthday_within_days", 0) > 366:
+        raise SegmentError("'birthday_within_days' cannot exceed 366")
+    if "spend_days" in criteria and not AMOUNT_KEYS & set(criteria):
+        raise SegmentError("'spend_days' needs min_spend and/or max_spend")
+    if "category_days" in criteria and "categories" not in criteria:
+        raise SegmentError("'category_days' needs categories")
+    return criteria
+
+
+def _purchased_since(since: datetime):
+    return exists().where(
+        models.Sale.customer_id == models.Customer.id,
+        models.Sale.sale_date >= since
+    )
+
+
+def _birthday_window(today: datetime, days: int):
+    """Month/day match for the next `days` days, grouped by month (at most 13 terms, wraps the year)"""
+    by_month: Dict[int, List[int]] = {}
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        by_month.setdefault(day.month, []).append(day.day)
+    return or_(*[
+        and_(
+            extract("month", models.Customer.date_of_birth) == month,
+            extract("day", models.Customer.date_of_birth).in_(month_days)
+        )
+        for month, month_days in by_month.items()
+    ])
+
+
+def segment_conditions(criteria: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> List:
+    """WHERE conditions on customers; sales-based criteria become correlated EXISTS / IN subqueries"""
+    criteria = validate_criteria(criteria)
+    now = now or datetime.now()
+    conditions = []
+
+    if AMOUNT_KEYS & set(criteria):
+        if "spend_days" in criteria:
+            spend = func.sum(models.Sale.total_amount)
+            having = []
+            if "min_spend" in criteria:
+                having.append(spend >= criteria["min_spend"])
+            if "max_spend" in criteria:
+                having.append(spend <= criteria["max_spend"])
+            spenders = select(models.Sale.customer_id).where(
+                models.Sale.sale_date >= now - timedelta(days=criteria["spend_days"])
+            ).group_by(models.Sale.customer_id).having(and_(*having))
+            conditions.append(models.Customer.id.in_(spenders))
+        else:
+            lifetime = func.coalesce(models.Customer.total_purchases, 0)
+            if "min_spend" in criteria:
+                conditions.append(lifetime >= criteria["min_spend"])
+            if "max_spend" in criteria:
+                conditions.append(lifetime <= criteria["max_spend"])
+
+    if "purchased_within_days" in criteria:
+        conditions.append(_purchased_since(now - timedelta(days=criteria["purchased_within_days"])))
+    if "not_purchased_within_days" in criteria:
+        conditions.append(~_purchased_since(now - timedelta(days=criteria["not_purchased_within_days"])))
+
+    if "categories" in criteria:
+        bought = [
+            models.Sale.customer_id == models.Customer.id,
+            models.SaleItem.sale_id == models.Sale.id,
+            models.Product.id == models.SaleItem.product_id,
+            models.Product.category.in_(criteria["categories"]),
+        ]
+        if "category_days" in criteria:
+            bought.append(models.Sale.sale_date >= now - timedelta(days=criteria["category_days"]))
+        conditions.append(exists().where(*bought))
+
+    if "birthday_within_days" in criteria:
+        conditions.append(models.Customer.date_of_birth.isnot(None))
+        conditions.append(_birthday_window(now, criteria["birthday_within_days"]))
+
+    if "warranty_expiring_within_days" in criteria:
+        conditions.append(exists().where(
+            models.Sale.customer_id == models.Customer.id,
+            models.SaleItem.sale_id == models.Sale.id,
+            models.SaleItem.warranty_expires_at >= now,
+            models.SaleItem.warranty_expires_at < now + timedelta(days=criteria["warranty_expiring_within_days"] + 1)
+        ))
+
+    points = func.coalesce(models.Customer.loyalty_points, 0)
+    if "min_loyalty_points" in criteria:
+        conditions.append(points >= criteria["min_loyalty_points"])
+    if "max_loyalty_points" in criteria:
+        conditions.append(points <= criteria["max_loyalty_points"])
+    return conditions
+
+
+def audience_query(
+    db: Session,
+    store_id: int,
+    criteria: Optional[Dict[str, Any]],
+    now: Optional[datetime] = None,
+    extra_conditions: Sequence = ()
+) -> Query:
+    """Ids of the store's customers matching `criteria` (and any extra conditions), as a single statement"""
+    return db.query(models.Customer.id).filter(
+        models.Customer.store_id == store_id,
+        *segment_conditions(criteria, now),
+        *extra_conditions
+    )
+
+
+def count_audience(db: Session, store_id: int, criteria: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> int:
+    """Dry run: audience size via COUNT, nothing is loaded"""
+    return audience_query(db, store_id, criteria, now).order_by(None).count()
+
+
+def iter_audience_ids(
+    db: Session,
+    store_id: int,
+    criteria: Optional[Dict[str, Any]],
+    chunk_size: int = 1000,
+    now: Optional[datetime] = None,
+    extra_conditions: Sequence = ()
+) -> Iterator[List[int]]:
+    """Stream matching customer ids in ascending chunks, fetched `chunk_size` rows at a time"""
+    chunk: List[int] = []
+    for row in audience_query(db, store_id, criteria, now, extra_conditions).order_by(models.Customer.id).yield_per(chunk_size):
+        chunk.append(row.id)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
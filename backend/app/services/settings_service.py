@@ -0,0 +1,96 @@
+"""
+Settings Service
+In-memory copy of system_settings, reloaded when another process bumps its version counter
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from app.db.upsert import upsert
+
+CACHE_NAME = "system_settings"
+
+
+class SettingsCache:
+    """
+    All system_settings rows loaded in one query and served from memory.
+
+    Writers call bump() inside their transaction, which increments the shared
+    row in cache_versions. Every process compares that counter with the version
+    it loaded at most once per SETTINGS_CACHE_CHECK_SECONDS and reloads on change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._values: Dict[str, str] = {}
+        self._public: List[Dict] = []
+        self._etag = ""
+
+    def _load(self, db: Session):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < settings.SETTINGS_CACHE_CHECK_SECONDS:
+                return
+            # Read the version before the rows: a write landing in between leaves
+            # newer rows under an older version, which only causes one extra reload
+            version = db.query(models.CacheVersion.version).filter(
+                models.CacheVersion.name == CACHE_NAME
+            ).scalar() or 0
+            if version != self._version:
+                rows = db.query(models.SystemSetting).order_by(models.SystemSetting.key).all()
+                self._values = {row.key: row.value for row in rows}
+                self._public = [
+                    {
+                        "id": row.id,
+                        "key": row.key,
+                        "value": row.value,
+                        "description": row.description,
+                        "group": row.group,
+                        "is_encrypted": bool(row.is_encrypted),
+                        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+                    }
+                    for row in rows if not row.is_encrypted
+                ]
+                digest = hashlib.sha1(json.dumps(self._public, sort_keys=True).encode()).hexdigest()
+                self._etag = f'"{digest}"'
+                self._version = version
+            self._checked_at = now
+
+    def get(self, db: Optional[Session], key: str, default: str = "") -> str:
+        """Setting from the DB, falling back to the environment, then `default`"""
+        if db is None:
+            return os.getenv(key, default)
+        self._load(db)
+        value = self._values.get(key)
+        return value if value is not None else os.getenv(key, default)
+
+    def public(self, db: Session) -> Tuple[List[Dict], str]:
+        """Non-encrypted settings and their ETag"""
+        self._load(db)
+        return self._public, self._etag
+
+    def bump(self, db: Session):
+        """Mark settings changed for every process. Runs in the caller's transaction."""
+        upsert(
+            db,
+            models.CacheVersion,
+            [{"name": CACHE_NAME, "version": 1}],
+            conflict_columns=["name"],
+            increment_columns=["version"]
+        )
+
+    def invalidate(self):
+        """Reload on next access in this process (call after the bump is committed)"""
+        with self._lock:
+            self._version = None
+
+
+settings_cache = SettingsCache()
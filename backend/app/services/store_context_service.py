@@ -0,0 +1,148 @@
+"""
+Store Context Service
+Aggregate-only store snapshot for the AI assistant, cached per store and cleared on writes
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+TOP_PRODUCTS = 10
+TOP_CUSTOMERS = 5
+LOW_STOCK_ITEMS = 10
+DEFAULT_MINIMUM_STOCK = 5
+
+
+def _scoped(query, column, store_id: Optional[int]):
+    return query.filter(column == store_id) if store_id is not None else query
+
+
+def build_store_context(db: Session, store_id: Optional[int] = None) -> Dict:
+    """
+    Inventory, sales, customer and expense summaries for one store (or the whole
+    chain when store_id is None). Every figure is an aggregate or a LIMITed list
+    computed in SQL; no table is loaded row by row.
+    """
+    now = datetime.now()
+    thirty_days_ago = now - timedelta(days=30)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Inventory
+    stock = func.coalesce(models.Product.current_stock, 0)
+    low = stock <= func.coalesce(func.nullif(models.Product.minimum_stock, 0), DEFAULT_MINIMUM_STOCK)
+    inventory = _scoped(db.query(
+        func.count(models.Product.id),
+        func.coalesce(func.sum(func.coalesce(models.Product.cost_price, 0) * stock), 0),
+        func.coalesce(func.sum(case((low, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((stock == 0, 1), else_=0)), 0),
+    ), models.Product.store_id, store_id).one()
+    low_stock_items = _scoped(db.query(
+        models.Product.name, models.Product.current_stock, models.Product.minimum_stock
+    ).filter(low), models.Product.store_id, store_id).order_by(models.Product.id).limit(LOW_STOCK_ITEMS).all()
+
+    # Sales
+    sales = _scoped(db.query(
+        func.count(models.Sale.id),
+        func.coalesce(func.sum(models.Sale.total_amount), 0),
+        func.coalesce(func.sum(case((models.Sale.sale_date >= today_start, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((models.Sale.sale_date >= today_start, models.Sale.total_amount), else_=0)), 0),
+    ).filter(models.Sale.sale_date >= thirty_days_ago), models.Sale.store_id, store_id).one()
+    product_name = func.coalesce(models.Product.name, "Unknown")
+    quantity = func.sum(models.SaleItem.quantity)
+    top_products = _scoped(db.query(product_name, quantity).select_from(models.SaleItem).join(
+        models.Sale, models.Sale.id == models.SaleItem.sale_id
+    ).outerjoin(
+        models.Product, models.Product.id == models.SaleItem.product_id
+    ).filter(models.Sale.sale_date >= thirty_days_ago), models.Sale.store_id, store_id).group_by(
+        product_name
+    ).order_by(quantity.desc()).limit(TOP_PRODUCTS).all()
+
+    # Customers
+    spend = func.coalesce(models.Customer.total_purchases, 0)
+    total_customers = _scoped(db.query(func.count(models.Customer.id)), models.Customer.store_id, store_id).scalar()
+    top_customers = _scoped(db.query(models.Customer.name, spend), models.Customer.store_id, store_id).order_by(
+        spend.desc(), models.Customer.id
+    ).limit(TOP_CUSTOMERS).all()
+
+    # Financial
+    category = func.coalesce(func.nullif(models.Expense.category, ""), "other")
+    expense_rows = _scoped(db.query(
+        category, func.sum(models.Expense.amount), func.count(models.Expense.id)
+    ).filter(models.Expense.expense_date >= thirty_days_ago), models.Expense.store_id, store_id).group_by(category).all()
+
+    total_tx, total_rev, today_tx, today_rev = int(sales[0]), float(sales[1]), int(sales[2]), float(sales[3])
+    expense_by_category = {name: float(amount or 0) for name, amount, _ in expense_rows}
+    total_exp = sum(expense_by_category.values())
+    return {
+        "inventory": {
+            "total_products": int(inventory[0]),
+            "total_inventory_value": float(inventory[1]),
+            "low_stock_count": int(inventory[2]),
+            "out_of_stock_count": int(inventory[3]),
+            "low_stock_items": [
+                {"name": row.name, "stock": row.current_stock, "min_level": row.minimum_stock} for row in low_stock_items
+            ],
+        },
+        "sales": {
+            "last_30_days_revenue": total_rev,
+            "last_30_days_transactions": total_tx,
+            "average_transaction_value": total_rev / total_tx if total_tx > 0 else 0,
+            "today_revenue": today_rev,
+            "today_transactions": today_tx,
+            "top_products": [{"name": name, "quantity": int(qty or 0)} for name, qty in top_products],
+        },
+        "customers": {
+            "total_customers": int(total_customers or 0),
+            "top_customers": [{"name": name, "total_purchases": float(total)} for name, total in top_customers],
+        },
+        "financial": {
+            "last_30_days_expenses": total_exp,
+            "estimated_profit": total_rev - total_exp,
+            "expense_by_category": expense_by_category,
+            "expense_count": sum(int(count) for _, _, count in expense_rows),
+        },
+    }
+
+
+class StoreContextCache:
+    """
+    Process-local build_store_context snapshots keyed by store (None = whole chain).
+    Entries expire after STORE_CONTEXT_CACHE_SECONDS; routers that write sales,
+    products, customers or expenses call invalidate(store_id) after committing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Optional[int], Tuple[float, Dict]] = {}
+
+    def get(self, db: Session, store_id: Optional[int] = None) -> Dict:
+        ttl = settings.STORE_CONTEXT_CACHE_SECONDS
+        now = time.monotonic()
+        if ttl > 0:
+            with self._lock:
+                entry = self._entries.get(store_id)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        context = build_store_context(db, store_id)
+        if ttl > 0:
+            with self._lock:
+                self._entries[store_id] = (now + ttl, context)
+        return context
+
+    def invalidate(self, store_id: Optional[int] = None):
+        """Drop one store's snapshot and the chain-wide one that includes it (everything when store_id is None)"""
+        with self._lock:
+            if store_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(store_id, None)
+                self._entries.pop(None, None)
+
+
+store_context_cache = StoreContextCache()
@@ -0,0 +1,150 @@
+"""
+Store Stats Service
+Chain-wide store overview built from one grouped statement, with a short-lived snapshot cache
+"""
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+
+def compute_store_stats(
+    db: Session,
+    store_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[Dict]:
+    """
+    Stats for every active store (or just `store_id`) in a single round trip.
+    Each count is a grouped subquery LEFT JOINed onto stores, so stores with no
+    products / sales / customers still come back with zeros. Sales come from the
+    hourly rollup and, like new customers, are limited to [start, end) when given.
+    """
+    start_dt = datetime.combine(start, datetime.min.time()) if start else None
+    end_dt = datetime.combine(end, datetime.min.time()) if end else None
+
+    products = db.query(
+        models.Product.store_id,
+        func.count(models.Product.id).label("total_products")
+    ).filter(
+        models.Product.is_active == True
+    ).group_by(models.Product.store_id).subquery()
+
+    sales = db.query(
+        models.SalesHourlyRollup.store_id,
+        func.sum(models.SalesHourlyRollup.revenue).label("total_sales"),
+        func.sum(models.SalesHourlyRollup.transactions).label("total_transactions")
+    )
+    if start:
+        sales = sales.filter(models.SalesHourlyRollup.date >= start)
+    if end:
+        sales = sales.filter(models.SalesHourlyRollup.date < end)
+    sales = sales.group_by(models.SalesHourlyRollup.store_id).subquery()
+
+    new_filters = []
+    if start_dt:
+        new_filters.append(models.Customer.created_at >= start_dt)
+    if end_dt:
+        new_filters.append(models.Customer.created_at < end_dt)
+    customers = db.query(
+        models.Customer.store_id,
+        func.count(models.Customer.id).label("total_customers"),
+        (
+            func.sum(case((and_(*new_filters), 1), else_=0)) if new_filters
+            else func.count(models.Customer.id)
+        ).label("new_customers")
+    ).group_by(models.Customer.store_id).subquery()
+
+    users = db.query(
+        models.User.store_id,
+        func.count(models.User.id).label("total_users")
+    ).filter(
+        models.User.is_active == True
+    ).group_by(models.User.store_id).subquery()
+
+    query = db.query(
+        models.Store.id,
+        models.Store.name,
+        func.coalesce(products.c.total_products, 0).label("total_products"),
+        func.coalesce(sales.c.total_sales, 0).label("total_sales"),
+        func.coalesce(sales.c.total_transactions, 0).label("total_transactions"),
+        func.coalesce(customers.c.total_customers, 0).label("total_customers"),
+        func.coalesce(customers.c.new_customers, 0).label("new_customers"),
+        func.coalesce(users.c.total_users, 0).label("total_users")
+    ).outerjoin(
+        products, products.c.store_id == models.Store.id
+    ).outerjoin(
+        sales, sales.c.store_id == models.Store.id
+    ).outerjoin(
+        customers, customers.c.store_id == models.Store.id
+    ).outerjoin(
+        users, users.c.store_id == models.Store.id
+    ).filter(models.Store.is_active == True)
+    if store_id is not None:
+        query = query.filter(models.Store.id == store_id)
+
+    stats = []
+    for row in query.order_by(models.Store.id):
+        total_sales = float(row.total_sales or 0)
+        transactions = int(row.total_transactions or 0)
+        stats.append({
+            "store_id": row.id,
+            "store_name": row.name,
+            "total_products": int(row.total_products),
+            "total_sales": total_sales,
+            "total_transactions": transactions,
+            "average_bill": round(total_sales / transactions, 2) if transactions else 0.0,
+            "total_customers": int(row.total_customers),
+            "new_customers": int(row.new_customers or 0),
+            "total_users": int(row.total_users),
+        })
+    return stats
+
+
+class StoreStatsCache:
+    """
+    Process-local snapshots of compute_store_stats, keyed by scope and date range.
+    Entries expire after STORE_STATS_CACHE_SECONDS; store changes clear everything.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, Tuple[float, datetime, List[Dict]]] = {}
+
+    def get(
+        self,
+        db: Session,
+        store_id: Optional[int] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        refresh: bool = False
+    ) -> Tuple[List[Dict], datetime]:
+        """Return (stats, generated_at), recomputing when missing, expired or refresh is set"""
+        ttl = settings.STORE_STATS_CACHE_SECONDS
+        key = (store_id, start, end)
+        now = time.monotonic()
+        if ttl > 0 and not refresh:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[2], entry[1]
+
+        stats = compute_store_stats(db, store_id, start, end)
+        generated_at = datetime.now()
+        if ttl > 0:
+            with self._lock:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                self._entries[key] = (now + ttl, generated_at, stats)
+        return stats, generated_at
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+store_stats_cache = StoreStatsCache()
@@ -0,0 +1,168 @@
+"""
+Template Service
+Campaign message templates compiled once into literal/placeholder segments and rendered in batches
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.db import models
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+CUSTOMER_FIELDS = {"customer_name", "name", "email", "phone", "loyalty_points"}
+CAMPAIGN_FIELDS = {
+    "campaign_name", "discount_code", "code", "discount", "start_date", "end_date",
+    "days", "festival", "store_name", "store_phone",
+}
+KNOWN_PLACEHOLDERS = CUSTOMER_FIELDS | CAMPAIGN_FIELDS
+
+
+class CompiledTemplate:
+    """
+    A template split once into alternating literal text and placeholder names.
+    Rendering is a single join; placeholders without a value are kept verbatim.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        parts = PLACEHOLDER_RE.split(source)
+        self.literals: List[str] = parts[0::2]
+        self.fields: List[str] = parts[1::2]
+
+    @property
+    def placeholders(self) -> set:
+        return set(self.fields)
+
+    def render(self, values: Dict[str, str]) -> str:
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            out.append("{" + field + "}" if value is None else value)
+            out.append(literal)
+        return "".join(out)
+
+    def bind(self, values: Dict[str, str], keep: set) -> "CompiledTemplate":
+        """
+        Partially render: fold every placeholder not in `keep` into the
+        surrounding literals, leaving only the `keep` fields to fill per message.
+        """
+        bound = CompiledTemplate.__new__(CompiledTemplate)
+        bound.source = self.source
+        literals = [self.literals[0]]
+        fields = []
+        for field, literal in zip(self.fields, self.literals[1:]):
+            if field in keep:
+                fields.append(field)
+                literals.append(literal)
+            else:
+                value = values.get(field)
+                literals[-1] += ("{" + field + "}" if value is None else value) + literal
+        bound.literals = literals
+        bound.fields = fields
+        return bound
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    return CompiledTemplate(source or "")
+
+
+def validate_template(source: str, allowed: Iterable[str] = ()) -> List[str]:
+    """Placeholders in `source` that no renderer fills, sorted (empty when valid)"""
+    known = KNOWN_PLACEHOLDERS | set(allowed)
+    return sorted(compile_template(source).placeholders - known)
+
+
+def _format_discount(value) -> str:
+    value = value or 0
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def campaign_values(campaign: Optional[models.Campaign]) -> Dict[str, str]:
+    """Placeholder values shared by every message of a campaign"""
+    if campaign is None:
+        return {}
+    values = {
+        "campaign_name": campaign.name or "",
+        "festival": campaign.name or "",
+        "discount_code": campaign.discount_code or "",
+        "code": campaign.discount_code or "",
+        "discount": _format_discount(getattr(campaign, "discount_percentage", 0)),
+    }
+    if campaign.end_date:
+        values["end_date"] = campaign.end_date.strftime('%d %B %Y')
+    if campaign.start_date:
+        values["start_date"] = campaign.start_date.strftime('%d %B %Y')
+    if campaign.days_before_trigger is not None:
+        values["days"] = str(campaign.days_before_trigger)
+    store = campaign.store
+    if store is not None:
+        values["store_name"] = store.name or ""
+        values["store_phone"] = store.phone or ""
+    return values
+
+
+CUSTOMER_GETTERS = {
+    "customer_name": lambda c: c.name or 'Valued Customer',
+    "name": lambda c: c.name or 'Valued Customer',
+    "email": lambda c: c.email or '',
+    "phone": lambda c: c.phone or '',
+    "loyalty_points": lambda c: str(c.loyalty_points or 0),
+}
+
+
+def customer_values(customer: models.Customer) -> Dict[str, str]:
+    return {field: getter(customer) for field, getter in CUSTOMER_GETTERS.items()}
+
+
+EMAIL_HTML = """
+                <html>
+                <body style="font-family: Arial, sans-serif; padding: 20px;">
+                    <div style="max-width: 600px; margin: 0 auto;">
+                        <h2 style="color: #333;">{campaign_name}</h2>
+                        <div style="white-space: pre-wrap; line-height: 1.6;">
+                            {body}
+                        </div>
+                        <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
+                        <p style="color: #666; font-size: 12px;">
+                            You received this email because you are a valued customer of SKOPE ERP.
+                        </p>
+                    </div>
+                </body>
+                </html>
+                """
+
+
+class CampaignRenderer:
+    """
+    Everything per-campaign is resolved once: campaign placeholders are folded
+    into the compiled template's literals and the email wrapper is split around
+    the body. Rendering a customer then reads only the fields the template uses
+    and does a single join.
+    """
+
+    def __init__(self, campaign: models.Campaign):
+        template = compile_template(campaign.message_template).bind(campaign_values(campaign), CUSTOMER_FIELDS)
+        self.literals = template.literals
+        self.getters = [CUSTOMER_GETTERS[field] for field in template.fields]
+        self.html_prefix, self.html_suffix = EMAIL_HTML.replace(
+            "{campaign_name}", campaign.name or ""
+        ).split("{body}")
+
+    def render(self, customer: models.Customer) -> str:
+        out = [self.literals[0]]
+        for getter, literal in zip(self.getters, self.literals[1:]):
+            out.append(getter(customer))
+            out.append(literal)
+        return "".join(out)
+
+    def render_batch(self, customers: Iterable[models.Customer]) -> List[Tuple[models.Customer, str]]:
+        """(customer, message) for a chunk of customers in one pass"""
+        if not self.getters:
+            return [(customer, self.literals[0]) for customer in customers]
+        render = self.render
+        return [(customer, render(customer)) for customer in customers]
+
+    def email_html(self, message: str) -> str:
+        return self.html_prefix + message.replace("\n", "<br>") + self.html_suffix
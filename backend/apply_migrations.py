@@ -33,6 +33,257 @@ def upgrade_db():
     else:
         print("[OK] Table 'system_settings' already exists.")
 
+    # 3. Hourly sales rollup - create, and backfill whenever it is empty or behind the sales
+    if not inspector.has_table("sales_hourly_rollups"):
+        print("Creating 'sales_hourly_rollups' table...")
+        Base.metadata.create_all(bind=engine)
+    from app.services.rollup_service import ensure_hourly_rollup
+    db = SessionLocal()
+    try:
+        buckets = ensure_hourly_rollup(db)
+    finally:
+        db.close()
+    if buckets is None:
+        print("[OK] Table 'sales_hourly_rollups' is up to date.")
+    else:
+        print(f"[OK] Table 'sales_hourly_rollups' backfilled ({buckets} buckets).")
+
+    # 4. Metric baselines for smart alerts - create and compute the first window
+    if not inspector.has_table("store_metric_baselines"):
+        print("Creating 'store_metric_baselines' and 'metric_anomalies' tables...")
+        Base.metadata.create_all(bind=engine)
+        from app.services.anomaly_service import refresh_baselines
+        db = SessionLocal()
+        try:
+            result = refresh_baselines(db)
+        finally:
+            db.close()
+        print(f"[OK] Baselines computed for {result['stores']} stores.")
+    else:
+        print("[OK] Table 'store_metric_baselines' already exists.")
+
+    # 5. Campaign delivery columns - per-message log details and last run time
+    new_columns = {
+        "campaign_logs": {
+            "channel": "VARCHAR",
+            "message_sent": "TEXT",
+            "error_message": "TEXT",
+            "provider_message_id": "VARCHAR",
+            "attempts": "INTEGER DEFAULT 1",
+        },
+        "campaigns": {
+            "last_run_at": "TIMESTAMP",
+        },
+    }
+    for table, table_columns in new_columns.items():
+        existing = [c['name'] for c in inspector.get_columns(table)]
+        for column, ddl in table_columns.items():
+            if column not in existing:
+                with engine.connect() as conn:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                    conn.commit()
+                print(f"[OK] Column '{column}' added to '{table}'.")
+    print("[OK] Campaign delivery columns present.")
+
+    # 6. Durable job queue and queued campaign runs
+    if not inspector.has_table("queue_jobs"):
+        print("Creating 'queue_jobs' and 'campaign_runs' tables...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Queue tables created.")
+    else:
+        print("[OK] Table 'queue_jobs' already exists.")
+    if 'run_id' not in [c['name'] for c in inspect(engine).get_columns('campaign_logs')]:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE campaign_logs ADD COLUMN run_id INTEGER REFERENCES campaign_runs(id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_campaign_logs_run_customer ON campaign_logs (run_id, customer_id)"))
+            conn.commit()
+        print("[OK] Column 'run_id' added to 'campaign_logs'.")
+
+    # 7. Cross-process cache version counters
+    if not inspector.has_table("cache_versions"):
+        print("Creating 'cache_versions' table...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Table 'cache_versions' created.")
+    else:
+        print("[OK] Table 'cache_versions' already exists.")
+
+    # 8. Materialized failed-message counter and newest-first log index
+    if 'total_failed' not in [c['name'] for c in inspect(engine).get_columns('campaigns')]:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE campaigns ADD COLUMN total_failed INTEGER DEFAULT 0"))
+            conn.execute(text(
+                "UPDATE campaigns SET total_failed = (SELECT COUNT(*) FROM campaign_logs "
+                "WHERE campaign_logs.campaign_id = campaigns.id AND campaign_logs.status = 'failed')"
+            ))
+            conn.commit()
+        print("[OK] Column 'total_failed' added to 'campaigns' and backfilled.")
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_campaign_logs_campaign_sent "
+            "ON campaign_logs (campaign_id, sent_at DESC, id DESC)"
+        ))
+        conn.commit()
+    print("[OK] Index 'ix_campaign_logs_campaign_sent' present.")
+
+    # 9. Automated triggers: scheduler lease, watermarks, contact history and indexed customer fields
+    if not inspector.has_table("campaign_contacts"):
+        print("Creating 'scheduler_leases', 'watermarks' and 'campaign_contacts' tables...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Trigger tables created.")
+    else:
+        print("[OK] Table 'campaign_contacts' already exists.")
+    customer_columns = [c['name'] for c in inspect(engine).get_columns('customers')]
+    with engine.connect() as conn:
+        if 'birthday_doy' not in customer_columns:
+            conn.execute(text("ALTER TABLE customers ADD COLUMN birthday_doy INTEGER"))
+            print("[OK] Column 'birthday_doy' added to 'customers'.")
+        if 'last_purchase_date' not in customer_columns:
+            conn.execute(text("ALTER TABLE customers ADD COLUMN last_purchase_date TIMESTAMP"))
+            print("[OK] Column 'last_purchase_date' added to 'customers'.")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customers_store_birthday ON customers (store_id, birthday_doy)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customers_store_last_purchase ON customers (store_id, last_purchase_date)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sale_items_warranty_expires_at ON sale_items (warranty_expires_at)"))
+        conn.commit()
+    # Both columns are filled incrementally from here on; the first pass covers every customer
+    from app.services.campaign_trigger_service import sync_customer_trigger_fields
+    db = SessionLocal()
+    try:
+        synced = sync_customer_trigger_fields(db)
+    finally:
+        db.close()
+    print(f"[OK] Customer trigger fields synced ({synced['last_purchase_refreshed']} last purchase dates, "
+          f"{synced['birthdays_filled']} birthdays).")
+
+    # 10. Delivery status webhooks: staged events and log lookup by provider message id
+    if not inspector.has_table("delivery_events"):
+        print("Creating 'delivery_events' table...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Table 'delivery_events' created.")
+    else:
+        print("[OK] Table 'delivery_events' already exists.")
+    with engine.connect() as conn:
+        if 'delivered_at' not in [c['name'] for c in inspect(engine).get_columns('campaign_logs')]:
+            conn.execute(text("ALTER TABLE campaign_logs ADD COLUMN delivered_at TIMESTAMP"))
+            print("[OK] Column 'delivered_at' added to 'campaign_logs'.")
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_campaign_logs_provider_message_id ON campaign_logs (provider_message_id)"
+        ))
+        conn.commit()
+    print("[OK] Index 'ix_campaign_logs_provider_message_id' present.")
+
+    # 11. Stored assistant conversations
+    if not inspector.has_table("chat_messages"):
+        print("Creating 'chat_conversations' and 'chat_messages' tables...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Chat tables created.")
+    else:
+        print("[OK] Table 'chat_messages' already exists.")
+
+    # 12. Retrieval index for the assistant - create and index existing records
+    if not inspector.has_table("search_documents"):
+        print("Creating and filling 'search_documents' table...")
+        Base.metadata.create_all(bind=engine)
+        from app.services.retrieval_service import sync_search_documents
+        db = SessionLocal()
+        try:
+            counts = sync_search_documents(db)
+        finally:
+            db.close()
+        print(f"[OK] Table 'search_documents' created ({sum(counts.values())} documents).")
+    else:
+        print("[OK] Table 'search_documents' already exists.")
+
+    # 13. Ad analytics read by campaign and date range
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_ad_campaign_analytics_campaign_date "
+            "ON ad_campaign_analytics (campaign_id, date)"
+        ))
+        conn.commit()
+    print("[OK] Index 'ix_ad_campaign_analytics_campaign_date' present.")
+
+    # 14. Audience membership table - move the legacy customer_ids JSON lists into it
+    if not inspector.has_table("audience_members"):
+        print("Creating 'audience_members' table...")
+        Base.metadata.create_all(bind=engine)
+        from app.db.models import Audience, AudienceMember, Customer
+        from sqlalchemy import insert
+        db = SessionLocal()
+        try:
+            moved = 0
+            for audience in db.query(Audience).filter(Audience.customer_ids.isnot(None)):
+                ids = sorted(set(audience.customer_ids or []))
+                existing = set()
+                for i in range(0, len(ids), 900):
+                    existing.update(row.id for row in db.query(Customer.id).filter(Customer.id.in_(ids[i:i + 900])))
+                rows = [{"audience_id": audience.id, "customer_id": cid, "added_at": audience.created_at} for cid in ids if cid in existing]
+                if rows:
+                    db.execute(insert(AudienceMember), rows)
+                audience.customer_ids = None
+                audience.size = len(rows)
+                moved += len(rows)
+            db.commit()
+        finally:
+            db.close()
+        print(f"[OK] Table 'audience_members' created ({moved} members moved).")
+    else:
+        print("[OK] Table 'audience_members' already exists.")
+
+    # 15. Pending audience changes for incremental uploads
+    member_columns = [c['name'] for c in inspect(engine).get_columns('audience_members')]
+    with engine.connect() as conn:
+        for column in ("removed_at", "synced_at"):
+            if column not in member_columns:
+                conn.execute(text(f"ALTER TABLE audience_members ADD COLUMN {column} TIMESTAMP"))
+                print(f"[OK] Column '{column}' added to 'audience_members'.")
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_audience_members_pending ON audience_members (audience_id, synced_at)"
+        ))
+        conn.commit()
+    print("[OK] Index 'ix_audience_members_pending' present.")
+
+    # 16. Offline conversion attribution
+    if not inspector.has_table("sale_attributions"):
+        print("Creating 'sale_attributions' table...")
+        Base.metadata.create_all(bind=engine)
+        print("[OK] Table 'sale_attributions' created.")
+    else:
+        print("[OK] Table 'sale_attributions' already exists.")
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conversion_tracking_customer_date "
+            "ON conversion_tracking (customer_id, conversion_date)"
+        ))
+        conn.commit()
+    print("[OK] Index 'ix_conversion_tracking_customer_date' present.")
+
+    # 17. One synced row per platform campaign - drop duplicates, keeping the newest, before the unique index
+    with engine.connect() as conn:
+        removed = conn.execute(text(
+            "DELETE FROM marketing_campaign_syncs WHERE id NOT IN ("
+            "SELECT MAX(id) FROM marketing_campaign_syncs GROUP BY integration_id, external_campaign_id)"
+        )).rowcount
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_marketing_campaign_syncs_integration_campaign "
+            "ON marketing_campaign_syncs (integration_id, external_campaign_id)"
+        ))
+        conn.commit()
+    print(f"[OK] Index 'uq_marketing_campaign_syncs_integration_campaign' present ({removed} duplicates removed).")
+
+    # 18. Audience members keep the identifiers they were uploaded with, and outlive deleted customers
+    member_columns = [c['name'] for c in inspect(engine).get_columns('audience_members')]
+    with engine.connect() as conn:
+        for column in ("email_sha256", "phone_sha256", "fn_sha256", "ln_sha256"):
+            if column not in member_columns:
+                conn.execute(text(f"ALTER TABLE audience_members ADD COLUMN {column} VARCHAR(64)"))
+                print(f"[OK] Column '{column}' added to 'audience_members'.")
+        if engine.dialect.name != "sqlite":
+            for fk in inspect(engine).get_foreign_keys('audience_members'):
+                if fk['referred_table'] == 'customers' and fk.get('name'):
+                    conn.execute(text(f"ALTER TABLE audience_members DROP CONSTRAINT {fk['name']}"))
+                    print(f"[OK] Foreign key '{fk['name']}' dropped from 'audience_members'.")
+        conn.commit()
+
 if __name__ == "__main__":
     try:
         upgrade_db()
@@ -0,0 +1,35 @@
+"""
+Backfill the hourly sales rollup from existing sales.
+New sales are added to the rollup at checkout; run this once after upgrading,
+or after importing sales outside the API:
+
+    python backfill_sales_rollups.py [--store-id 1] [--since 2025-01-01]
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+from datetime import datetime
+from app.db.database import SessionLocal, engine
+from app.db.models import Base
+from app.services.rollup_service import rebuild_hourly_rollup
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild sales rollups from raw sales")
+    parser.add_argument("--store-id", type=int, default=None)
+    parser.add_argument("--since", type=str, default=None, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, "%Y-%m-%d").date() if args.since else None
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        buckets = rebuild_hourly_rollup(db, store_id=args.store_id, since=since)
+        print(f"[OK] Hourly rollup: {buckets} buckets written")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
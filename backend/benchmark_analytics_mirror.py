@@ -0,0 +1,188 @@
+"""
+Latency benchmark: analytical endpoints on the OLTP database vs the columnar mirror.
+
+Generates a synthetic dataset into a separate database (never the app's),
+syncs the Parquet mirror from it and times each endpoint on both backends:
+
+    python benchmark_analytics_mirror.py --items 10000000
+    python benchmark_analytics_mirror.py --skip-load        # reuse the generated data
+
+Per-customer reports (RFM segmentation, churn) issue one query per customer on
+the OLTP path and are only timed with --with-customer-scans.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+parser = argparse.ArgumentParser(description="Benchmark analytical queries: OLTP vs analytics mirror")
+parser.add_argument("--items", type=int, default=10000000, help="Sale items to generate")
+parser.add_argument("--items-per-sale", type=float, default=2.5)
+parser.add_argument("--stores", type=int, default=5)
+parser.add_argument("--products", type=int, default=5000)
+parser.add_argument("--customers", type=int, default=200000)
+parser.add_argument("--days", type=int, default=730)
+parser.add_argument("--db-url", default="sqlite:///benchmark_analytics.db")
+parser.add_argument("--mirror-dir", default="benchmark_analytics_mirror")
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--skip-load", action="store_true", help="Reuse data generated by an earlier run")
+parser.add_argument("--with-customer-scans", action="store_true")
+args = parser.parse_args()
+
+# Point the app at the benchmark database and mirror before anything imports settings
+os.environ["DATABASE_URL"] = args.db_url
+os.environ["OLAP_ENABLED"] = "true"
+os.environ["OLAP_MIRROR_DIR"] = os.path.abspath(args.mirror_dir)
+os.environ["SCHEDULER_ENABLED"] = "false"
+
+import shutil
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from app.core.config import settings
+from app.db.database import SessionLocal, engine
+from app.db import models
+from app.services.olap_service import analytics_mirror
+from app.api.v1 import analytics, comparison, reports
+
+CHUNK = 100000
+
+
+def generate(db_engine):
+    rng = np.random.default_rng(7)
+    models.Base.metadata.drop_all(bind=db_engine)
+    models.Base.metadata.create_all(bind=db_engine)
+    n_sales = int(args.items / args.items_per_sale)
+    now = datetime.now().replace(microsecond=0)
+
+    with db_engine.begin() as conn:
+        conn.execute(models.Store.__table__.insert(), [
+            {"id": i + 1, "name": f"Store {i + 1}", "is_active": True} for i in range(args.stores)
+        ])
+        cost = rng.uniform(100, 40000, args.products).round(2)
+        conn.execute(models.Product.__table__.insert(), [
+            {
+                "id": i + 1, "sku": f"BENCH-{i + 1:07d}", "name": f"Product {i + 1}",
+                "category": f"Category {i % 25}", "brand": f"Brand {i % 40}",
+                "unit_price": float(cost[i] * 1.3), "cost_price": float(cost[i]),
+                "current_stock": int(rng.integers(0, 200)), "store_id": int(i % args.stores) + 1,
+                "is_active": True,
+            }
+            for i in range(args.products)
+        ])
+        for start in range(0, args.customers, CHUNK):
+            conn.execute(models.Customer.__table__.insert(), [
+                {"id": i + 1, "name": f"Customer {i + 1}", "phone": f"9{i + 1:09d}",
+                 "store_id": int(i % args.stores) + 1, "total_purchases": 0.0}
+                for i in range(start, min(start + CHUNK, args.customers))
+            ])
+
+    print(f"Generating {n_sales:,} sales / {args.items:,} items over {args.days} days...")
+    started = time.perf_counter()
+    item_id = 0
+    for start in range(0, n_sales, CHUNK):
+        size = min(CHUNK, n_sales - start)
+        sale_ids = np.arange(start + 1, start + size + 1)
+        offsets = np.sort(rng.uniform(0, args.days * 86400, size))[::-1]
+        stores = rng.integers(1, args.stores + 1, size)
+        customers = np.where(rng.random(size) < 0.8, rng.integers(1, args.customers + 1, size), 0)
+        counts = np.maximum(rng.poisson(args.items_per_sale - 1, size) + 1, 1)
+        products = rng.integers(1, args.products + 1, counts.sum())
+        quantities = rng.integers(1, 4, counts.sum())
+        prices = (cost[products - 1] * 1.3).round(2)
+        line_totals = (prices * quantities * 1.18).round(2)
+        sale_totals = np.add.reduceat(line_totals, np.concatenate([[0], np.cumsum(counts)[:-1]]))
+        discounts = np.where(rng.random(size) < 0.2, (sale_totals * 0.05).round(2), 0.0)
+        modes = list(models.PaymentMode)
+
+        sales = [
+            {
+                "id": int(sale_ids[i]), "invoice_number": f"B{sale_ids[i]:010d}",
+                "customer_id": int(customers[i]) or None, "store_id": int(stores[i]),
+                "subtotal": float(sale_totals[i] / 1.18), "gst_amount": float(sale_totals[i] - sale_totals[i] / 1.18),
+                "discount": float(discounts[i]), "total_amount": float(sale_totals[i] - discounts[i]),
+                "payment_mode": modes[i % len(modes)], "sale_date": now - timedelta(seconds=float(offsets[i])),
+            }
+            for i in range(size)
+        ]
+        owners = np.repeat(sale_ids, counts)
+        items = [
+            {
+                "id": item_id + j + 1, "sale_id": int(owners[j]), "product_id": int(products[j]),
+                "quantity": int(quantities[j]), "unit_price": float(prices[j]), "gst_rate": 18.0,
+                "gst_amount": float(line_totals[j] - line_totals[j] / 1.18), "total_price": float(line_totals[j]),
+            }
+            for j in range(len(owners))
+        ]
+        item_id += len(owners)
+        with db_engine.begin() as conn:
+            conn.execute(models.Sale.__table__.insert(), sales)
+            conn.execute(models.SaleItem.__table__.insert(), items)
+        print(f"  {start + size:,} sales, {item_id:,} items ({time.perf_counter() - started:.0f}s)")
+
+    with db_engine.begin() as conn:
+        expense_days = rng.integers(0, args.days, args.days * args.stores * 3)
+        conn.execute(models.Expense.__table__.insert(), [
+            {"store_id": int(i % args.stores) + 1, "category": "operations", "description": "benchmark",
+             "amount": float(rng.uniform(500, 20000)), "payment_mode": models.PaymentMode.CASH,
+             "expense_date": now - timedelta(days=int(d))}
+            for i, d in enumerate(expense_days)
+        ])
+    print(f"Generated in {time.perf_counter() - started:.1f}s")
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    if not args.skip_load:
+        generate(engine)
+        shutil.rmtree(args.mirror_dir, ignore_errors=True)
+
+    db = SessionLocal()
+    admin = models.User(id=0, email="bench@local", role=models.UserRole.SUPER_ADMIN, store_id=1)
+    try:
+        started = time.perf_counter()
+        result = analytics_mirror.sync(db)
+        print(f"Mirror sync: {result['rows_synced']} in {time.perf_counter() - started:.1f}s")
+
+        today = datetime.now()
+        year_start = today - timedelta(days=365)
+        product_id = 1
+        benchmarks = [
+            ("comparison/daily (90d)", lambda: comparison.get_daily_comparison(
+                (today - timedelta(days=90)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"), None, None, db, admin)),
+            ("comparison/yearly", lambda: comparison.get_yearly_comparison(str(today.year), None, None, db, admin)),
+            ("profitability/item-wise (1y)", lambda: reports.get_item_wise_margin_report(year_start, today, db, admin)),
+            ("profitability/brand-wise (1y)", lambda: reports.get_brand_wise_profitability(year_start, today, db, admin)),
+            ("profitability/discount-impact (1y)", lambda: reports.get_discount_impact_report(year_start, today, db, admin)),
+            ("analytics/cohort-analysis", lambda: analytics.cohort_analysis(6, db, admin)),
+            ("analytics/product-affinity", lambda: analytics.product_affinity_analysis(product_id, 10, db, admin)),
+        ]
+        if args.with_customer_scans:
+            benchmarks += [
+                ("analytics/customers/segmentation", lambda: analytics.customer_segmentation(db, admin)),
+                ("analytics/predict/churn", lambda: analytics.predict_customer_churn(db, admin)),
+            ]
+
+        print(f"\n{'endpoint':40s} {'oltp (s)':>10s} {'mirror (s)':>11s} {'speedup':>8s}")
+        for name, fn in benchmarks:
+            settings.OLAP_ENABLED = False
+            oltp = timed(fn, args.repeat)
+            db.expire_all()
+            settings.OLAP_ENABLED = True
+            mirror = timed(fn, args.repeat)
+            print(f"{name:40s} {oltp:10.3f} {mirror:11.3f} {oltp / mirror:7.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Backtest harness for the per-SKU demand forecasting engine.
+
+Synthetic mode (default) generates SKU x day demand with trend, weekly
+seasonality and Poisson noise, then reports MAPE/WAPE and total runtime:
+
+    python benchmark_demand_forecast.py --skus 20000 --days 182 --holdout 28
+
+Database mode backtests the real sales history of one store:
+
+    python benchmark_demand_forecast.py --store-id 1
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import time
+from datetime import date, timedelta
+import numpy as np
+from app.services.forecast_service import backtest, fit_seasonal_trend
+
+def synthetic_demand(skus: int, days: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(shape=2.0, scale=3.0, size=(skus, 1))
+    trend = rng.normal(0, 0.002, size=(skus, 1)) * base
+    weekly = 1 + rng.uniform(0.1, 0.6, size=(skus, 1)) * np.sin(
+        2 * np.pi * (np.arange(days) + rng.integers(0, 7, size=(skus, 1))) / 7
+    )
+    mean = np.clip((base + trend * np.arange(days)) * weekly, 0, None)
+    return rng.poisson(mean).astype(np.float64)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the demand forecasting engine")
+    parser.add_argument("--skus", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=182, help="Total days including the holdout")
+    parser.add_argument("--holdout", type=int, default=28)
+    parser.add_argument("--store-id", type=int, default=None, help="Backtest a store from the database instead")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.store_id is not None:
+        from app.db.database import SessionLocal
+        from app.services.forecast_service import load_sku_demand_matrix
+        db = SessionLocal()
+        try:
+            end = date.today()  # Last complete day is yesterday
+            start = end - timedelta(days=args.days)
+            _, matrix = load_sku_demand_matrix(db, args.store_id, start, end)
+        finally:
+            db.close()
+        first_weekday = start.weekday()
+        print(f"Loaded {matrix.shape[0]} SKUs x {matrix.shape[1]} days for store {args.store_id}")
+    else:
+        matrix = synthetic_demand(args.skus, args.days)
+        first_weekday = 0
+        print(f"Generated {matrix.shape[0]} SKUs x {matrix.shape[1]} days of synthetic demand")
+    load_seconds = time.perf_counter() - started
+
+    result = backtest(matrix, first_weekday, holdout_days=args.holdout)
+
+    fit_started = time.perf_counter()
+    fit_seasonal_trend(matrix, 30, first_weekday)
+    full_fit_seconds = time.perf_counter() - fit_started
+
+    print(f"Holdout:            {result['holdout_days']} days")
+    print(f"MAPE (non-zero):    {result['mape']}%")
+    print(f"WAPE:               {result['wape']}%")
+    print(f"Backtest fit:       {result['fit_seconds']}s")
+    print(f"Full 30-day fit:    {full_fit_seconds:.4f}s")
+    print(f"Total runtime:      {time.perf_counter() - started:.2f}s (data {load_seconds:.2f}s)")
+
+if __name__ == "__main__":
+    main()
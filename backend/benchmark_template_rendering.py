@@ -0,0 +1,111 @@
+"""
+Renders-per-second benchmark: per-message str.replace templating vs the compiled batch renderer.
+No database is used; campaign and customers are in-memory model instances.
+
+    python benchmark_template_rendering.py --customers 200000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from app.db import models
+from app.services.marketing_service import build_campaign_messages
+from app.services.template_service import CampaignRenderer
+
+TEMPLATE = (
+    "Hi {customer_name}! {festival} is here.\n\nCelebrate with {discount}% OFF on all products at "
+    "{store_name}. Use code: {code}\n\nYou have {loyalty_points} loyalty points.\n"
+    "Offer valid till {end_date}. Questions? Call {store_phone}."
+)
+
+
+def legacy_process_template(template, customer, campaign):
+    """The per-message implementation this benchmark compares against"""
+    replacements = {
+        '{customer_name}': customer.name or 'Valued Customer',
+        '{name}': customer.name or 'Valued Customer',
+        '{email}': customer.email or '',
+        '{phone}': customer.phone or '',
+        '{loyalty_points}': str(customer.loyalty_points or 0),
+        '{campaign_name}': campaign.name or '',
+        '{discount_code}': campaign.discount_code or '',
+        '{discount}': str(campaign.discount_percentage) + '%',
+        '{end_date}': campaign.end_date.strftime('%d %B %Y'),
+        '{start_date}': campaign.start_date.strftime('%d %B %Y'),
+    }
+    message = template
+    for placeholder, value in replacements.items():
+        message = message.replace(placeholder, value)
+    return message
+
+
+def legacy_email(campaign, message):
+    return f"""
+                <html>
+                <body style="font-family: Arial, sans-serif; padding: 20px;">
+                    <div style="max-width: 600px; margin: 0 auto;">
+                        <h2 style="color: #333;">{campaign.name}</h2>
+                        <div style="white-space: pre-wrap; line-height: 1.6;">
+                            {message.replace(chr(10), '<br>')}
+                        </div>
+                        <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
+                        <p style="color: #666; font-size: 12px;">
+                            You received this email because you are a valued customer of SKOPE ERP.
+                        </p>
+                    </div>
+                </body>
+                </html>
+                """
+
+
+def timed(label, n, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:45s} {elapsed:7.2f}s {n / elapsed:12,.0f} renders/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark campaign template rendering")
+    parser.add_argument("--customers", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=1000, help="Customers per render_batch call")
+    args = parser.parse_args()
+
+    now = datetime.now()
+    store = models.Store(id=1, name="SKOPE Retail Store", phone="9876543210")
+    campaign = models.Campaign(
+        id=1, name="Diwali Dhamaka", campaign_type=models.CampaignType.EMAIL, store=store,
+        message_template=TEMPLATE, discount_code="DIWALI25", discount_percentage=25,
+        start_date=now, end_date=now + timedelta(days=10)
+    )
+    customers = [
+        models.Customer(id=i, name=f"Customer {i}", email=f"customer{i}@example.com",
+                        phone=f"9{i:09d}", loyalty_points=i % 500)
+        for i in range(1, args.customers + 1)
+    ]
+    chunks = [customers[i:i + args.chunk] for i in range(0, len(customers), args.chunk)]
+    n = len(customers)
+    print(f"{n:,} customers, template with {TEMPLATE.count('{')} placeholders\n")
+
+    legacy = timed("per-message str.replace (body)", n, lambda: [
+        legacy_process_template(TEMPLATE, c, campaign) for c in customers
+    ])
+    renderer = CampaignRenderer(campaign)
+    compiled = timed("compiled render_batch (body)", n, lambda: [
+        renderer.render_batch(chunk) for chunk in chunks
+    ])
+    legacy_full = timed("per-message str.replace + f-string HTML", n, lambda: [
+        legacy_email(campaign, legacy_process_template(TEMPLATE, c, campaign)) for c in customers
+    ])
+    compiled_full = timed("build_campaign_messages (body + HTML)", n, lambda: [
+        build_campaign_messages(campaign, chunk, renderer) for chunk in chunks
+    ])
+    print(f"\nspeedup: body {legacy / compiled:.1f}x, full email {legacy_full / compiled_full:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
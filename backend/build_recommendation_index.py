@@ -0,0 +1,31 @@
+"""
+Offline build of the item-item recommendation index.
+Run periodically (e.g. nightly via cron):
+
+    python build_recommendation_index.py --top-k 20
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+from app.db.database import SessionLocal, engine
+from app.db.models import Base
+from app.services.recommendation_service import build_similarity_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the product similarity index")
+    parser.add_argument("--top-k", type=int, default=20, help="Neighbours kept per product")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = build_similarity_index(db, top_k=args.top_k)
+        print(f"[OK] Indexed {result['products_indexed']} products from {result['customers_used']} customers")
+        print(f"[OK] {result['neighbour_rows']} neighbour rows written in {result['build_seconds']}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
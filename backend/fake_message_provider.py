@@ -0,0 +1,87 @@
+"""
+Local stand-in for the Twilio Messages and SendGrid mail/send APIs, for load
+testing campaign delivery without sending real messages:
+
+    python fake_message_provider.py --port 8900 --latency-ms 80 --error-rate 0.02 --throttle-rate 0.01
+
+then point the app (or load_test_campaign_dispatch.py) at it:
+
+    TWILIO_API_BASE=http://127.0.0.1:8900 SENDGRID_API_BASE=http://127.0.0.1:8900
+
+GET /stats returns request counters; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+import uvicorn
+
+parser = argparse.ArgumentParser(description="Fake Twilio / SendGrid endpoint for load tests")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8900)
+parser.add_argument("--latency-ms", type=float, default=50, help="Mean response latency")
+parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+args = parser.parse_args()
+
+app = FastAPI(title="Fake message provider")
+stats = Counter()
+
+
+async def simulate(kind: str):
+    """Latency and injected failures; returns an error response or None"""
+    stats[f"{kind}_requests"] += 1
+    await asyncio.sleep(random.expovariate(1000.0 / args.latency_ms) if args.latency_ms > 0 else 0)
+    roll = random.random()
+    if roll < args.throttle_rate:
+        stats[f"{kind}_throttled"] += 1
+        return JSONResponse({"code": 20429, "message": "Too Many Requests"}, status_code=429, headers={"Retry-After": "1"})
+    if roll < args.throttle_rate + args.error_rate:
+        stats[f"{kind}_errors"] += 1
+        return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+    stats[f"{kind}_accepted"] += 1
+    return None
+
+
+@app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+async def twilio_messages(account_sid: str, request: Request):
+    form = await request.form()
+    if not form.get("To") or not form.get("Body"):
+        return JSONResponse({"code": 21604, "message": "A 'To' phone number is required."}, status_code=400)
+    error = await simulate("twilio")
+    if error:
+        return error
+    return JSONResponse(
+        {"sid": "SM" + uuid.uuid4().hex, "status": "queued", "to": form.get("To")},
+        status_code=201
+    )
+
+
+@app.post("/v3/mail/send")
+async def sendgrid_send(request: Request):
+    payload = await request.json()
+    if not payload.get("personalizations"):
+        return JSONResponse({"errors": [{"message": "personalizations is required"}]}, status_code=400)
+    error = await simulate("sendgrid")
+    if error:
+        return error
+    return Response(status_code=202, headers={"X-Message-Id": uuid.uuid4().hex})
+
+
+@app.get("/stats")
+def get_stats():
+    return dict(stats)
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.clear()
+    return {"reset": True}
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
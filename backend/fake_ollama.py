@@ -0,0 +1,94 @@
+"""
+Local stand-in for the Ollama /api/tags and /api/chat endpoints, for measuring
+chatbot latency without a GPU:
+
+    python fake_ollama.py --port 11500 --tokens 200 --token-ms 25 --prompt-ms 300
+
+then point the app at it with OLLAMA_BASE_URL=http://127.0.0.1:11500 and compare
+time-to-first-token of POST /api/v1/chatbot/chat/stream with the full wait on
+POST /api/v1/chatbot/chat (e.g. `curl -N` against the stream endpoint).
+
+GET /stats returns request counters and the last prompt's size; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+parser = argparse.ArgumentParser(description="Fake Ollama endpoint for chatbot latency tests")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=11500)
+parser.add_argument("--model", default="phi4:latest")
+parser.add_argument("--tokens", type=int, default=200, help="Tokens generated per answer")
+parser.add_argument("--token-ms", type=float, default=25, help="Delay between generated tokens")
+parser.add_argument("--prompt-ms", type=float, default=300, help="Prompt evaluation delay before the first token")
+args = parser.parse_args()
+
+app = FastAPI(title="Fake Ollama")
+stats = Counter()
+
+
+def _token(i: int) -> str:
+    return f"word{i} "
+
+
+def _chunk(content: str, done: bool) -> dict:
+    return {
+        "model": args.model,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+
+
+@app.get("/api/tags")
+def tags():
+    stats["tags_requests"] += 1
+    return {"models": [{"name": args.model}]}
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    payload = await request.json()
+    if not payload.get("messages"):
+        return JSONResponse({"error": "messages is required"}, status_code=400)
+    # Prompt size of the latest request, to check that conversation prompts stay bounded
+    stats["last_prompt_messages"] = len(payload["messages"])
+    stats["last_prompt_chars"] = sum(len(m.get("content", "")) for m in payload["messages"])
+
+    if not payload.get("stream", True):
+        stats["chat_requests"] += 1
+        await asyncio.sleep((args.prompt_ms + args.tokens * args.token_ms) / 1000)
+        return _chunk("".join(_token(i) for i in range(args.tokens)), done=True)
+
+    stats["stream_requests"] += 1
+
+    async def generate():
+        await asyncio.sleep(args.prompt_ms / 1000)
+        for i in range(args.tokens):
+            if i:
+                await asyncio.sleep(args.token_ms / 1000)
+            yield json.dumps(_chunk(_token(i), done=False)) + "\n"
+        yield json.dumps(_chunk("", done=True)) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/stats")
+def get_stats():
+    return dict(stats)
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.clear()
+    return {"reset": True}
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,5 +1,6 @@
 from app.db.database import SessionLocal
 from app.db import models
+from app.services.rollup_service import rebuild_hourly_rollup
 from datetime import datetime
 import random
 
@@ -37,5 +38,7 @@ for i in range(5):
     print(f"Added sale: {sale.invoice_number}")
 
 db.commit()
+# Seeded sales bypass checkout, so rebuild the hourly sales rollup
+rebuild_hourly_rollup(db, store_id=store.id)
 print("Success! Added 5 sales for today.")
 db.close()
@@ -4,6 +4,7 @@ Fresh Start Script - Completely reset and populate database
 import os
 import sys
 from app.db.database import SessionLocal, engine
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 from datetime import datetime, timedelta
@@ -319,7 +320,10 @@ try:
     print(f"  Manager: manager@example.com / manager123")
     print(f"  Sales: sales@example.com / sales123")
     print("\n" + "=" * 70 + "\n")
-    
+
+    # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+    print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
 except Exception as e:
     print(f"\nERROR: {e}")
     import traceback
@@ -0,0 +1,62 @@
+"""
+Queue worker for outbound campaign messages (and any other queued jobs).
+Run as many processes as the providers' rate limits allow:
+
+    python message_worker.py                      # all queues
+    python message_worker.py --queues campaigns --threads 2
+
+Jobs are leased, so workers can be started, stopped or killed at any time;
+an interrupted job is picked up again once its lease expires. API processes
+do not deliver campaigns (QUEUE_WORKER_IN_API defaults to false), so at least
+one worker must be running for queued campaigns to be sent.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import logging
+import signal
+import threading
+
+from app.db.database import engine
+from app.db.models import Base
+import app.services.marketing_service  # noqa: F401  (registers the campaign_batch handler)
+from app.services.queue_service import QueueWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued jobs")
+    parser.add_argument("--queues", help="Comma-separated queues to consume (default: all)")
+    parser.add_argument("--threads", type=int, default=1, help="Worker threads in this process")
+    parser.add_argument("--poll-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    Base.metadata.create_all(bind=engine)
+
+    queues = [q.strip() for q in args.queues.split(",")] if args.queues else None
+    workers = [QueueWorker(queues=queues, poll_seconds=args.poll_seconds) for _ in range(args.threads)]
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        print("Stopping after the current jobs...")
+        stopping.set()
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for worker in workers:
+        worker.start()
+    print(f"[OK] {len(workers)} worker thread(s) consuming {', '.join(queues) if queues else 'all queues'}")
+    while not stopping.is_set():
+        stopping.wait(1)
+    for worker in workers:
+        worker.shutdown(timeout=None)
+
+
+if __name__ == "__main__":
+    main()
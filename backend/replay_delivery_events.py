@@ -0,0 +1,152 @@
+"""
+Replay synthetic provider delivery events against the webhook endpoints and
+measure ingestion and apply throughput. With the API running:
+
+    python replay_delivery_events.py --messages 20000 --events 100000 --concurrency 20
+
+A campaign with --messages synthetic sent logs is created in the configured
+database (first store and its customers), events for those logs are posted in
+random order (SendGrid batches plus single Twilio callbacks), then the staged
+events are applied in-process unless --no-apply is given.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+parser = argparse.ArgumentParser(description="Replay delivery status webhooks")
+parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+parser.add_argument("--messages", type=int, default=20000, help="Synthetic campaign logs to create")
+parser.add_argument("--events", type=int, default=100000)
+parser.add_argument("--twilio-share", type=float, default=0.2, help="Fraction of messages sent over Twilio")
+parser.add_argument("--batch-size", type=int, default=1000, help="SendGrid events per webhook request")
+parser.add_argument("--concurrency", type=int, default=20)
+parser.add_argument("--token", default=os.getenv("DELIVERY_WEBHOOK_TOKEN", ""))
+parser.add_argument("--no-apply", action="store_true", help="Leave staged events to the scheduler")
+parser.add_argument("--seed", type=int, default=7)
+args = parser.parse_args()
+
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime
+import httpx
+from sqlalchemy import insert
+from app.db.database import SessionLocal
+from app.db import models
+from app.services.delivery_event_service import apply_delivery_events
+
+# Event mix per message: most are delivered, some opened/clicked, a few fail
+SENDGRID_MIX = [("delivered", 0.55), ("open", 0.25), ("click", 0.12), ("bounce", 0.08)]
+TWILIO_MIX = [("delivered", 0.75), ("read", 0.15), ("undelivered", 0.10)]
+
+
+def seed_logs(db, rng):
+    store = db.query(models.Store).first()
+    customer_ids = [row.id for row in db.query(models.Customer.id).filter(models.Customer.store_id == store.id).limit(5000)]
+    if not customer_ids:
+        sys.exit("The first store has no customers; seed the database first")
+    campaign = models.Campaign(
+        store_id=store.id,
+        name=f"Delivery replay {datetime.now():%Y-%m-%d %H:%M:%S}",
+        campaign_type=models.CampaignType.EMAIL,
+        trigger_type=models.CampaignTrigger.MANUAL,
+        status=models.CampaignStatus.COMPLETED,
+        message_template="Replay",
+        total_sent=args.messages,
+    )
+    db.add(campaign)
+    db.flush()
+    messages = []
+    for i in range(args.messages):
+        if rng.random() < args.twilio_share:
+            messages.append(("twilio", "SM" + uuid.uuid4().hex))
+        else:
+            messages.append(("sendgrid", uuid.uuid4().hex[:22]))
+    db.execute(insert(models.CampaignLog), [
+        {
+            "campaign_id": campaign.id,
+            "customer_id": customer_ids[i % len(customer_ids)],
+            "status": "sent",
+            "channel": "SMS" if provider == "twilio" else "Email",
+            "provider_message_id": message_id,
+            "attempts": 1,
+        }
+        for i, (provider, message_id) in enumerate(messages)
+    ])
+    db.commit()
+    return campaign.id, messages
+
+
+def build_events(messages, rng):
+    now = int(time.time())
+    sendgrid, twilio = [], []
+    for _ in range(args.events):
+        provider, message_id = rng.choice(messages)
+        mix = TWILIO_MIX if provider == "twilio" else SENDGRID_MIX
+        event = rng.choices([name for name, _ in mix], weights=[weight for _, weight in mix])[0]
+        if provider == "twilio":
+            twilio.append({"MessageSid": message_id, "MessageStatus": event, "ErrorCode": "30003" if event == "undelivered" else ""})
+        else:
+            sendgrid.append({
+                "sg_message_id": f"{message_id}.filterdrecv-1-2", "event": event,
+                "timestamp": now - rng.randint(0, 3600), "reason": "mailbox unavailable" if event == "bounce" else None,
+            })
+    return sendgrid, twilio
+
+
+async def post_all(sendgrid, twilio):
+    params = {"token": args.token} if args.token else {}
+    requests = [("json", sendgrid[i:i + args.batch_size]) for i in range(0, len(sendgrid), args.batch_size)]
+    requests += [("form", event) for event in twilio]
+    random.Random(args.seed).shuffle(requests)
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    errors = 0
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            kind, body = queue.get_nowait()
+            if kind == "json":
+                response = await client.post("/api/v1/webhooks/sendgrid/events", json=body, params=params)
+            else:
+                response = await client.post("/api/v1/webhooks/twilio/status", data=body, params=params)
+            if response.status_code != 200:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        await asyncio.gather(*[worker(client) for _ in range(args.concurrency)])
+    return len(requests), errors
+
+
+def run():
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        campaign_id, messages = seed_logs(db, rng)
+        sendgrid, twilio = build_events(messages, rng)
+        print(f"Campaign {campaign_id}: {len(messages)} logs, {len(sendgrid)} SendGrid + {len(twilio)} Twilio events")
+
+        started = time.perf_counter()
+        requests, errors = asyncio.run(post_all(sendgrid, twilio))
+        elapsed = time.perf_counter() - started
+        print(f"Ingest: {requests} requests ({errors} errors) in {elapsed:.1f}s -> {args.events / elapsed:,.0f} events/s")
+
+        if not args.no_apply:
+            started = time.perf_counter()
+            totals = apply_delivery_events(db)
+            elapsed = time.perf_counter() - started
+            print(f"Apply: {totals} in {elapsed:.1f}s -> {totals['applied'] / max(elapsed, 1e-9):,.0f} events/s")
+            campaign = db.get(models.Campaign, campaign_id)
+            print(f"Counters: sent={campaign.total_sent} failed={campaign.total_failed} "
+                  f"opened={campaign.total_opened} clicked={campaign.total_clicked}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
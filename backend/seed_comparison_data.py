@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from datetime import datetime, timedelta
 import random
 from app.db.database import SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db.models import Sale, SaleItem, Product, Customer, Expense, Store, User
 from sqlalchemy import func
 
@@ -241,7 +242,10 @@ def seed_comparison_data():
         print(f"Total Expenses: ₹{total_expenses:,.2f}")
         print(f"Total Profit: ₹{total_profit:,.2f}")
         print(f"\nYou can now use the comparison graph in the dashboard!")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"Error seeding data: {e}")
         import traceback
@@ -13,6 +13,7 @@ import math
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.db.database import SessionLocal, engine
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 
@@ -386,7 +387,10 @@ def seed_comprehensive():
         print("\n" + "="*50)
         print("🎉 SUCCESS! Database populated with robust dataset.")
         print("="*50)
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"❌ Error during seeding: {e}")
         db.rollback()
@@ -3,6 +3,7 @@ Seed Script - Add Sample Data to RMS Database
 This script populates the database with realistic sample data for testing
 """
 from app.db.database import SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 from datetime import datetime, timedelta
@@ -398,7 +399,10 @@ def seed_database():
         print(f"\nYour RMS is now ready with sample data including Marketing Automation!")
         print("Refresh your browser to see all the data!")
         print("=" * 70 + "\n")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"\nERROR: Failed to seed database: {e}")
         db.rollback()
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal, engine, Base
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 
@@ -425,7 +426,10 @@ def seed_database():
         print(f"   Manager: manager1@store.com / manager123")
         print(f"   Sales: sales1@store.com / sales123")
         print("\n" + "="*60 + "\n")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"\n❌ Error seeding database: {str(e)}")
         import traceback
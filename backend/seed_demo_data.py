@@ -10,6 +10,7 @@ import random
 import string
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 
 # Staff/Sellers
@@ -514,7 +515,10 @@ def seed_data():
         print("=" * 60)
         print("\n👉 REFRESH YOUR BROWSER to see all the data!")
         print("👉 Restart backend if needed: python -m uvicorn app.main:app --reload --port 8000")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
@@ -12,6 +12,7 @@ from decimal import Decimal
 import random
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal, engine
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 
 # Sample data
@@ -403,7 +404,10 @@ def seed_reports_data():
         print(f"  - Sales: {sale_count}")
         print(f"  - Staff: {len(staff_users)}")
         print("\nYou can now use all Advanced Reports!")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         db.rollback()
         print(f"\n❌ Error: {e}")
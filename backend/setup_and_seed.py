@@ -58,6 +58,7 @@ if "--reset" in sys.argv:
 
 # ========== IMPORT APP MODULES ==========
 from app.db.database import engine, SessionLocal, Base
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 from app.core.config import settings
@@ -692,6 +693,9 @@ try:
     print(f"    python -m uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload")
     print("=" * 70 + "\n")
 
+    # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+    print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
 except Exception as e:
     print(f"\n[FAIL] ERROR: {e}")
     import traceback
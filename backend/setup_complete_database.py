@@ -3,6 +3,7 @@ Complete Database Setup Script - SKOPE ERP
 This script creates a fully populated database with realistic business data
 """
 from app.db.database import engine, SessionLocal
+from app.services.rollup_service import rebuild_hourly_rollup
 from app.db import models
 from app.core.security import get_password_hash
 from datetime import datetime, timedelta
@@ -860,7 +861,10 @@ def setup_complete_database(force_reset=False):
         print("   3. Open browser at: http://localhost:5173")
         print("   4. Login with any of the credentials above")
         print("\n" + "="*80 + "\n")
-        
+
+        # Seeded sales bypass checkout, so rebuild the hourly sales rollup
+        print(f"Hourly sales rollup rebuilt: {rebuild_hourly_rollup(db)} buckets")
+
     except Exception as e:
         print(f"\nERROR: {e}")
         import traceback
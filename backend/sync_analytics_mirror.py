@@ -0,0 +1,26 @@
+"""
+Sync the columnar analytics mirror (Parquet files under OLAP_MIRROR_DIR).
+The API does this every OLAP_SYNC_INTERVAL_SECONDS when OLAP_ENABLED=true;
+run it by hand for the first (large) sync or from cron on a dedicated box:
+
+    python sync_analytics_mirror.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import json
+from app.db.database import SessionLocal
+from app.services.olap_service import analytics_mirror
+
+def main():
+    db = SessionLocal()
+    try:
+        result = analytics_mirror.sync(db)
+        print(json.dumps(result, indent=2))
+        print(json.dumps(analytics_mirror.status(), indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,7 @@ export default function Chatbot() {
     const [loading, setLoading] = useState(false)
     const [status, setStatus] = useState<ChatStatus | null>(null)
     const [checkingStatus, setCheckingStatus] = useState(false)
+    const [chatId, setChatId] = useState<number | null>(null)
     const messagesEndRef = useRef<HTMLDivElement>(null)
 
     // Check Ollama status when opening
@@ -74,13 +75,12 @@ export default function Chatbot() {
         setLoading(true)
 
         try {
+            // History is kept server-side; only the conversation id travels with each message
             const response = await api.post('/chatbot/chat', {
                 message: userMessage.content,
-                conversation_history: messages.slice(-10).map(m => ({
-                    role: m.role,
-                    content: m.content
-                }))
+                chat_id: chatId
             })
+            setChatId(response.data.chat_id)
 
             const assistantMessage: Message = {
                 role: 'assistant',
@@ -109,6 +109,7 @@ export default function Chatbot() {
     }
 
     const clearChat = () => {
+        setChatId(null)
         setMessages([{
             role: 'assistant',
             content: "Chat cleared! How can I help you today?",